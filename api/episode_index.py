@@ -0,0 +1,139 @@
+import bisect
+import threading
+
+EPISODES_QUERY = "SELECT episode_id, title, air_date, broadcast_month FROM episodes;"
+EPISODE_SUBJECTS_QUERY = """
+    SELECT es.episode_id, s.name FROM episodesubjects es
+    JOIN subjects s ON s.subject_id = es.subject_id;
+"""
+EPISODE_COLORS_QUERY = """
+    SELECT ec.episode_id, c.name FROM episodecolors ec
+    JOIN colors c ON c.color_id = ec.color_id;
+"""
+
+
+def iter_bits(bits):
+    """
+    Yield the positions of the set bits, lowest first.
+    """
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+class EpisodeIndex:
+    """
+    In-memory /episodes filter.
+
+    The catalog is a few hundred episodes, so every subject, color and
+    broadcast month is kept as an int bitmap with one bit per episode.
+    Filters are then a handful of bitwise ORs/ANDs. Episodes are numbered
+    in (air_date, episode_id) order, so reading the bits back gives the
+    same order as the SQL query. Call refresh() (or wire it to a NOTIFY
+    from database/load_data.py) when the tables change.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    @property
+    def loaded(self):
+        return self._index is not None
+
+    def load(self, episodes, episode_subjects, episode_colors):
+        """
+        Build the bitmaps from (episode_id, title, air_date, broadcast_month)
+        rows and (episode_id, name) rows for subjects and colors.
+        """
+        episodes = sorted(episodes, key=lambda row: (row[2], row[0]))
+        positions = {row[0]: position for position, row in enumerate(episodes)}
+
+        months = {}
+        for position, row in enumerate(episodes):
+            months[row[3]] = months.get(row[3], 0) | (1 << position)
+
+        def bitmaps(rows):
+            by_name = {}
+            for episode_id, name in rows:
+                position = positions.get(episode_id)
+                if position is not None:
+                    by_name[name] = by_name.get(name, 0) | (1 << position)
+            return by_name
+
+        # Swap in one assignment so concurrent filter() calls see old or new, never half
+        keys = [(row[2], row[0]) for row in episodes]
+        self._index = (tuple(episodes), keys, months, bitmaps(episode_subjects), bitmaps(episode_colors))
+        self.loads += 1
+
+    def refresh(self, cursor):
+        with self._lock:
+            cursor.execute(EPISODES_QUERY)
+            episodes = cursor.fetchall()
+            cursor.execute(EPISODE_SUBJECTS_QUERY)
+            episode_subjects = cursor.fetchall()
+            cursor.execute(EPISODE_COLORS_QUERY)
+            episode_colors = cursor.fetchall()
+            self.load(episodes, episode_subjects, episode_colors)
+
+    def _snapshot(self):
+        # Read self._index once per call, so a reload can't mix two versions
+        index = self._index
+        if index is None:
+            raise RuntimeError("EpisodeIndex has not been loaded")
+        return index
+
+    @staticmethod
+    def _match(index, broadcast_months, subjects, colors, match_all):
+        episodes, keys, months, by_subject, by_color = index
+
+        def any_of(bitmaps, names):
+            bits = 0
+            for name in names:
+                bits |= bitmaps.get(name, 0)
+            return bits
+
+        def all_of(bitmaps, names):
+            bits = -1
+            for name in names:
+                bits &= bitmaps.get(name, 0)
+            return bits
+
+        groups = []
+        if broadcast_months:
+            groups.append(any_of(months, broadcast_months))
+        if subjects:
+            groups.append((all_of if match_all else any_of)(by_subject, subjects))
+        if colors:
+            groups.append((all_of if match_all else any_of)(by_color, colors))
+
+        if not groups:
+            return (1 << len(episodes)) - 1
+        bits = groups[0]
+        for group in groups[1:]:
+            bits = bits & group if match_all else bits | group
+        return bits
+
+    def filter(self, broadcast_months=(), subjects=(), colors=(), match_all=False, after=None, limit=None):
+        """
+        Return the matching (episode_id, title, air_date, broadcast_month)
+        rows by air date, with the same semantics as
+        api.episode_query.build_episodes_query.
+        """
+        index = self._snapshot()
+        bits = self._match(index, broadcast_months, subjects, colors, match_all)
+        episodes, keys = index[0], index[1]
+        if after is not None:
+            # Clear every episode up to and including the cursor
+            bits &= ~((1 << bisect.bisect_right(keys, after)) - 1)
+        rows = []
+        for position in iter_bits(bits):
+            if limit is not None and len(rows) >= limit:
+                break
+            rows.append(episodes[position])
+        return rows
+
+    def count(self, broadcast_months=(), subjects=(), colors=(), match_all=False):
+        return bin(self._match(self._snapshot(), broadcast_months, subjects, colors, match_all)).count("1")
@@ -0,0 +1,143 @@
+import base64
+import datetime
+
+# Fields an /episodes row can return, in the order they're selected
+EPISODE_FIELDS = ("episode_id", "title", "air_date", "broadcast_month")
+EPISODE_COLUMNS = ", ".join(f"e.{field}" for field in EPISODE_FIELDS)
+
+# Keyset pagination: rows come back in (air_date, episode_id) order and a
+# cursor is the last key of the previous page
+KEYSET_FILTER = "(e.air_date, e.episode_id) > (%s, %s)"
+
+# Each filter is a subquery against one junction table, so an episode is
+# only ever looked at once instead of once per (subject, color) pair.
+HAS_ANY_SUBJECT = """EXISTS (
+    SELECT 1 FROM episodesubjects es
+    JOIN subjects s ON s.subject_id = es.subject_id
+    WHERE es.episode_id = e.episode_id AND s.name = ANY(%s)
+)"""
+
+HAS_ALL_SUBJECTS = """e.episode_id IN (
+    SELECT es.episode_id FROM episodesubjects es
+    JOIN subjects s ON s.subject_id = es.subject_id
+    WHERE s.name = ANY(%s)
+    GROUP BY es.episode_id
+    HAVING COUNT(DISTINCT s.name) = %s
+)"""
+
+HAS_ANY_COLOR = """EXISTS (
+    SELECT 1 FROM episodecolors ec
+    JOIN colors c ON c.color_id = ec.color_id
+    WHERE ec.episode_id = e.episode_id AND c.name = ANY(%s)
+)"""
+
+HAS_ALL_COLORS = """e.episode_id IN (
+    SELECT ec.episode_id FROM episodecolors ec
+    JOIN colors c ON c.color_id = ec.color_id
+    WHERE c.name = ANY(%s)
+    GROUP BY ec.episode_id
+    HAVING COUNT(DISTINCT c.name) = %s
+)"""
+
+
+def encode_cursor(air_date, episode_id):
+    return base64.urlsafe_b64encode(f"{air_date.isoformat()}:{episode_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Return the (air_date, episode_id) key from encode_cursor, raising
+    ValueError if the cursor is malformed.
+    """
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        air_date, episode_id = key.split(":")
+        return datetime.date.fromisoformat(air_date), int(episode_id)
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def parse_fields(value):
+    """
+    Parse a comma separated fields= parameter, defaulting to every field.
+    """
+    if not value:
+        return EPISODE_FIELDS
+    fields = unique(field.strip() for field in value.split(",") if field.strip())
+    unknown = [field for field in fields if field not in EPISODE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(fields)
+
+
+def unique(values):
+    # Drop repeats but keep the order, so ?subject=tree&subject=tree counts once
+    return list(dict.fromkeys(values))
+
+
+def build_filters(broadcast_months=(), subjects=(), colors=(), match_all=False):
+    """
+    Return (filters, params) for the /episodes filters.
+
+    With match_all an episode has to have every requested subject and every
+    requested color (and air in one of the months), otherwise matching any
+    month, subject or color is enough.
+    """
+    broadcast_months, subjects, colors = unique(broadcast_months), unique(subjects), unique(colors)
+    filters = []
+    params = []
+
+    if broadcast_months:
+        filters.append("e.broadcast_month = ANY(%s)")
+        params.append(broadcast_months)
+
+    if subjects:
+        if match_all:
+            filters.append(HAS_ALL_SUBJECTS)
+            params.extend([subjects, len(subjects)])
+        else:
+            filters.append(HAS_ANY_SUBJECT)
+            params.append(subjects)
+
+    if colors:
+        if match_all:
+            filters.append(HAS_ALL_COLORS)
+            params.extend([colors, len(colors)])
+        else:
+            filters.append(HAS_ANY_COLOR)
+            params.append(colors)
+
+    return filters, params
+
+
+def where_clause(filters, match_all, after=None):
+    conditions = []
+    if filters:
+        conditions.append("(" + (" AND " if match_all else " OR ").join(filters) + ")")
+    if after is not None:
+        conditions.append(KEYSET_FILTER)
+    return "\nWHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def build_episodes_query(broadcast_months=(), subjects=(), colors=(), match_all=False, after=None, limit=None):
+    """
+    Return (query, params) listing the matching episodes by air date,
+    starting after the (air_date, episode_id) key `after` if given.
+    """
+    filters, params = build_filters(broadcast_months, subjects, colors, match_all)
+    query = f"SELECT {EPISODE_COLUMNS}\nFROM episodes e" + where_clause(filters, match_all, after)
+    if after is not None:
+        params.extend(after)
+    query += "\nORDER BY e.air_date, e.episode_id"
+    if limit is not None:
+        query += "\nLIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+def build_count_query(broadcast_months=(), subjects=(), colors=(), match_all=False):
+    """
+    Return (query, params) counting the matching episodes.
+    """
+    filters, params = build_filters(broadcast_months, subjects, colors, match_all)
+    return "SELECT COUNT(*)\nFROM episodes e" + where_clause(filters, match_all), params
@@ -0,0 +1,264 @@
+import re
+import threading
+
+import numpy as np
+
+EPISODES_QUERY = "SELECT episode_id, season_episode, title, air_date FROM episodes;"
+EPISODE_COLORS_QUERY = """
+    SELECT ec.episode_id, c.name, c.hex_code FROM episodecolors ec
+    JOIN colors c ON c.color_id = ec.color_id;
+"""
+
+# Weight of the paint-set similarity (Jaccard or cosine over the paints
+# used) in the score, the rest going to how close the colors look
+SET_WEIGHT = 0.5
+
+# CIE76 delta E at which the color part of the score has halved. Around 10
+# two colors look clearly different side by side.
+DELTA_E_SCALE = 10.0
+
+METRICS = ("jaccard", "cosine")
+
+HEX_CODE = re.compile(r"^#?([0-9a-fA-F]{6})$")
+
+
+def parse_hex(code):
+    """
+    Normalize '#db0000' / 'DB0000' to '#DB0000', raising ValueError for
+    anything else.
+    """
+    match = HEX_CODE.match(code.strip())
+    if not match:
+        raise ValueError(f"Invalid hex color: {code}")
+    return "#" + match.group(1).upper()
+
+
+def hex_to_lab(codes):
+    """
+    CIE Lab (D65) coordinates of '#RRGGBB' codes, as an (n, 3) array.
+    Euclidean distance in Lab (CIE76 delta E) tracks how different two
+    colors look far better than distance in RGB.
+    """
+    return rgb_to_lab([[int(code[i:i + 2], 16) for i in (1, 3, 5)] for code in codes])
+
+
+def rgb_to_lab(rgb):
+    """
+    CIE Lab (D65) coordinates of 0-255 sRGB colors, as an (n, 3) array.
+    """
+    rgb = np.asarray(rgb, dtype=np.float64).reshape(-1, 3) / 255.0
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def delta_e(left, right):
+    """
+    (len(left), len(right)) CIE76 distances between two sets of Lab colors.
+    """
+    return np.sqrt(((left[:, None, :] - right[None, :, :]) ** 2).sum(axis=2))
+
+
+def top_k(scores, k):
+    """
+    Positions of the k highest scores, best first, ties by position. Only
+    the top k are sorted (argpartition), not the whole catalog.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def closest_used(palettes, distances):
+    """
+    For every palette (a row of the episodes x paints matrix), the smallest
+    of `distances` (one per paint) over the paints it uses, inf for an
+    empty palette. Goes from the nearest paint to the farthest and takes
+    the first one used, so it's one pass over the matrix.
+    """
+    order = np.argsort(distances)
+    used = palettes[:, order]
+    return np.where(used.any(axis=1), distances[order][used.argmax(axis=1)], np.inf)
+
+
+class PaletteIndex:
+    """
+    In-memory palette similarity for /episodes/similar.
+
+    Every episode's paints are a row of a 0/1 matrix (episodes x paints),
+    and the paints' Lab colors are kept alongside. At load time we also
+    work out, for every episode and every paint, how far the paint is from
+    the closest color on the episode's palette, so comparing a palette with
+    the whole catalog is a few matrix-vector operations over that matrix
+    rather than a loop over episodes. Call refresh() when the tables
+    change.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    @property
+    def loaded(self):
+        return self._index is not None
+
+    def load(self, episodes, episode_colors):
+        """
+        Build the matrices from (episode_id, season_episode, title,
+        air_date) rows and (episode_id, paint name, hex code) rows.
+        """
+        episodes = sorted(episodes, key=lambda row: (row[3], row[0]))
+        positions = {row[0]: position for position, row in enumerate(episodes)}
+        paints = sorted({(name, parse_hex(code)) for _, name, code in episode_colors})
+        paint_positions = {paint: position for position, paint in enumerate(paints)}
+
+        palettes = np.zeros((len(episodes), len(paints)), dtype=bool)
+        for episode_id, name, code in episode_colors:
+            position = positions.get(episode_id)
+            if position is not None:
+                palettes[position, paint_positions[(name, parse_hex(code))]] = True
+
+        lab = hex_to_lab([code for _, code in paints])
+        paint_distances = delta_e(lab, lab)
+        # nearest[e, p]: delta E from paint p to the closest paint episode e used
+        nearest = np.empty(palettes.shape, dtype=np.float32)
+        for paint, distances in enumerate(paint_distances):
+            nearest[:, paint] = closest_used(palettes, distances)
+
+        # Swap in one assignment so concurrent queries see old or new, never half
+        self._index = {
+            'episodes': tuple(episodes),
+            'by_code': {row[1]: position for position, row in enumerate(episodes)},
+            'paints': paints,
+            'lab': lab,
+            'palettes': palettes,
+            'weights': palettes.astype(np.float32),
+            'sizes': palettes.sum(axis=1).astype(np.float32),
+            'nearest': nearest,
+        }
+        self.loads += 1
+
+    def refresh(self, cursor):
+        with self._lock:
+            cursor.execute(EPISODES_QUERY)
+            episodes = cursor.fetchall()
+            cursor.execute(EPISODE_COLORS_QUERY)
+            episode_colors = cursor.fetchall()
+            self.load(episodes, episode_colors)
+
+    def _snapshot(self):
+        index = self._index
+        if index is None:
+            raise RuntimeError("PaletteIndex has not been loaded")
+        return index
+
+    def like_episode(self, season_episode, k=10, metric="jaccard"):
+        """
+        The k episodes whose palettes are most like `season_episode`'s, as
+        (episode row, score) pairs, best first. KeyError for an unknown
+        episode.
+        """
+        index = self._snapshot()
+        position = index['by_code'][season_episode]
+        query = index['palettes'][position]
+        # Chamfer distance both ways: each query paint to the closest one
+        # on the candidate's palette, and each candidate paint to the query
+        towards = index['nearest'][:, query].mean(axis=1) if query.any() else None
+        back = index['nearest'][position]
+        scores = self._scores(index, query, towards, back, metric)
+        scores[position] = -np.inf
+        return self._top(index, scores, k)
+
+    def like_colors(self, codes, k=10, metric="jaccard"):
+        """
+        The k episodes whose palettes are most like a set of '#RRGGBB'
+        colors, as (episode row, score) pairs, best first. A color counts
+        for the paint-set part only when it is exactly one of the paints.
+        """
+        index = self._snapshot()
+        codes = list(dict.fromkeys(parse_hex(code) for code in codes))
+        if not codes:
+            raise ValueError("No colors given")
+        query = np.array([code in codes for _, code in index['paints']], dtype=bool)
+
+        distances = delta_e(hex_to_lab(codes), index['lab'])  # colors x paints
+        palettes = index['palettes']
+        towards = np.mean([closest_used(palettes, color_distances) for color_distances in distances], axis=0)
+        back = distances.min(axis=0)
+        scores = self._scores(index, query, towards, back, metric)
+        return self._top(index, scores, k)
+
+    @staticmethod
+    def _scores(index, query, towards, back, metric):
+        """
+        Score every episode against a query palette: the paint-set
+        similarity and the color similarity, weighted by SET_WEIGHT.
+        `towards` is each episode's mean distance from the query colors to
+        its palette (None for an empty query), `back` each paint's distance
+        to the closest query color.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        weights, sizes = index['weights'], index['sizes']
+        query_size = float(query.sum())
+        shared = weights @ query.astype(np.float32)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if metric == "jaccard":
+                overlap = shared / (sizes + query_size - shared)
+            else:
+                overlap = shared / np.sqrt(sizes * query_size)
+            back_mean = (weights @ back.astype(np.float32)) / sizes
+        overlap = np.nan_to_num(overlap, nan=0.0, posinf=0.0)
+
+        if towards is None:
+            distance = back_mean
+        else:
+            distance = (towards + back_mean) / 2
+        # Empty palettes have no distance (nan or inf) and score nothing for color
+        distance = np.where(np.isnan(distance), np.inf, distance)
+        closeness = 1 / (1 + distance / DELTA_E_SCALE)
+        return (SET_WEIGHT * overlap + (1 - SET_WEIGHT) * closeness).astype(np.float64)
+
+    @staticmethod
+    def _top(index, scores, k):
+        positions = top_k(scores, k)
+        positions = positions[np.isfinite(scores[positions])]
+        return [(index['episodes'][position], float(scores[position])) for position in positions]
+
+    def nearest_paints(self, codes):
+        """
+        [(name, hex code, delta E)] of the paint that looks closest to each
+        of a list of '#RRGGBB' colors. Paints with the same color (Titanium
+        White and Liquid Clear are both #FFFFFF) go to the most used one.
+        """
+        index = self._snapshot()
+        if not index['paints']:
+            raise ValueError("No paints loaded")
+        distances = delta_e(hex_to_lab([parse_hex(code) for code in codes]), index['lab'])
+        by_use = np.argsort(-index['palettes'].sum(axis=0), kind='stable')
+        closest = by_use[distances[:, by_use].argmin(axis=1)]
+        return [
+            (*index['paints'][paint], float(distances[row, paint]))
+            for row, paint in enumerate(closest)
+        ]
+
+    def palette(self, season_episode):
+        """
+        [(name, hex code)] of an episode's paints. KeyError for an unknown
+        episode.
+        """
+        index = self._snapshot()
+        used = index['palettes'][index['by_code'][season_episode]]
+        return [paint for paint, is_used in zip(index['paints'], used) if is_used]
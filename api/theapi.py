@@ -1,93 +1,222 @@
-from flask import Flask, request, jsonify
-import psycopg2
+from flask import Flask, Response, request, jsonify
+import hashlib
 import os
+import sys
+
+# Make the project root importable when run as `python api/theapi.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from api.episode_index import EpisodeIndex
+from api.episode_query import (
+    EPISODE_FIELDS, build_count_query, build_episodes_query, decode_cursor, encode_cursor, parse_fields,
+)
+from api.palette_index import METRICS, PaletteIndex
+from backend.cache import LRUCache
+from backend.metrics import Metrics, instrument
+from database.db import DataVersion, Reloadable, get_pool, pool_stats
 
 app = Flask(__name__)
 
+# Serve /episodes from in-memory bitmaps instead of a query per request
+EPISODE_INDEX_ENABLED = os.getenv("EPISODE_INDEX_ENABLED", "False") == "True"
+
+# /episodes page size when no limit= is given, and the largest one allowed
+EPISODES_PAGE_SIZE = int(os.getenv("EPISODES_PAGE_SIZE", 50))
+EPISODES_MAX_PAGE_SIZE = int(os.getenv("EPISODES_MAX_PAGE_SIZE", 500))
+
+# /episodes responses only change when database/load_data.py runs, so they're
+# cached per data version and normalized query string
+EPISODES_CACHE_MAX_ENTRIES = int(os.getenv("EPISODES_CACHE_MAX_ENTRIES", 1024))
+
+# Send the stage timings to clients as a Server-Timing header, they're
+# recorded for /metrics either way
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "True") == "True"
+
+# /episodes/similar results when no limit= is given, and the most allowed
+SIMILAR_EPISODES_LIMIT = int(os.getenv("SIMILAR_EPISODES_LIMIT", 10))
+SIMILAR_EPISODES_MAX_LIMIT = int(os.getenv("SIMILAR_EPISODES_MAX_LIMIT", 100))
+
+metrics = Metrics()
+instrument(app, metrics, server_timing_header=SERVER_TIMING_ENABLED)
+
+episode_index = EpisodeIndex()
+episode_index_data = Reloadable(episode_index, "Episode index")
+palette_index = PaletteIndex()
+palette_index_data = Reloadable(palette_index, "Palette index")
+episodes_cache = LRUCache(EPISODES_CACHE_MAX_ENTRIES)
+data_version = DataVersion(on_change=episodes_cache.clear)
+
 # Database connection function
-# I dunno how this would work on other machines with a password?
+# Connections come from the shared pool, settings are read from the
+# environment (DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
 def connect_to_db():
     try:
-        conn = psycopg2.connect(
-            dbname="painting_db",
-            user="postgres",
-            password="Juikiuj*88*",
-            host="localhost",
-            port="5432"
-        )
-        return conn
+        return get_pool().getconn()
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
 
+def episodes_page(rows, limit, fields, total=None):
+    """
+    Shape up to limit + 1 rows into the /episodes response. The extra row
+    only tells us whether there is a next page. air_date is left as a date,
+    jsonify formats it as an HTTP date.
+    """
+    page = rows[:limit]
+    positions = [EPISODE_FIELDS.index(field) for field in fields]
+    body = {
+        "episodes": [{field: row[position] for field, position in zip(fields, positions)} for row in page],
+        "next_cursor": encode_cursor(page[-1][2], page[-1][0]) if len(rows) > limit else None,
+    }
+    if total is not None:
+        body["total"] = total
+    return body
+
+def normalized_query(args):
+    # Parameter and value order don't change the result
+    return "&".join(f"{key}={value}" for key in sorted(args) for value in sorted(set(args.getlist(key))))
+
 @app.route('/episodes', methods=['GET'])
 def get_episodes():
+    version = data_version.get()
+    if version is None:
+        return query_episodes()
+
+    key = (version[0], normalized_query(request.args))
+    etag = f"{version[0]}-{hashlib.sha1(key[1].encode()).hexdigest()[:16]}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = episodes_cache.get(key)
+        if body is None:
+            result = query_episodes()
+            if isinstance(result, tuple):
+                return result
+            # Keep the encoded JSON so hits skip serialization too
+            with metrics.span("serialize"):
+                body = jsonify(result).get_data()
+            episodes_cache.set(key, body)
+        response = Response(body, mimetype="application/json")
+
+    response.set_etag(etag)
+    response.last_modified = version[1]
+    # Clients may keep the response but should revalidate, it's a 304 until the next load
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def query_episodes():
+    """
+    Run /episodes for the current request. Returns the response body, or an
+    error (response, status) tuple.
+    """
     broadcast_month = request.args.getlist('broadcast_month')
     subjects = request.args.getlist('subject')
     colors = request.args.getlist('color')
     match_all = request.args.get('match_all', 'false').lower() == 'true'
+    include_total = request.args.get('include_total', 'false').lower() == 'true'
+    filters = (broadcast_month, subjects, colors, match_all)
 
-    query = """
-        SELECT DISTINCT e.episode_id, e.title, e.air_date, e.broadcast_month
-        FROM episodes e
-        LEFT JOIN episodesubjects es ON e.episode_id = es.episode_id
-        LEFT JOIN subjects s ON es.subject_id = s.subject_id
-        LEFT JOIN episodecolors ec ON e.episode_id = ec.episode_id
-        LEFT JOIN colors c ON ec.color_id = c.color_id
-        WHERE 1=1
-    """
-    filters = []
-    params = []
-
-    # Filters for broadcast_month
-    if broadcast_month:
-        filters.append(f"e.broadcast_month IN ({', '.join(['%s'] * len(broadcast_month))})")
-        params.extend(broadcast_month)
-
-    # Filters for subjects
-    if subjects:
-        filters.append(f"s.name IN ({', '.join(['%s'] * len(subjects))})")
-        params.extend(subjects)
-
-    # Filters for colors
-    if colors:
-        filters.append(f"c.name IN ({', '.join(['%s'] * len(colors))})")
-        params.extend(colors)
-
-    # A Filters to the query
-    if filters:
-        if match_all:
-            # Ensure all filters match the same episode (intersection)
-            query += f" AND {' AND '.join(filters)}"
-        else:
-            # Allow episodes matching any filter (union)
-            query += f" AND ({' OR '.join(filters)})"
-
-    query += " ORDER BY e.air_date"
-
-    conn = connect_to_db()
+    try:
+        limit = min(max(1, int(request.args.get('limit', EPISODES_PAGE_SIZE))), EPISODES_MAX_PAGE_SIZE)
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if EPISODE_INDEX_ENABLED:
+        try:
+            with metrics.span("episode_index"):
+                index = episode_index_data.get()
+                rows = index.filter(*filters, after=after, limit=limit + 1)
+                total = index.count(*filters) if include_total else None
+            return episodes_page(rows, limit, fields, total)
+        except Exception as e:
+            print(f"Episode index unavailable, falling back to SQL: {e}")
+
+    query, params = build_episodes_query(*filters, after=after, limit=limit + 1)
+
+    with metrics.span("db_connect"):
+        conn = connect_to_db()
     if conn is None:
         return jsonify({"error": "Database connection failed"}), 500
 
     try:
         with conn.cursor() as cursor:
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            episodes = [
-                {
-                    "episode_id": row[0],
-                    "title": row[1],
-                    "air_date": row[2].strftime('%a, %d %b %Y %H:%M:%S GMT'),
-                    "broadcast_month": row[3]
-                }
-                for row in rows
-            ]
-            return jsonify({"episodes": episodes})
+            with metrics.span("episodes_page"):
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            total = None
+            if include_total:
+                with metrics.span("episodes_count"):
+                    cursor.execute(*build_count_query(*filters))
+                    total = cursor.fetchone()[0]
+            return episodes_page(rows, limit, fields, total)
     except Exception as e:
         print(f"Error executing query: {e}")
         return jsonify({"error": "Failed to fetch episodes"}), 500
     finally:
-        conn.close()
+        get_pool().putconn(conn)
+
+@app.route('/episodes/similar', methods=['GET'])
+def get_similar_episodes():
+    """
+    Episodes with a palette like an episode's (episode=S03E05) or like a
+    set of colors (hex=#DB0000, repeatable), most similar first.
+    """
+    episode = request.args.get('episode')
+    hex_codes = request.args.getlist('hex')
+    metric = request.args.get('metric', 'jaccard').lower()
+    if bool(episode) == bool(hex_codes):
+        return jsonify({"error": "Pass either episode= or hex="}), 400
+    if metric not in METRICS:
+        return jsonify({"error": f"metric must be one of {', '.join(METRICS)}"}), 400
+
+    try:
+        limit = min(max(1, int(request.args.get('limit', SIMILAR_EPISODES_LIMIT))), SIMILAR_EPISODES_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+
+    try:
+        index = palette_index_data.get()
+    except Exception as e:
+        print(f"Error loading palette index: {e}")
+        return jsonify({"error": "Failed to load palettes"}), 500
+
+    try:
+        with metrics.span("palette_index"):
+            if episode:
+                matches = index.like_episode(episode.upper(), limit, metric)
+                query = {"episode": episode.upper(), "palette": [
+                    {"name": name, "hex": code} for name, code in index.palette(episode.upper())
+                ]}
+            else:
+                matches = index.like_colors(hex_codes, limit, metric)
+                query = {"hex": hex_codes}
+    except KeyError:
+        return jsonify({"error": f"Unknown episode: {episode}"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "query": query,
+        "metric": metric,
+        "episodes": [
+            {
+                "episode_id": episode_id,
+                "season_episode": season_episode,
+                "title": title,
+                "air_date": air_date,
+                "score": round(score, 4),
+            }
+            for (episode_id, season_episode, title, air_date), score in matches
+        ],
+    })
+
+@app.route('/db/stats', methods=['GET'])
+def get_db_stats():
+    return jsonify(pool_stats())
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -1,53 +1,551 @@
-from flask import Flask, jsonify, request, send_file, redirect, send_from_directory
+from flask import Flask, Response, jsonify, request, send_file, redirect, send_from_directory
 from flask_cors import CORS
-import requests
-from io import BytesIO
 from dotenv import load_dotenv
 import os
+import tempfile
 from google.cloud import vision
 from google.cloud.vision import Image
-import psycopg2
 import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Make the project root importable when run as `python3 backend/app.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.cache import LRUCache, SingleFlight, SQLiteStore
+from backend.log_setup import log_requests, parse_levels, parse_rates, setup_logging
+from backend.metrics import Metrics, instrument
+from backend.photo_cache import PhotoCache
+from backend.photo_colors import extract_colors
+from backend.prefetch import Prefetcher
+from backend.upstream import VISION_TIMEOUT, HttpClient, vision_retry
+from backend.subjects import SubjectMatcher, find_subjects, load_synonyms
+from api.episode_query import KEYSET_FILTER, decode_cursor, encode_cursor
+from api.palette_index import PaletteIndex
+from database.db import DataVersion, Reloadable, connection, pool_stats
 
 # Initialize Flask app
 app = Flask(__name__, static_folder="../front-facing")  # Adjust static folder to point to "front-facing"
 CORS(app)
 
-# Configure logger
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__) 
-
 # Load environment variables
 load_dotenv()
+
+# Logging settings. Records go through a queue to a background thread that
+# writes the JSON-lines file (rotated at LOG_MAX_BYTES) and the console.
+# LOG_LEVELS overrides the level per logger ("backend.access=WARNING,werkzeug=WARNING")
+# and LOG_SAMPLE_RATES keeps a fraction of a busy logger's INFO lines
+# ("backend.access=0.1"); warnings and errors are always kept.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = parse_levels(os.getenv("LOG_LEVELS"))
+LOG_SAMPLE_RATES = parse_rates(os.getenv("LOG_SAMPLE_RATES"))
+LOG_FILE = os.getenv("LOG_FILE", "app.log")  # empty to only log to the console
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+
+setup_logging(LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE_RATES, LOG_FILE or None, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+logger = logging.getLogger(__name__)
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-logger.debug(f"Google API Key: {GOOGLE_API_KEY}")
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.abspath("service-account-key.json")
 use_reloader = os.getenv("FLASK_USE_RELOADER", "True") == "True"
 
-# API Constants
-PLACE_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-PHOTO_URL = "https://maps.googleapis.com/maps/api/place/photo"
+# API Constants. Point GOOGLE_MAPS_BASE_URL and VISION_API_ENDPOINT at
+# benchmarks/stub_google.py to run without touching Google.
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
+PLACE_SEARCH_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/textsearch/json"
+PHOTO_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/photo"
+PHOTO_MAX_WIDTH = 800
+VISION_API_ENDPOINT = os.getenv("VISION_API_ENDPOINT")
+
+# Label cache settings. Pagination re-POSTs /analyze for every page, so the
+# Vision labels for a photo_reference are cached instead of re-fetched.
+LABEL_CACHE_TTL = int(os.getenv("LABEL_CACHE_TTL", 24 * 60 * 60))
+LABEL_CACHE_MAX_ENTRIES = int(os.getenv("LABEL_CACHE_MAX_ENTRIES", 1024))
+LABEL_CACHE_PATH = os.getenv("LABEL_CACHE_PATH")  # Optional SQLite file
+
+# Places cache settings. Popular regions are searched over and over, so the
+# text search results are cached per normalized region.
+PLACES_CACHE_TTL = int(os.getenv("PLACES_CACHE_TTL", 6 * 60 * 60))
+PLACES_CACHE_MAX_ENTRIES = int(os.getenv("PLACES_CACHE_MAX_ENTRIES", 512))
+
+# Subject/episode matching results for /analyze, cached per data version
+# (bumped by database/load_data.py) so they're dropped when the data changes.
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 1024))
+
+# /analyze/batch settings. Vision accepts at most 16 images per
+# batch_annotate_images request, so bigger batches are sent in chunks.
+VISION_BATCH_SIZE = 16
+ANALYZE_BATCH_MAX_PHOTOS = int(os.getenv("ANALYZE_BATCH_MAX_PHOTOS", 50))
+ANALYZE_BATCH_FETCH_WORKERS = int(os.getenv("ANALYZE_BATCH_FETCH_WORKERS", 8))
+
+# Prefetch settings. When enabled, the top photos of each /places response
+# are downloaded and labeled in the background so the /analyze click that
+# usually follows is a cache hit. PREFETCH_RATE caps jobs per second.
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "False") == "True"
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", 3))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 2))
+PREFETCH_QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", 100))
+PREFETCH_RATE = float(os.getenv("PREFETCH_RATE", 2))
+
+# Photo cache settings. Photos are kept on disk and served with an ETag so
+# browsers and the CDN can revalidate instead of re-downloading them.
+PHOTO_CACHE_DIR = os.getenv("PHOTO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bobross-photo-cache"))
+PHOTO_CACHE_MAX_BYTES = int(os.getenv("PHOTO_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+PHOTO_CACHE_MAX_AGE = int(os.getenv("PHOTO_CACHE_MAX_AGE", 7 * 24 * 60 * 60))  # Cache-Control max-age
+PHOTO_CHUNK_SIZE = 64 * 1024
+
+# "memory" matches labels with the in-process SubjectMatcher, "sql" queries
+# the subjects table per request (and supports the trigram threshold below)
+SUBJECT_MATCHING = os.getenv("SUBJECT_MATCHING", "memory")
+SUBJECT_SYNONYMS_PATH = os.getenv("SUBJECT_SYNONYMS_PATH")  # Optional JSON {label: [subject names]}
+
+# Set to e.g. 0.4 to also match subjects by trigram similarity (needs pg_trgm)
+SUBJECT_SIMILARITY_THRESHOLD = float(os.getenv("SUBJECT_SIMILARITY_THRESHOLD") or 0) or None
+
+# Request and stage timings are always recorded for /metrics, this only
+# controls whether they're also sent to clients as a Server-Timing header
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "True") == "True"
+
+# Photo color settings. /analyze also finds the photo's dominant colors
+# locally (needs Pillow), maps them to the nearest paints and ranks episodes
+# by palette. The colors come from the photo bytes already fetched for the
+# labels, or from the photo cache, so they never cost an extra Photo or
+# Vision call.
+PHOTO_COLORS_ENABLED = os.getenv("PHOTO_COLORS_ENABLED", "True") == "True"
+COLOR_MATCH_LIMIT = int(os.getenv("COLOR_MATCH_LIMIT", 10))
 
 # Initialize Google Vision client
-vision_client = vision.ImageAnnotatorClient()
+if VISION_API_ENDPOINT:
+    from google.auth.credentials import AnonymousCredentials
+    vision_client = vision.ImageAnnotatorClient(
+        credentials=AnonymousCredentials(),
+        transport="rest",
+        client_options={"api_endpoint": VISION_API_ENDPOINT},
+    )
+else:
+    vision_client = vision.ImageAnnotatorClient()
+
+# Shared keep-alive client for the Places/Photo calls
+http_client = HttpClient()
+# Passed to every Vision call so a stalled one can't hold a request thread
+vision_call_retry = vision_retry()
+
+metrics = Metrics()
+instrument(app, metrics, server_timing_header=SERVER_TIMING_ENABLED)
+log_requests(app)
+
+label_cache = LRUCache(
+    max_entries=LABEL_CACHE_MAX_ENTRIES,
+    ttl=LABEL_CACHE_TTL,
+    store=SQLiteStore(LABEL_CACHE_PATH, ttl=LABEL_CACHE_TTL, max_entries=LABEL_CACHE_MAX_ENTRIES * 10)
+    if LABEL_CACHE_PATH else None,
+)
+
+photo_cache = PhotoCache(PHOTO_CACHE_DIR, PHOTO_CACHE_MAX_BYTES)
+
+places_cache = LRUCache(max_entries=PLACES_CACHE_MAX_ENTRIES, ttl=PLACES_CACHE_TTL)
+# Concurrent misses for the same region share one upstream call
+places_flight = SingleFlight()
+
+analysis_cache = LRUCache(max_entries=ANALYSIS_CACHE_MAX_ENTRIES)
+data_version = DataVersion(on_change=analysis_cache.clear)
+
+subject_matcher = SubjectMatcher(load_synonyms(SUBJECT_SYNONYMS_PATH) if SUBJECT_SYNONYMS_PATH else None)
+subject_matcher_data = Reloadable(subject_matcher, "Subject matcher")
+
+color_cache = LRUCache(max_entries=LABEL_CACHE_MAX_ENTRIES, ttl=LABEL_CACHE_TTL)
+palette_index = PaletteIndex()
+# The episode palettes, loaded on first use like the subject matcher
+palette_index_data = Reloadable(palette_index, "Palette index")
+
+def match_subjects(labels):
+    """
+    Resolve labels to subjects in memory, loading the subjects table on first
+    use and reloading it whenever database/load_data.py signals a change.
+    """
+    return subject_matcher_data.get().resolve(labels)
+
+def photo_params(photo_reference):
+    return {
+        "photoreference": photo_reference,
+        "key": GOOGLE_API_KEY,
+        "maxwidth": PHOTO_MAX_WIDTH,
+    }
+
+def format_places(data):
+    return [
+        {
+            "name": place.get("name"),
+            "location": place.get("formatted_address"),
+            "photo_reference": place["photos"][0]["photo_reference"] if "photos" in place else None,
+        }
+        for place in data.get("results", [])
+    ]
+
+def normalize_region(region):
+    return " ".join(region.split()).lower()
+
+def places_search_params(region):
+    return {
+        "query": f"nature in {region}",
+        "key": GOOGLE_API_KEY
+    }
+
+def cacheable_places_response(data):
+    # Don't cache quota or auth errors, only real answers
+    return data.get("status") in (None, "OK", "ZERO_RESULTS")
+
+def search_places(region):
+    """
+    Return the places for a region from the places cache, calling the
+    text search at most once per region no matter how many requests wait on it.
+    """
+    key = normalize_region(region)
+    places = places_cache.get(key)
+    if places is not None:
+        return places
+
+    def fetch():
+        with metrics.span("places_search", upstream="places"):
+            response = http_client.get(PLACE_SEARCH_URL, params=places_search_params(key))
+            data = response.json()
+        places = format_places(data)
+        if cacheable_places_response(data):
+            places_cache.set(key, places)
+        return places
+
+    return places_flight.do(key, fetch)
+
+def places_stats(flight):
+    cache = places_cache.stats()
+    flights = flight.stats()
+    requests_served = cache["hits"] + cache["misses"]
+    return {
+        "cache": cache,
+        "flight": flights,
+        "requests": requests_served,
+        "upstream_calls": flights["calls"],
+        "upstream_calls_saved": requests_served - flights["calls"],
+    }
+
+def photo_cache_headers(key):
+    return {
+        "ETag": f'"{photo_cache.etag(key)}"',
+        "Cache-Control": f"public, max-age={PHOTO_CACHE_MAX_AGE}, immutable",
+    }
+
+def get_photo_bytes(photo_reference):
+    """
+    Return the photo's bytes from the photo cache, downloading it on a miss.
+    """
+    key = photo_cache.key(photo_reference, PHOTO_MAX_WIDTH)
+    cached = photo_cache.read(key)
+    if cached is not None:
+        return cached[0]
+
+    with metrics.span("photo_download", upstream="places_photo"):
+        photo_response = http_client.get(PHOTO_URL, params=photo_params(photo_reference))
+        photo_response.raise_for_status()
+    photo_cache.put(key, photo_response.content, photo_response.headers.get("Content-Type", "image/jpeg"))
+    return photo_response.content
+
+def detect_labels(content):
+    with metrics.span("vision", upstream="vision"):
+        response = vision_client.label_detection(
+            image=Image(content=content), retry=vision_call_retry, timeout=VISION_TIMEOUT,
+        )
+    return [label.description.strip().lower() for label in response.label_annotations]
+
+def get_labels(photo_reference):
+    """
+    Return the Vision labels for a photo, only downloading the photo and
+    calling label_detection when they aren't cached yet.
+    """
+    labels = label_cache.get(photo_reference)
+    if labels is not None:
+        logger.debug("Label cache hit for reference: %s", photo_reference)
+        return labels
+    return label_photo(photo_reference)
+
+def label_photo(photo_reference):
+    """
+    Download a photo, label it and cache the labels (and its colors).
+    """
+    content = get_photo_bytes(photo_reference)
+    labels = detect_labels(content)
+    label_cache.set(photo_reference, labels)
+    if PHOTO_COLORS_ENABLED:
+        find_colors(photo_reference, content)
+    return labels
+
+def warm_labels(photo_reference):
+    """
+    Prefetch job. Checks the label cache with `in` rather than get(), so
+    background warming doesn't count toward its hits and misses.
+    """
+    if photo_reference not in label_cache:
+        label_photo(photo_reference)
+
+def find_colors(photo_reference, content):
+    """
+    Extract and cache a photo's dominant colors. A photo that can't be
+    decoded is cached with no colors so it isn't tried again.
+    """
+    try:
+        with metrics.span("colors_extract"):
+            colors = extract_colors(content)
+    except Exception as e:
+        logger.warning("Could not extract colors for reference %s: %s", photo_reference, e)
+        colors = []
+    color_cache.set(photo_reference, colors)
+    return colors
+
+def get_dominant_colors(photo_reference):
+    """
+    Return [(hex, share)] for a photo, or None when the colors weren't
+    found along with the labels and the photo isn't in the photo cache.
+    """
+    colors = color_cache.get(photo_reference)
+    if colors is not None:
+        return colors
+
+    cached = photo_cache.read(photo_cache.key(photo_reference, PHOTO_MAX_WIDTH))
+    if cached is None:
+        return None
+    return find_colors(photo_reference, cached[0])
+
+def analyze_colors(photo_reference):
+    """
+    The photo's dominant colors with their nearest paints, and the episodes
+    whose palettes are most like those paints. None when it can't be done,
+    /analyze still answers with the label matches.
+    """
+    if not PHOTO_COLORS_ENABLED:
+        return None
+    try:
+        colors = get_dominant_colors(photo_reference)
+        if not colors:
+            return None
+        with metrics.span("colors_match"):
+            index = palette_index_data.get()
+            paints = index.nearest_paints([code for code, _ in colors])
+            matches = index.like_colors(list(dict.fromkeys(code for _, code, _ in paints)), COLOR_MATCH_LIMIT)
+    except Exception as e:
+        logger.warning("No photo colors for reference %s: %s", photo_reference, e)
+        return None
+
+    return {
+        "dominant_colors": [
+            {"hex": code, "share": share, "paint": {"name": name, "hex": paint_code}, "delta_e": round(distance, 2)}
+            for (code, share), (name, paint_code, distance) in zip(colors, paints)
+        ],
+        "matched_episodes": [
+            {
+                "episode_id": episode_id,
+                "title": title,
+                "air_date": air_date,
+                "season_episode": season_episode,
+                "score": round(score, 4),
+            }
+            for (episode_id, season_episode, title, air_date), score in matches
+        ],
+    }
+
+# Shared by all /analyze/batch requests so concurrent downloads stay bounded
+photo_fetch_executor = ThreadPoolExecutor(max_workers=ANALYZE_BATCH_FETCH_WORKERS, thread_name_prefix="photo-fetch")
+
+def fetch_photo_or_error(photo_reference):
+    try:
+        return get_photo_bytes(photo_reference), None
+    except Exception as e:
+        return None, str(e)
+
+def get_labels_batch(photo_references):
+    """
+    Return ({photo_reference: labels}, {photo_reference: error}) for many
+    photos. Cached labels are reused, the rest are downloaded concurrently
+    and labeled with batch_annotate_images, VISION_BATCH_SIZE at a time.
+    """
+    labels = {}
+    errors = {}
+    missing = []
+    for photo_reference in dict.fromkeys(photo_references):
+        cached = label_cache.get(photo_reference)
+        if cached is not None:
+            labels[photo_reference] = cached
+        else:
+            missing.append(photo_reference)
+
+    fetched = []
+    for photo_reference, (content, error) in zip(missing, photo_fetch_executor.map(fetch_photo_or_error, missing)):
+        if error is not None:
+            errors[photo_reference] = error
+        else:
+            fetched.append((photo_reference, content))
+
+    feature = vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION)
+    for start in range(0, len(fetched), VISION_BATCH_SIZE):
+        chunk = fetched[start:start + VISION_BATCH_SIZE]
+        with metrics.span("vision_batch", upstream="vision"):
+            response = vision_client.batch_annotate_images(requests=[
+                vision.AnnotateImageRequest(image=Image(content=content), features=[feature])
+                for _, content in chunk
+            ], retry=vision_call_retry, timeout=VISION_TIMEOUT)
+        for (photo_reference, _), result in zip(chunk, response.responses):
+            if result.error.message:
+                errors[photo_reference] = result.error.message
+                continue
+            labels[photo_reference] = [label.description.strip().lower() for label in result.label_annotations]
+            label_cache.set(photo_reference, labels[photo_reference])
+
+    if PHOTO_COLORS_ENABLED:
+        for photo_reference, content in fetched:
+            find_colors(photo_reference, content)
+
+    return labels, errors
+
+prefetcher = Prefetcher(
+    warm_labels,
+    workers=PREFETCH_WORKERS,
+    max_queue=PREFETCH_QUEUE_SIZE,
+    rate=PREFETCH_RATE,
+) if PREFETCH_ENABLED else None
+
+def prefetch_places(places):
+    """
+    Queue the first PREFETCH_TOP_N photos of a /places response for warming.
+    """
+    if prefetcher is None:
+        return
+    photo_references = [
+        place["photo_reference"] for place in places[:PREFETCH_TOP_N]
+        if place["photo_reference"] and place["photo_reference"] not in label_cache
+    ]
+    prefetcher.submit(photo_references)
+
+# Episodes featuring any of the matched subjects, each listed once, in the
+# same (air_date, episode_id) keyset order and cursor format as /episodes
+HAS_MATCHED_SUBJECT = """
+    EXISTS (
+        SELECT 1 FROM episodesubjects es
+        WHERE es.episode_id = e.episode_id AND es.subject_id = ANY(%s)
+    )
+"""
+
+def analyze_labels(extracted_labels, page_size, cursor=None):
+    """
+    Match labels to subjects and return one page of the matching episodes,
+    shaped like the /analyze response. `cursor` is the next_cursor of the
+    previous page. Results are cached until the data version changes.
+    """
+    version = data_version.get()
+    if version is None:
+        return match_episodes(extracted_labels, page_size, cursor)
+
+    key = (version[0], tuple(extracted_labels), page_size, cursor)
+    result = analysis_cache.get(key)
+    if result is None:
+        result = match_episodes(extracted_labels, page_size, cursor)
+        analysis_cache.set(key, result)
+    return result
+
+def match_episodes(extracted_labels, page_size, cursor=None):
+    matched_episodes = []
+    after = decode_cursor(cursor) if cursor else None
+    sql_episodes_query = f"""
+        SELECT e.episode_id, e.title, e.air_date, e.season_episode, e.youtube_link
+        FROM episodes e
+        WHERE {HAS_MATCHED_SUBJECT} {"AND " + KEYSET_FILTER if after else ""}
+        ORDER BY e.air_date, e.episode_id
+        LIMIT %s;
+    """
+    total_query = f"SELECT COUNT(*) FROM episodes e WHERE {HAS_MATCHED_SUBJECT};"
+
+    with metrics.span("subjects"):
+        if SUBJECT_MATCHING == "sql":
+            with connection() as conn, conn.cursor() as cursor:
+                matched_subjects = find_subjects(cursor, extracted_labels, SUBJECT_SIMILARITY_THRESHOLD)
+        else:
+            matched_subjects = match_subjects(extracted_labels)
+    subject_ids = [subject["subject_id"] for subject in matched_subjects]
+
+    total_episodes = 0
+    next_cursor = None
+    if subject_ids:
+        with connection() as conn, conn.cursor() as db_cursor:
+            with metrics.span("episodes_count"):
+                db_cursor.execute(total_query, (subject_ids,))
+                total_episodes = db_cursor.fetchone()[0]
+
+            # Fetch one extra row to know whether there is a next page
+            with metrics.span("episodes_page"):
+                db_cursor.execute(sql_episodes_query, [subject_ids, *(after or ()), page_size + 1])
+                episodes = db_cursor.fetchall()
+            if len(episodes) > page_size:
+                episodes = episodes[:page_size]
+                next_cursor = encode_cursor(episodes[-1][2], episodes[-1][0])
+            for episode in episodes:
+                matched_episodes.append({
+                    "episode_id": episode[0],
+                    "title": episode[1],
+                    "air_date": episode[2],
+                    "season_episode": episode[3],
+                    "youtube_link": episode[4]
+                })
+
+    logger.debug("Matched subjects: %s", matched_subjects)
+    logger.debug("Matched episodes: %s", matched_episodes)
+    logger.debug("Total episodes for subject_id %s: %s", subject_ids, total_episodes)
+
+    return {
+        "labels": extracted_labels,
+        "matched_subjects": matched_subjects,
+        "matched_episodes": matched_episodes,
+        "pagination": {
+            "total_episodes": total_episodes,
+            "page_size": page_size,
+            "total_pages": (total_episodes + page_size - 1) // page_size,
+            "next_cursor": next_cursor
+        }
+    }
 
 @app.route("/")
 def root():
-    logger.info("Redirecting to index.html")
+    logger.debug("Redirecting to index.html")
     return redirect("/index.html")
 
 @app.route("/<path:filename>")
 def serve_static(filename):
-    logger.info(f"Serving static file: {filename}")
+    logger.debug("Serving static file: %s", filename)
     return send_from_directory(app.static_folder, filename)
 
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify({
+        "labels": label_cache.stats(),
+        "photos": photo_cache.stats(),
+        "places": places_stats(places_flight),
+        "analysis": analysis_cache.stats(),
+        "colors": color_cache.stats(),
+    })
+
+@app.route("/db/stats", methods=["GET"])
+def get_db_stats():
+    return jsonify(pool_stats())
+
+@app.route("/prefetch", methods=["GET"])
+def get_prefetch_stats():
+    return jsonify(prefetcher.stats() if prefetcher is not None else {"enabled": False})
+
+@app.route("/prefetch", methods=["DELETE"])
+def cancel_prefetch():
+    if prefetcher is not None:
+        prefetcher.cancel()
+    return jsonify(prefetcher.stats() if prefetcher is not None else {"enabled": False})
+
 @app.route("/places", methods=["GET"])
 def get_places():
     try:
@@ -56,27 +554,16 @@ def get_places():
             logger.warning("Region is missing in /places request")
             return jsonify({"error": "Region is required"}), 400
 
-        logger.info(f"Fetching places for region: {region}")
-        params = {
-            "query": f"nature in {region}",
-            "key": GOOGLE_API_KEY
-        }
-        response = requests.get(PLACE_SEARCH_URL, params=params)
-        data = response.json()
-
-        places = [
-            {
-                "name": place.get("name"),
-                "location": place.get("formatted_address"),
-                "photo_reference": place["photos"][0]["photo_reference"] if "photos" in place else None,
-            }
-            for place in data.get("results", [])
-        ]
+        logger.debug("Fetching places for region: %s", region)
+        places = search_places(region)
 
-        logger.info(f"Found {len(places)} places for region {region}")
-        return jsonify(places)
+        logger.debug("Found %d places for region %s", len(places), region)
+        response = jsonify(places)
+        # Queue the prefetch once the places list has gone out
+        response.call_on_close(lambda: prefetch_places(places))
+        return response
     except Exception as e:
-        logger.error(f"Error in /places: {e}")
+        logger.error("Error in /places: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/photo", methods=["GET"])
@@ -87,25 +574,49 @@ def get_photo():
             logger.warning("Missing photo_reference in /photo request")
             return jsonify({"error": "Missing photo_reference"}), 400
 
-        logger.info(f"Fetching photo for reference: {photo_reference}")
-        response = requests.get(
-            PHOTO_URL,
-            params={
-                "photoreference": photo_reference,
-                "key": GOOGLE_API_KEY,
-                "maxwidth": 800,
-            },
-            stream=True,
-        )
-        response.raise_for_status()
+        key = photo_cache.key(photo_reference, PHOTO_MAX_WIDTH)
+        headers = photo_cache_headers(key)
+        if request.if_none_match.contains(photo_cache.etag(key)):
+            return Response(status=304, headers=headers)
 
-        logger.info(f"Photo fetched successfully for reference: {photo_reference}")
-        return send_file(
-            BytesIO(response.content),
-            mimetype=response.headers["Content-Type"]
-        )
+        cached = photo_cache.open(key)
+        if cached is not None:
+            logger.debug("Serving cached photo for reference: %s", photo_reference)
+            path, content_type = cached
+            response = send_file(path, mimetype=content_type, etag=False, conditional=False)
+            response.headers.update(headers)
+            return response
+
+        logger.debug("Fetching photo for reference: %s", photo_reference)
+        # Only up to the response headers, the body streams after the view returns
+        with metrics.span("photo_download", upstream="places_photo"):
+            upstream = http_client.get(PHOTO_URL, params=photo_params(photo_reference), stream=True)
+            try:
+                upstream.raise_for_status()
+                content_type = upstream.headers["Content-Type"]
+            except Exception:
+                upstream.close()
+                raise
+
+        # Pass the image through chunk by chunk while writing it to the cache
+        def stream():
+            writer = photo_cache.writer(key, content_type)
+            try:
+                for chunk in upstream.iter_content(PHOTO_CHUNK_SIZE):
+                    writer.write(chunk)
+                    yield chunk
+                writer.commit()
+                logger.debug("Photo fetched successfully for reference: %s", photo_reference)
+            finally:
+                writer.abort()
+                upstream.close()
+
+        response = Response(stream(), mimetype=content_type, headers=headers)
+        # stream() never runs its finally if the client leaves before the first chunk
+        response.call_on_close(upstream.close)
+        return response
     except Exception as e:
-        logger.error(f"Error in /photo: {e}")
+        logger.error("Error in /photo: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/analyze", methods=["POST"])
@@ -116,110 +627,57 @@ def analyze_photo():
             logger.warning("Missing photo_reference in /analyze request")
             return jsonify({"error": "Missing photo_reference"}), 400
 
-        logger.info(f"Analyzing photo with reference: {photo_reference}")
-        photo_response = requests.get(
-            PHOTO_URL,
-            params={
-                "photoreference": photo_reference,
-                "key": GOOGLE_API_KEY,
-                "maxwidth": 800,
-            },
-            stream=True,
-        )
-        photo_response.raise_for_status()
+        try:
+            page_size = max(1, int(request.args.get("page_size", 10)))
+            cursor = request.args.get("cursor")
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        image = Image(content=photo_response.content)
-        response = vision_client.label_detection(image=image)
-        labels = response.label_annotations
-
-        extracted_labels = [label.description.strip().lower() for label in labels]
-        logger.info(f"Extracted Labels: {extracted_labels}")
-
-        matched_subjects = []
-        matched_episodes = []
-        sql_subjects_query = """
-            SELECT subject_id, name
-            FROM subjects
-            WHERE name ILIKE %s
-        """
-
-        sql_episodes_query = """
-            SELECT e.episode_id, e.title, e.air_date, e.season_episode, e.youtube_link
-            FROM episodes e
-            INNER JOIN episodesubjects es ON e.episode_id = es.episode_id
-            WHERE es.subject_id IN %s
-            LIMIT %s OFFSET %s;
-        """
-        total_query = """
-            SELECT COUNT(*)
-            FROM episodes e
-            INNER JOIN episodesubjects es ON e.episode_id = es.episode_id
-            WHERE es.subject_id IN %s;
-        """
-
-        conn = psycopg2.connect(
-            dbname="painting_db",
-            user="postgres",
-            password="Juikiuj*88*",
-            host="localhost",
-            port="5432"
-        )
-        cursor = conn.cursor()
-
-        subject_ids = []
-        for label in extracted_labels:
-            cursor.execute(sql_subjects_query, (label,))
-            results = cursor.fetchall()
-            for result in results:
-                if result[0] not in subject_ids:
-                    subject_ids.append(result[0])
-                    matched_subjects.append({"subject_id": result[0], "name": result[1]})
-        
-        page = max(1, int(request.args.get("page", 1)))
-        page_size = max(1, int(request.args.get("page_size", 10)))
-        offset = (page - 1) * page_size
-
-        total_episodes = 0
-        if subject_ids:
-            cursor.execute(total_query, (tuple(subject_ids),))
-            total_episodes = cursor.fetchone()[0]
-
-            cursor.execute(sql_episodes_query, (tuple(subject_ids), page_size, offset))
-            episodes = cursor.fetchall()
-            for episode in episodes:
-                matched_episodes.append({
-                    "episode_id": episode[0],
-                    "title": episode[1],
-                    "air_date": episode[2],
-                    "season_episode": episode[3],
-                    "youtube_link": episode[4]
-                })
-        
-        logger.info(f"Matched subjects: {matched_subjects}")
-        logger.info(f"Matched episodes: {matched_episodes}")
-        logger.info(f"Total episodes for subject_id {subject_ids}: {total_episodes}")
+        logger.debug("Analyzing photo with reference: %s", photo_reference)
+        extracted_labels = get_labels(photo_reference)
+        logger.debug("Extracted Labels: %s", extracted_labels)
+
+        result = analyze_labels(extracted_labels, page_size, cursor)
+        return jsonify({**result, "colors": analyze_colors(photo_reference)})
 
     except Exception as e:
-        logger.error(f"Error in /analyze: {e}")
+        logger.error("Error in /analyze: %s", e)
         return jsonify({"error": str(e)}), 500
-    
-    finally:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
-    return jsonify({
-        "labels": extracted_labels, 
-        "matched_subjects": matched_subjects,
-        "matched_episodes": matched_episodes,
-        "pagination": {
-            "total_episodes": total_episodes,
-            "current_page": page,
-            "page_size": page_size,
-            "total_pages": (total_episodes + page_size - 1) // page_size
-        }
-    })
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_photos_batch():
+    try:
+        photo_references = (request.json or {}).get("photo_references")
+        if not photo_references or not isinstance(photo_references, list):
+            logger.warning("Missing photo_references in /analyze/batch request")
+            return jsonify({"error": "photo_references must be a non-empty list"}), 400
+        if not all(isinstance(photo_reference, str) for photo_reference in photo_references):
+            return jsonify({"error": "photo_references must be a list of strings"}), 400
+        if len(photo_references) > ANALYZE_BATCH_MAX_PHOTOS:
+            return jsonify({"error": f"At most {ANALYZE_BATCH_MAX_PHOTOS} photo_references per request"}), 400
+
+        try:
+            page_size = max(1, int(request.args.get("page_size", 10)))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        logger.debug("Analyzing %d photos in a batch", len(photo_references))
+        labels, errors = get_labels_batch(photo_references)
+
+        results = []
+        for photo_reference in photo_references:
+            if photo_reference in errors:
+                results.append({"photo_reference": photo_reference, "error": errors[photo_reference]})
+            else:
+                result = analyze_labels(labels[photo_reference], page_size)
+                results.append({"photo_reference": photo_reference, **result})
+        return jsonify({"results": results})
+
+    except Exception as e:
+        logger.error("Error in /analyze/batch: %s", e)
+        return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
     logger.info("Starting Flask app")
@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from urllib.parse import parse_qs
+
+# Make the project root importable when served as `uvicorn backend.asgi:application`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.app import (
+    PHOTO_COLORS_ENABLED, PHOTO_MAX_WIDTH, PHOTO_URL, PLACE_SEARCH_URL, SERVER_TIMING_ENABLED,
+    analysis_cache, analyze_colors, analyze_labels, app, cacheable_places_response, color_cache, detect_labels,
+    find_colors, format_places, label_cache, logger, metrics, normalize_region, photo_cache, photo_cache_headers,
+    photo_params, places_cache, places_search_params, places_stats, prefetch_places,
+)
+from api.episode_query import decode_cursor
+from backend.cache import AsyncSingleFlight
+from backend.log_setup import ACCESS_LOGGER, log_request
+from backend.metrics import request_timings, server_timing
+from backend.upstream import AsyncHttpClient
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError as e:
+    raise ImportError("The async serving mode needs asgiref: pip install asgiref httpx uvicorn") from e
+
+# Async serving mode. /places, /photo and /analyze await their Google calls
+# on one shared keep-alive client, so a single worker can hold many upstream
+# calls in flight. Vision and the database are blocking clients, so those
+# steps run in worker threads. Every other route goes to the Flask app.
+#
+#   uvicorn backend.asgi:application --port 5005
+
+wsgi_application = WsgiToAsgi(app)
+http_client = None
+places_flight = AsyncSingleFlight()
+
+
+def get_http_client():
+    # Created lazily so it binds to the server's event loop
+    global http_client
+    if http_client is None:
+        http_client = AsyncHttpClient()
+    return http_client
+
+
+def encode_headers(headers):
+    return [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+
+
+async def send_response(send, status, body, content_type="application/json", headers=None):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ] + encode_headers(headers or {}),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, data):
+    await send_response(send, status, app.json.dumps(data).encode())
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def query_params(scope):
+    return {key: values[0] for key, values in parse_qs(scope["query_string"].decode()).items()}
+
+
+def request_header(scope, name):
+    name = name.lower().encode()
+    for header, value in scope.get("headers", []):
+        if header == name:
+            return value.decode()
+    return None
+
+
+async def get_photo_bytes(photo_reference):
+    """
+    Async counterpart of backend.app.get_photo_bytes, sharing its photo cache.
+    """
+    key = photo_cache.key(photo_reference, PHOTO_MAX_WIDTH)
+    cached = await asyncio.to_thread(photo_cache.read, key)
+    if cached is not None:
+        return cached[0]
+
+    with metrics.span("photo_download", upstream="places_photo"):
+        photo_response = await get_http_client().get(PHOTO_URL, params=photo_params(photo_reference))
+        photo_response.raise_for_status()
+    content_type = photo_response.headers.get("Content-Type", "image/jpeg")
+    await asyncio.to_thread(photo_cache.put, key, photo_response.content, content_type)
+    return photo_response.content
+
+
+async def get_labels(photo_reference):
+    """
+    Async counterpart of backend.app.get_labels, sharing its label cache.
+    """
+    labels = label_cache.get(photo_reference)
+    if labels is not None:
+        logger.debug("Label cache hit for reference: %s", photo_reference)
+        return labels
+
+    content = await get_photo_bytes(photo_reference)
+    labels = await asyncio.to_thread(detect_labels, content)
+    label_cache.set(photo_reference, labels)
+    if PHOTO_COLORS_ENABLED:
+        await asyncio.to_thread(find_colors, photo_reference, content)
+    return labels
+
+
+async def search_places(region):
+    """
+    Async counterpart of backend.app.search_places, sharing its places cache.
+    """
+    key = normalize_region(region)
+    places = places_cache.get(key)
+    if places is not None:
+        return places
+
+    async def fetch():
+        with metrics.span("places_search", upstream="places"):
+            response = await get_http_client().get(PLACE_SEARCH_URL, params=places_search_params(key))
+            data = response.json()
+        places = format_places(data)
+        if cacheable_places_response(data):
+            places_cache.set(key, places)
+        return places
+
+    return await places_flight.do(key, fetch)
+
+
+async def cache_stats(scope, receive, send):
+    await send_json(send, 200, {
+        "labels": label_cache.stats(),
+        "photos": photo_cache.stats(),
+        "places": places_stats(places_flight),
+        "analysis": analysis_cache.stats(),
+        "colors": color_cache.stats(),
+    })
+
+
+async def places(scope, receive, send):
+    try:
+        region = query_params(scope).get("region", "")
+        if not region:
+            logger.warning("Region is missing in /places request")
+            await send_json(send, 400, {"error": "Region is required"})
+            return
+
+        logger.debug("Fetching places for region: %s", region)
+        places = await search_places(region)
+
+        logger.debug("Found %d places for region %s", len(places), region)
+        await send_json(send, 200, places)
+        prefetch_places(places)
+    except Exception as e:
+        logger.error("Error in /places: %s", e)
+        await send_json(send, 500, {"error": str(e)})
+
+
+async def photo(scope, receive, send):
+    photo_reference = query_params(scope).get("photo_reference")
+    if not photo_reference:
+        logger.warning("Missing photo_reference in /photo request")
+        await send_json(send, 400, {"error": "Missing photo_reference"})
+        return
+
+    key = photo_cache.key(photo_reference, PHOTO_MAX_WIDTH)
+    headers = photo_cache_headers(key)
+    if_none_match = request_header(scope, "if-none-match") or ""
+    if headers["ETag"] in if_none_match or if_none_match.strip() == "*":
+        await send_response(send, 304, b"", headers=headers)
+        return
+
+    cached = await asyncio.to_thread(photo_cache.read, key)
+    if cached is not None:
+        logger.debug("Serving cached photo for reference: %s", photo_reference)
+        content, content_type = cached
+        await send_response(send, 200, content, content_type, headers)
+        return
+
+    logger.debug("Fetching photo for reference: %s", photo_reference)
+    try:
+        with metrics.span("photo_download", upstream="places_photo"):
+            response = await get_http_client().stream(PHOTO_URL, params=photo_params(photo_reference))
+            response.raise_for_status()
+    except Exception as e:
+        logger.error("Error in /photo: %s", e)
+        await send_json(send, 500, {"error": str(e)})
+        return
+
+    # Pass the image through chunk by chunk while writing it to the cache
+    # The cache writes go to a thread like the reads, a slow disk would stall the loop
+    content_type = response.headers["Content-Type"]
+    writer = await asyncio.to_thread(photo_cache.writer, key, content_type)
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type.encode()),
+                (b"access-control-allow-origin", b"*"),
+            ] + encode_headers(headers),
+        })
+        async for chunk in response.aiter_bytes():
+            await asyncio.to_thread(writer.write, chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+        await asyncio.to_thread(writer.commit)
+        logger.debug("Photo fetched successfully for reference: %s", photo_reference)
+    finally:
+        await asyncio.to_thread(writer.abort)
+        await response.aclose()
+
+
+async def analyze(scope, receive, send):
+    try:
+        data = app.json.loads(await read_body(receive) or b"{}")
+        photo_reference = data.get("photo_reference")
+        if not photo_reference:
+            logger.warning("Missing photo_reference in /analyze request")
+            await send_json(send, 400, {"error": "Missing photo_reference"})
+            return
+
+        params = query_params(scope)
+        try:
+            page_size = max(1, int(params.get("page_size", 10)))
+            cursor = params.get("cursor")
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError as e:
+            await send_json(send, 400, {"error": str(e)})
+            return
+
+        logger.debug("Analyzing photo with reference: %s", photo_reference)
+        extracted_labels = await get_labels(photo_reference)
+        logger.debug("Extracted Labels: %s", extracted_labels)
+
+        result = await asyncio.to_thread(analyze_labels, extracted_labels, page_size, cursor)
+        colors = await asyncio.to_thread(analyze_colors, photo_reference)
+        await send_json(send, 200, {**result, "colors": colors})
+    except Exception as e:
+        logger.error("Error in /analyze: %s", e)
+        await send_json(send, 500, {"error": str(e)})
+
+
+ROUTES = {
+    ("GET", "/cache/stats"): cache_stats,
+    ("GET", "/places"): places,
+    ("GET", "/photo"): photo,
+    ("POST", "/analyze"): analyze,
+}
+
+
+access_logger = logging.getLogger(ACCESS_LOGGER)
+
+
+async def timed(route, scope, receive, send):
+    """
+    Run a native route with the request timing backend.metrics.instrument
+    gives the Flask views: the duration by route and status for /metrics,
+    the stages so far in a Server-Timing header, and the access log line.
+    """
+    started = time.perf_counter()
+    token = request_timings.set({})
+    status = 500
+
+    async def send_timed(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            if SERVER_TIMING_ENABLED:
+                timing = server_timing({**request_timings.get(), "total": time.perf_counter() - started})
+                message = {**message, "headers": [*message["headers"], (b"server-timing", timing.encode())]}
+        await send(message)
+
+    try:
+        await route(scope, receive, send_timed)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.request_done(scope["path"], scope["method"], status, elapsed)
+        log_request(access_logger, scope["method"], scope["path"], scope["path"], status, elapsed)
+        request_timings.reset(token)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                get_http_client()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if http_client is not None:
+                    await http_client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    route = ROUTES.get((scope.get("method"), scope.get("path")))
+    if route is not None:
+        await timed(route, scope, receive, send)
+    else:
+        await wsgi_application(scope, receive, send)
@@ -0,0 +1,219 @@
+import atexit
+import datetime
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from backend.metrics import request_timings
+
+# Logging for the backend. Request threads only put records on an in-memory
+# queue; a listener thread formats them and writes them to a size-rotated
+# JSON-lines file and the console, so a slow disk never holds up a request.
+# Levels are set per logger, busy INFO loggers can be sampled, and every
+# request gets one structured line on the "backend.access" logger.
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+ACCESS_LOGGER = "backend.access"
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def parse_levels(spec):
+    """
+    {logger name: level} from "backend.access=INFO,werkzeug=WARNING".
+    ValueError for an unknown level.
+    """
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, level = item.partition("=")
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level for {name.strip()}: {level}")
+        levels[name.strip()] = level
+    return levels
+
+
+def parse_rates(spec):
+    """
+    {logger name: fraction kept} from "backend.access=0.1".
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, rate = item.partition("=")
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate for {name.strip()} must be between 0 and 1: {rate}")
+        rates[name.strip()] = rate
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps `rate` of the INFO and DEBUG records of the given loggers (and
+    their children); warnings and errors always go through. Deterministic,
+    e.g. 0.25 keeps exactly every fourth record.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._credit = {}
+        self._lock = threading.Lock()
+
+    def rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return name, self.rates[name]
+            name = name.rpartition(".")[0]
+        return None, 1.0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        name, rate = self.rate_for(record.name)
+        if rate >= 1:
+            return True
+        with self._lock:
+            # The first record is kept, then one every 1/rate
+            credit = self._credit.get(name, 1.0 - rate) + rate
+            keep = credit >= 1 - 1e-9
+            self._credit[name] = credit - 1 if keep else credit
+        return keep
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, and whatever
+    was passed as extra={"fields": {...}}.
+    """
+
+    def format(self, record):
+        created = datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+        entry = {
+            "time": created.isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+    QueueHandler for a listener in the same process. The stock one formats
+    every record on the calling thread so it can be pickled; here the
+    record is queued as is, and the %-formatting happens on the listener
+    thread. Don't log objects that are changed right after.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level="INFO", levels=None, sample_rates=None, path="app.log",
+                  max_bytes=10 * 1024 * 1024, backup_count=5, console=True):
+    """
+    Route all logging through a queue to a rotating JSON-lines file at
+    `path` (None for no file) and the console. `levels` and `sample_rates`
+    are {logger name: ...} overrides. Safe to call again, the previous
+    listener is stopped first. Returns the listener.
+    """
+    global _listener
+    handlers = []
+    if path:
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(console_handler)
+
+    queue_handler = LocalQueueHandler(queue.SimpleQueue())
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    with _listener_lock:
+        stop_logging()
+        root = logging.getLogger()
+        # Like basicConfig(force=True), but other code's handlers are
+        # only detached, not closed
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+        for name, logger_level in (levels or {}).items():
+            logging.getLogger(name).setLevel(logger_level)
+
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """
+    Write out everything still queued and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def log_request(logger, method, path, route, status, seconds, **fields):
+    """
+    The one structured line per request: INFO, or WARNING for a 5xx.
+    """
+    level = logging.WARNING if status >= 500 else logging.INFO
+    if not logger.isEnabledFor(level):
+        return
+    entry = {
+        "method": method,
+        "path": path,
+        "route": route,
+        "status": status,
+        "duration_ms": round(seconds * 1000, 2),
+        **fields,
+    }
+    timings = request_timings.get()
+    if timings:
+        entry["stages_ms"] = {stage: round(elapsed * 1000, 2) for stage, elapsed in timings.items()}
+    logger.log(level, "%s %s %s %.1fms", method, path, status, seconds * 1000, extra={"fields": entry})
+
+
+def log_requests(app, logger=None):
+    """
+    Log every request of a Flask app with log_request(). For streamed
+    responses the duration is up to the first byte.
+    """
+    from flask import g, request
+
+    logger = logger or logging.getLogger(ACCESS_LOGGER)
+
+    @app.before_request
+    def start_request_log():
+        g.log_started = time.perf_counter()
+
+    @app.after_request
+    def finish_request_log(response):
+        started = g.pop("log_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            log_request(logger, request.method, request.path, route, response.status_code,
+                        time.perf_counter() - started, bytes=response.content_length)
+        return response
+
+    return app
@@ -0,0 +1,246 @@
+import bisect
+import contextvars
+import threading
+import time
+
+# Latency histograms and counters for the Flask services, exposed at
+# /metrics in the Prometheus text format. Requests and the stages inside
+# them (photo download, Vision, subject and episode queries, ...) are timed
+# with span(); each stage also goes into the request's Server-Timing header
+# so it shows up in the browser's network panel. Recording an observation
+# is a perf_counter() call, a bisect and a locked increment, a few
+# microseconds, so it stays on in production.
+
+# Seconds. Prometheus' default buckets with two more below 5ms, where the
+# cache hits and in-memory lookups land.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "http_request_duration_seconds": "Time to handle a request, by route",
+    "http_requests_total": "Requests handled, by route and status",
+    "stage_duration_seconds": "Time spent in each stage of a request",
+    "stage_errors_total": "Stages that raised an exception",
+    "upstream_calls_total": "Calls to Google and other upstream services",
+    "upstream_errors_total": "Upstream calls that failed",
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# {stage: seconds} of the request being handled, for Server-Timing
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def server_timing(timings):
+    """
+    Server-Timing header value for {stage: seconds}, durations in ms.
+    """
+    return ", ".join(f"{name.replace(' ', '_')};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+class Span:
+    """
+    Times one stage, see Metrics.span(). A plain class rather than a
+    @contextmanager generator, which would cost more than the timing.
+    """
+
+    __slots__ = ("metrics", "stage", "upstream", "started")
+
+    def __init__(self, metrics, stage, upstream):
+        self.metrics = metrics
+        self.stage = stage
+        self.upstream = upstream
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self.started
+        failed = exc_type is not None and issubclass(exc_type, Exception)
+        self.metrics._span_done(self.stage, self.upstream, elapsed, failed)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[self.stage] = timings.get(self.stage, 0.0) + elapsed
+        return False
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets):
+        # Per bucket, not cumulative; the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and histograms. Metric names get the
+    namespace prefix, labels are passed as keyword arguments:
+
+        metrics.inc("upstream_calls_total", service="vision")
+        with metrics.span("subjects"):
+            ...
+    """
+
+    def __init__(self, namespace="bobross", buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._observe(key, seconds)
+
+    def _observe(self, key, seconds):
+        # Callers hold the lock
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self.buckets)
+        histogram.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        histogram.sum += seconds
+        histogram.count += 1
+
+    def span(self, stage, upstream=None):
+        """
+        Time a stage into stage_duration_seconds and the request's
+        Server-Timing. `upstream` names the service the stage calls, to
+        count it (and its failures) in upstream_calls_total.
+        """
+        return Span(self, stage, upstream)
+
+    def _span_done(self, stage, upstream, seconds, failed):
+        # One lock round trip for everything a span records
+        stage_labels = (("stage", stage),)
+        with self._lock:
+            self._observe(("stage_duration_seconds", stage_labels), seconds)
+            counters = self._counters
+            if failed:
+                key = ("stage_errors_total", stage_labels)
+                counters[key] = counters.get(key, 0) + 1
+            if upstream:
+                service_labels = (("service", upstream),)
+                key = ("upstream_calls_total", service_labels)
+                counters[key] = counters.get(key, 0) + 1
+                if failed:
+                    key = ("upstream_errors_total", service_labels)
+                    counters[key] = counters.get(key, 0) + 1
+
+    def request_done(self, route, method, status, seconds):
+        self.observe("http_request_duration_seconds", seconds, route=route, method=method)
+        self.inc("http_requests_total", route=route, method=method, status=status)
+
+    def get(self, name, **labels):
+        """
+        A counter's value, or a histogram's observation count. For tests.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key in self._histograms:
+                return self._histograms[key].count
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Everything recorded so far, in the Prometheus text format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(histogram.counts), histogram.sum, histogram.count))
+                for key, histogram in self._histograms.items()
+            )
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {self.namespace}_{name} {HELP[name]}")
+                lines.append(f"# TYPE {self.namespace}_{name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{self.namespace}_{name}{format_labels(labels)} {format_value(value)}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = format_labels(labels, [("le", format_value(float(bound)))])
+                lines.append(f"{self.namespace}_{name}_bucket{le} {cumulative}")
+            lines.append(f"{self.namespace}_{name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{self.namespace}_{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def instrument(app, metrics, server_timing_header=True):
+    """
+    Time every request of a Flask app by route, add the Server-Timing
+    header, and serve the metrics at GET /metrics.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request():
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = request_timings.set({})
+
+    @app.after_request
+    def finish_request(response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.request_done(route, request.method, response.status_code, elapsed)
+        timings = request_timings.get()
+        if server_timing_header and timings is not None:
+            response.headers["Server-Timing"] = server_timing({**timings, "total": elapsed})
+        return response
+
+    @app.teardown_request
+    def reset_timings(exc=None):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            request_timings.reset(token)
+
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class PhotoCacheWriter:
+    """
+    Collects a photo as it streams in and only adds it to the cache once
+    commit() is called, so a half-downloaded photo never gets served.
+    """
+
+    def __init__(self, cache, key, content_type):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        fd, self.temp_path = tempfile.mkstemp(dir=cache.directory, prefix=".partial-")
+        self._file = os.fdopen(fd, "wb")
+        self.size = 0
+        self.done = False
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        self.done = True
+        self.cache._commit(self.key, self.temp_path, self.size, self.content_type)
+
+    def abort(self):
+        if self.done:
+            return
+        self.done = True
+        self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+class PhotoCache:
+    """
+    Size-capped on-disk cache of Place Photos, keyed by a hash of the
+    photo_reference and maxwidth. The least recently used photos are
+    deleted once the total size goes over max_bytes.
+
+    A photo_reference always points at the same image, so the key doubles
+    as the ETag and stays valid even after the file is evicted.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def key(photo_reference, maxwidth):
+        return hashlib.sha256(f"{maxwidth}:{photo_reference}".encode()).hexdigest()
+
+    @staticmethod
+    def etag(key):
+        return key[:32]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _scan(self):
+        # Pick up photos from a previous run, oldest access first
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".partial-"):
+                os.remove(path)
+            elif not name.endswith(".type") and os.path.exists(path + ".type"):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+        self._evict()
+
+    def open(self, key):
+        """
+        Return (path, content_type) for a cached photo, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            with open(path + ".type") as file:
+                content_type = file.read()
+            os.utime(path)
+        except OSError:
+            # Deleted behind our back, treat it as a miss
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return path, content_type
+
+    def read(self, key):
+        """
+        Return (content, content_type) for a cached photo, or None on a miss.
+        """
+        cached = self.open(key)
+        if cached is None:
+            return None
+        path, content_type = cached
+        try:
+            with open(path, "rb") as file:
+                return file.read(), content_type
+        except OSError:
+            return None
+
+    def writer(self, key, content_type):
+        return PhotoCacheWriter(self, key, content_type)
+
+    def put(self, key, content, content_type):
+        writer = self.writer(key, content_type)
+        try:
+            writer.write(content)
+            writer.commit()
+        finally:
+            writer.abort()
+
+    def _commit(self, key, temp_path, size, content_type):
+        path = self._path(key)
+        with open(path + ".type", "w") as file:
+            file.write(content_type)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+        self._evict()
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                if self._total <= self.max_bytes or len(self._entries) <= 1:
+                    return
+                key, size = self._entries.popitem(last=False)
+                self._total -= size
+                self.evictions += 1
+            for path in (self._path(key), self._path(key) + ".type"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._total = 0
+        for key in keys:
+            for path in (self._path(key), self._path(key) + ".type"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
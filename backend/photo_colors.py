@@ -0,0 +1,123 @@
+import io
+
+import numpy as np
+
+from api.palette_index import rgb_to_lab
+
+# Dominant colors of a photo, worked out locally so /analyze can match
+# episodes by palette without another Vision feature. The photo is decoded
+# straight to a small thumbnail, its pixels are binned into a coarse RGB
+# histogram, and the bins are clustered with a weighted k-means in Lab.
+# Decoding needs Pillow, which is optional.
+
+# Longest side of the thumbnail the colors are taken from
+SAMPLE_SIZE = 64
+
+# Colors to find, and the least share of the photo one needs to be kept
+DOMINANT_COLORS = 5
+MIN_SHARE = 0.05
+
+# Bits kept per RGB channel when binning, 5 leaves at most 32,768 bins
+QUANTIZE_BITS = 5
+
+KMEANS_ITERATIONS = 20
+
+
+def require_pillow():
+    try:
+        from PIL import Image
+    except ImportError as e:
+        raise ImportError("Photo colors need Pillow: pip install Pillow") from e
+    return Image
+
+
+def decode_pixels(content, size=SAMPLE_SIZE):
+    """
+    (n, 3) uint8 RGB pixels of an image, shrunk so its longest side is at
+    most `size`. JPEGs are decoded at a reduced scale (draft mode), so an
+    800px photo never gets decoded at full size.
+    """
+    Image = require_pillow()
+    with Image.open(io.BytesIO(content)) as image:
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+        image.thumbnail((size, size), Image.BILINEAR)
+        return np.asarray(image, dtype=np.uint8).reshape(-1, 3)
+
+
+def quantize(pixels, bits=QUANTIZE_BITS):
+    """
+    Bin pixels into a 2**bits levels per channel histogram. Returns the
+    occupied bins' mean colors as an (m, 3) float array, and their pixel
+    counts.
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    shift = 8 - bits
+    binned = (pixels >> shift).astype(np.int64)
+    keys = (binned[:, 0] << (2 * bits)) | (binned[:, 1] << bits) | binned[:, 2]
+    size = 1 << (3 * bits)
+    counts = np.bincount(keys, minlength=size)
+    occupied = np.flatnonzero(counts)
+    sums = np.stack([np.bincount(keys, weights=pixels[:, axis], minlength=size)[occupied] for axis in range(3)], axis=1)
+    return sums / counts[occupied, None], counts[occupied]
+
+
+def kmeans(points, weights, k, iterations=KMEANS_ITERATIONS):
+    """
+    Weighted k-means over (m, 3) points. Returns each point's cluster.
+    Starts from the heaviest point, then repeatedly the point that adds the
+    most weighted squared distance (a deterministic k-means++), so the same
+    photo always gives the same colors.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    k = min(k, len(points))
+    centers = [points[weights.argmax()]]
+    nearest = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        centers.append(points[(weights * nearest).argmax()])
+        nearest = np.minimum(nearest, ((points - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    labels = None
+    for _ in range(iterations):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        totals = np.bincount(labels, weights=weights, minlength=k)
+        for axis in range(points.shape[1]):
+            sums = np.bincount(labels, weights=weights * points[:, axis], minlength=k)
+            # An empty cluster keeps its old center
+            centers[:, axis] = np.where(totals > 0, sums / np.maximum(totals, 1e-12), centers[:, axis])
+    return labels
+
+
+def dominant_colors(pixels, k=DOMINANT_COLORS, min_share=MIN_SHARE):
+    """
+    [('#RRGGBB', share)] of a photo's main colors, most of the photo first.
+    Colors covering less than `min_share` of it are left out.
+    """
+    colors, counts = quantize(pixels)
+    if not len(colors):
+        return []
+    labels = kmeans(rgb_to_lab(colors), counts, k)
+
+    totals = np.bincount(labels, weights=counts, minlength=labels.max() + 1)
+    result = []
+    for cluster in np.argsort(-totals, kind="stable"):
+        share = totals[cluster] / counts.sum()
+        if share < min_share:
+            continue
+        members = labels == cluster
+        # Report the cluster's mean in RGB, it's what the pixels averaged to
+        rgb = np.rint((colors[members] * counts[members, None]).sum(axis=0) / totals[cluster]).astype(int)
+        result.append(("#{:02X}{:02X}{:02X}".format(*rgb), round(float(share), 4)))
+    return result
+
+
+def extract_colors(content, k=DOMINANT_COLORS):
+    """
+    Dominant colors of an encoded image (JPEG, PNG, ...).
+    """
+    return dominant_colors(decode_pixels(content), k)
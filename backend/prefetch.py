@@ -0,0 +1,176 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` operations per second with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop=None):
+        """
+        Block until a token is available. Returns False if `stop` (a
+        threading.Event) gets set while waiting.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class Prefetcher:
+    """
+    Small bounded job queue that calls `warm(photo_reference)` on background
+    threads, e.g. to fill the photo and label caches before the user clicks.
+
+    Jobs are deduplicated while queued or running, dropped when the queue is
+    full, rate limited to protect the Google quota, and queued jobs can be
+    cancelled. Worker threads start on the first submit.
+    """
+
+    def __init__(self, warm, workers=2, max_queue=100, rate=2.0, burst=None):
+        self.warm = warm
+        self.workers = workers
+        self.limiter = RateLimiter(rate, burst)
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._cancelled = set()
+        self._threads = []
+        self._stop = threading.Event()
+
+        self.submitted = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, photo_references):
+        """
+        Queue photo references for warming. Returns how many were queued.
+        """
+        queued = 0
+        with self._lock:
+            if self._stop.is_set():
+                return 0
+            if not self._threads:
+                self._start()
+            for photo_reference in photo_references:
+                if photo_reference in self._pending:
+                    self.duplicates += 1
+                    continue
+                try:
+                    self._queue.put_nowait(photo_reference)
+                except queue.Full:
+                    self.dropped += 1
+                    continue
+                self._pending.add(photo_reference)
+                self._cancelled.discard(photo_reference)
+                self.submitted += 1
+                queued += 1
+        return queued
+
+    def cancel(self, photo_references=None):
+        """
+        Cancel queued jobs: the given references, or everything if None.
+        Jobs that are already running finish normally.
+        """
+        with self._lock:
+            if photo_references is None:
+                while True:
+                    try:
+                        photo_reference = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._pending.discard(photo_reference)
+                    self._queue.task_done()
+                    self.cancelled += 1
+            else:
+                self._cancelled.update(ref for ref in photo_references if ref in self._pending)
+
+    def _work(self):
+        while True:
+            photo_reference = self._queue.get()
+            try:
+                if photo_reference is None:
+                    return
+                with self._lock:
+                    if photo_reference in self._cancelled:
+                        self._cancelled.discard(photo_reference)
+                        self._pending.discard(photo_reference)
+                        self.cancelled += 1
+                        continue
+                if not self.limiter.acquire(self._stop):
+                    return
+                with self._lock:
+                    self.running += 1
+                try:
+                    self.warm(photo_reference)
+                    with self._lock:
+                        self.completed += 1
+                except Exception as e:
+                    logger.warning("Prefetch failed for reference %s: %s", photo_reference, e)
+                    with self._lock:
+                        self.failed += 1
+                finally:
+                    with self._lock:
+                        self.running -= 1
+                        self._pending.discard(photo_reference)
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """
+        Wait until every queued job has been handled (mostly for tests).
+        """
+        self._queue.join()
+
+    def shutdown(self):
+        self.cancel()
+        self._stop.set()
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "running": self.running,
+                "workers": self.workers,
+                "rate": self.limiter.rate,
+                "submitted": self.submitted,
+                "duplicates": self.duplicates,
+                "dropped": self.dropped,
+                "cancelled": self.cancelled,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
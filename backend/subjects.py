@@ -0,0 +1,208 @@
+import json
+import re
+import threading
+
+# Subject names are stored the way the ETL produced them (e.g. "palm_trees"),
+# so both sides are compared as lowercase words separated by single spaces.
+# The expression must match the indexes in database/schema.sql.
+NORMALIZED_NAME_SQL = "lower(replace(s.name, '_', ' '))"
+
+SUBJECTS_QUERY = f"""
+    SELECT s.subject_id, s.name
+    FROM unnest(%(labels)s::text[]) WITH ORDINALITY AS l(label, ord)
+    JOIN subjects s ON {NORMALIZED_NAME_SQL} = l.label
+    GROUP BY s.subject_id, s.name
+    ORDER BY min(l.ord), s.subject_id;
+"""
+
+# `%%` is pg_trgm's similarity operator (escaped for psycopg2). It compares
+# against pg_trgm.similarity_threshold, which lets it use the GIN index.
+SUBJECTS_SIMILARITY_QUERY = f"""
+    SET LOCAL pg_trgm.similarity_threshold = %(threshold)s;
+    SELECT s.subject_id, s.name
+    FROM unnest(%(labels)s::text[]) WITH ORDINALITY AS l(label, ord)
+    JOIN subjects s ON {NORMALIZED_NAME_SQL} = l.label OR {NORMALIZED_NAME_SQL} %% l.label
+    GROUP BY s.subject_id, s.name
+    ORDER BY min(l.ord), s.subject_id;
+"""
+
+
+def normalize_label(label):
+    """
+    Lowercase a label or subject name and turn underscores/whitespace runs into single spaces.
+    """
+    return re.sub(r"[\s_]+", " ", label).strip().lower()
+
+
+def find_subjects(cursor, labels, similarity_threshold=None):
+    """
+    Match Vision labels to subjects in a single query.
+
+    Returns a list of {"subject_id", "name"} dicts in label order. When
+    similarity_threshold is set (0-1), labels also match subjects by
+    trigram similarity, so "mountains" finds "mountain" as well.
+    """
+    normalized = list(dict.fromkeys(normalize_label(label) for label in labels if label))
+    if not normalized:
+        return []
+
+    if similarity_threshold:
+        cursor.execute(SUBJECTS_SIMILARITY_QUERY, {"labels": normalized, "threshold": similarity_threshold})
+    else:
+        cursor.execute(SUBJECTS_QUERY, {"labels": normalized})
+
+    return [{"subject_id": row[0], "name": row[1]} for row in cursor.fetchall()]
+
+
+# Vision labels that mean one of our subjects without sharing its name.
+# Values are subject names as stored in the subjects table.
+DEFAULT_SYNONYMS = {
+    "sea": ["ocean"],
+    "coast": ["beach", "ocean"],
+    "shore": ["beach"],
+    "sand": ["beach"],
+    "wind wave": ["waves"],
+    "conifer": ["conifer", "tree"],
+    "pine": ["conifer", "tree"],
+    "spruce": ["conifer", "tree"],
+    "fir": ["conifer", "tree"],
+    "evergreen": ["conifer", "tree"],
+    "forest": ["trees"],
+    "woods": ["trees"],
+    "woodland": ["trees", "deciduous"],
+    "arecales": ["palm_trees"],
+    "palm tree": ["palm_trees"],
+    "shrub": ["bushes"],
+    "shrubland": ["bushes"],
+    "flower": ["flowers"],
+    "grassland": ["grass"],
+    "meadow": ["grass"],
+    "prairie": ["grass"],
+    "mountain range": ["mountains"],
+    "mountainous landforms": ["mountains"],
+    "summit": ["mountain"],
+    "highland": ["hills"],
+    "cloud": ["clouds"],
+    "sky": ["clouds"],
+    "mist": ["fog"],
+    "haze": ["fog"],
+    "stream": ["river"],
+    "creek": ["river"],
+    "pond": ["lake"],
+    "reservoir": ["lake"],
+    "loch": ["lake"],
+    "body of water": ["lake"],
+    "sunset": ["sun"],
+    "sunrise": ["sun"],
+    "hut": ["cabin"],
+    "cottage": ["cabin"],
+    "log cabin": ["cabin"],
+    "house": ["cabin", "building"],
+    "rock": ["rocks"],
+    "boulder": ["rocks"],
+    "bedrock": ["rocks"],
+    "pier": ["dock"],
+    "freezing": ["snow", "winter"],
+}
+
+
+def stem(phrase):
+    """
+    Very small plural stemmer, applied per word: "trees" -> "tree",
+    "bushes" -> "bush", "skies" -> "sky". Good enough for Vision labels.
+    """
+    words = []
+    for word in phrase.split(" "):
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes", "zes")):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+class SubjectMatcher:
+    """
+    In-memory label -> subject matcher.
+
+    The subjects table only has a few dozen rows, so it's loaded once and
+    indexed by normalized name, stemmed name and synonyms. resolve() then
+    never touches the database. Call refresh() (or wire it to a NOTIFY from
+    database/load_data.py) when the table changes.
+    """
+
+    def __init__(self, synonyms=None):
+        self.synonyms = {
+            normalize_label(label): [normalize_label(name) for name in names]
+            for label, names in (synonyms if synonyms is not None else DEFAULT_SYNONYMS).items()
+        }
+        self._index = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    @property
+    def loaded(self):
+        return self._index is not None
+
+    def load(self, rows):
+        """
+        Build the index from (subject_id, name) rows.
+        """
+        subjects = {}
+        by_name = {}
+        by_stem = {}
+        for subject_id, name in rows:
+            subjects[subject_id] = name
+            normalized = normalize_label(name)
+            by_name.setdefault(normalized, []).append(subject_id)
+            by_stem.setdefault(stem(normalized), []).append(subject_id)
+
+        # Resolve synonyms to ids once, so lookups are a couple of dict hits
+        index = {}
+        for key, ids in by_stem.items():
+            index.setdefault(key, []).extend(ids)
+        for key, ids in by_name.items():
+            index.setdefault(key, []).extend(ids)
+        for label, names in self.synonyms.items():
+            for name in names:
+                ids = by_name.get(name, [])
+                index.setdefault(label, []).extend(ids)
+                index.setdefault(stem(label), []).extend(ids)
+        index = {key: tuple(dict.fromkeys(ids)) for key, ids in index.items() if ids}
+
+        # Swap in one assignment so concurrent resolve() calls see old or new, never half
+        self._index = (index, subjects)
+        self.loads += 1
+
+    def refresh(self, cursor):
+        cursor.execute("SELECT subject_id, name FROM subjects;")
+        with self._lock:
+            self.load(cursor.fetchall())
+
+    def resolve(self, labels):
+        """
+        Match labels to subjects, returning {"subject_id", "name"} dicts in label order.
+        """
+        if self._index is None:
+            raise RuntimeError("SubjectMatcher has not been loaded")
+        index, subjects = self._index
+
+        matched = {}
+        for label in labels:
+            if not label:
+                continue
+            normalized = normalize_label(label)
+            for key in (normalized, stem(normalized)):
+                for subject_id in index.get(key, ()):
+                    matched.setdefault(subject_id, subjects[subject_id])
+        return [{"subject_id": subject_id, "name": name} for subject_id, name in matched.items()]
+
+
+def load_synonyms(path):
+    """
+    Read a JSON {label: [subject names]} file and merge it over the defaults.
+    """
+    with open(path) as file:
+        return {**DEFAULT_SYNONYMS, **json.load(file)}
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import random
+import threading
+
+import requests
+from google.api_core import exceptions as google_exceptions
+from google.api_core import retry as google_retry
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared HTTP clients for the Google Places/Photo calls. Both keep connections
+# alive between requests, time out slow responses, cap how many calls are in
+# flight at once and retry transient failures with exponential backoff.
+# The Vision calls get the same treatment through vision_retry().
+#
+#   UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT   seconds
+#   UPSTREAM_MAX_CONNECTIONS                          keep-alive pool size
+#   UPSTREAM_MAX_CONCURRENCY                          in-flight calls per process
+#   UPSTREAM_RETRIES, UPSTREAM_BACKOFF                retry count and base delay
+#   UPSTREAM_VISION_TIMEOUT                           seconds per Vision call, retries included
+
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 10))
+MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 50))
+MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", 100))
+RETRIES = int(os.getenv("UPSTREAM_RETRIES", 2))
+BACKOFF = float(os.getenv("UPSTREAM_BACKOFF", 0.2))
+VISION_TIMEOUT = float(os.getenv("UPSTREAM_VISION_TIMEOUT", 20))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpClient:
+    """
+    Blocking client used by the Flask views: a requests.Session with a
+    keep-alive connection pool and urllib3 retries.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_concurrency=MAX_CONCURRENCY,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_connections,
+            pool_maxsize=max_connections,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(["GET", "POST"]),
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def get(self, url, params=None, stream=False):
+        """
+        GET url. With stream=True the call keeps its concurrency slot until
+        the returned response is closed, so close it when done reading.
+        """
+        self._slots.acquire()
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+        except BaseException:
+            self._slots.release()
+            raise
+        if not stream:
+            self._slots.release()
+            return response
+        return StreamedResponse(response, self._slots.release)
+
+    def close(self):
+        self.session.close()
+
+
+class StreamedResponse:
+    """
+    A streamed requests.Response that gives back its HttpClient slot once
+    closed (or used as a context manager). Anything else goes to the
+    response.
+    """
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def close(self):
+        try:
+            self._response.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def vision_retry(timeout=VISION_TIMEOUT, backoff=BACKOFF):
+    """
+    Retry for the Vision client calls: transient errors are retried with
+    exponential backoff until `timeout` seconds have passed. Pass the same
+    timeout= to the call so a stalled attempt can't outlast it.
+    """
+    return google_retry.Retry(
+        predicate=google_retry.if_exception_type(
+            google_exceptions.TooManyRequests,
+            google_exceptions.InternalServerError,
+            google_exceptions.BadGateway,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.GatewayTimeout,
+        ),
+        initial=backoff,
+        multiplier=2,
+        maximum=timeout,
+        timeout=timeout,
+    )
+
+
+class AsyncHttpClient:
+    """
+    Non-blocking client for the ASGI serving mode (backend/asgi.py), built
+    on httpx. One worker can keep up to max_concurrency calls in flight.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_concurrency=MAX_CONCURRENCY,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("The async serving mode needs httpx: pip install httpx") from e
+        self._httpx = httpx
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.retries = retries
+        self.backoff = backoff
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def _send(self, request, stream):
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = await self.client.send(request, stream=stream)
+            except (self._httpx.TransportError, self._httpx.TimeoutException):
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                await response.aclose()
+            # Exponential backoff with jitter, like urllib3's backoff_factor
+            await asyncio.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    async def get(self, url, params=None):
+        """
+        Fetch url and return the fully read httpx.Response.
+        """
+        async with self._slots:
+            return await self._send(self.client.build_request("GET", url, params=params), stream=False)
+
+    async def stream(self, url, params=None):
+        """
+        Fetch url without reading the body. The caller must `await response.aclose()`.
+        """
+        async with self._slots:
+            return await self._send(self.client.build_request("GET", url, params=params), stream=True)
+
+    async def close(self):
+        await self.client.aclose()
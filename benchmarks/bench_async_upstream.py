@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Make the project root importable when run as `python3 benchmarks/bench_async_upstream.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.stub_google import start_stub_server
+
+# Compares one blocking Flask worker with one ASGI worker (backend/asgi.py)
+# when every /places call waits on a slow upstream. Both run against the
+# local stub, so no Google quota is used.
+
+
+async def drive(base_url, requests_total, concurrency):
+    import httpx
+
+    slots = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one(i):
+            nonlocal errors
+            async with slots:
+                # Distinct regions so nothing downstream can serve it from a cache
+                response = await client.get(f"{base_url}/places", params={"region": f"Region {i}"})
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests_total)))
+        return time.perf_counter() - started, errors
+
+
+def serve_wsgi(app, port):
+    from werkzeug.serving import make_server
+
+    # threaded=False: one request at a time, like a single sync worker
+    server = make_server("127.0.0.1", port, app, threaded=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve_asgi(application, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(application, host="127.0.0.1", port=port, log_level="warning", workers=1))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sync and async serving throughput against the stub")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--port", type=int, default=5105)
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency_ms=args.latency_ms, jitter_ms=0)
+    stub_url = f"http://127.0.0.1:{stub.server_port}"
+    os.environ["GOOGLE_MAPS_BASE_URL"] = stub_url
+    os.environ["VISION_API_ENDPOINT"] = stub_url
+    os.environ.setdefault("GOOGLE_API_KEY", "stub-key")
+
+    import logging
+    from backend.app import app
+    from backend.asgi import application
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{args.requests} /places requests, concurrency {args.concurrency}, upstream latency {args.latency_ms}ms")
+    for name, serve, target, port in [
+        ("sync (1 Flask worker)", serve_wsgi, app, args.port),
+        ("async (1 ASGI worker)", serve_asgi, application, args.port + 1),
+    ]:
+        serve(target, port)
+        elapsed, errors = asyncio.run(drive(f"http://127.0.0.1:{port}", args.requests, args.concurrency))
+        print(f"{name:<24} {args.requests / elapsed:>8.1f} req/s  {elapsed:>6.2f}s  errors={errors}")
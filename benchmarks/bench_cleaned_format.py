@@ -0,0 +1,114 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+# Make the project root importable when run as `python3 benchmarks/bench_cleaned_format.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.bench_load_data import drop_database, recreate_database
+from database.load_data import load_all, read_cleaned_data
+from etl import cleaned_data
+from etl.manifest import episode_hashes
+from etl.etl_pipline import (
+    clean_colors, clean_episode_colors, clean_episodes, clean_subjects, get_absolute_path, save_cleaned_data,
+)
+
+# Cleans the raw files once, repeats every episode --scale times, then for
+# CSV and Feather times writing the cleaned tables, reading them back the
+# way database/load_data.py does and loading them into a scratch database
+# (skipped when PostgreSQL isn't reachable). Needs pyarrow:
+#
+#   python3 benchmarks/bench_cleaned_format.py --scale 20
+
+# name, categorical columns, loaded
+TABLES = [
+    ('colors_cleaned', [], False),
+    ('episode_colors_cleaned', ['color', 'color_hex'], True),
+    ('subjects_cleaned', ['subject'], True),
+    ('episodes_cleaned', [], True),
+]
+
+
+def clean_raw():
+    colors_path = get_absolute_path('data/raw/colors_used.csv')
+    colors = clean_colors(colors_path)
+    return {
+        'colors_cleaned': colors,
+        'episode_colors_cleaned': clean_episode_colors(colors_path),
+        'subjects_cleaned': clean_subjects(get_absolute_path('data/raw/subject_matter.csv')),
+        'episodes_cleaned': clean_episodes(get_absolute_path('data/raw/episode_dates.csv'), colors),
+    }
+
+
+def scale_up(frames, scale):
+    """
+    Repeat every episode `scale` times under new Season-Episode codes.
+    """
+    def repeat(frame):
+        copies = []
+        for copy in range(scale):
+            frame_copy = frame.copy()
+            if copy:
+                frame_copy['Season-Episode'] = frame_copy['Season-Episode'] + f"-{copy}"
+            copies.append(frame_copy)
+        return pd.concat(copies, ignore_index=True)
+
+    return {name: repeat(frame) for name, frame in frames.items()}
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CSV against Feather cleaned data")
+    parser.add_argument("--scale", type=int, default=1, help="copies of every episode")
+    parser.add_argument("--database", default="painting_db_bench", help="scratch database, dropped afterwards")
+    args = parser.parse_args()
+
+    cleaned_data.require_pyarrow()
+    frames, clean_seconds = timed(clean_raw)
+    frames = scale_up(frames, args.scale)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in (cleaned_data.CSV, cleaned_data.FEATHER):
+            paths = {name: os.path.join(directory, name + extension) for name, _, _ in TABLES}
+
+            def write():
+                for name, categories, _ in TABLES:
+                    save_cleaned_data(frames[name], paths[name], categories)
+
+            _, write_seconds = timed(write)
+            size = sum(os.path.getsize(path) for path in paths.values())
+            loaded_paths = [paths['episodes_cleaned'], paths['subjects_cleaned'], paths['episode_colors_cleaned']]
+            data, read_seconds = timed(lambda: read_cleaned_data(loaded_paths))
+
+            load_seconds = None
+            try:
+                conn = recreate_database(args.database)
+            except Exception as e:
+                print(f"Database not reachable ({e}), not timing the load")
+            else:
+                try:
+                    _, load_seconds, _ = load_all(conn, *data, hashes=episode_hashes(loaded_paths))
+                finally:
+                    conn.close()
+                    drop_database(args.database)
+            results[extension] = (size, write_seconds, read_seconds, load_seconds)
+
+    print()
+    print(f"cleaning {clean_seconds:.2f} s for either format, {len(frames['episodes_cleaned'])} episodes")
+    for extension, (size, write_seconds, read_seconds, load_seconds) in results.items():
+        total = clean_seconds + write_seconds + read_seconds + (load_seconds or 0)
+        load = f"{load_seconds:>7.2f} s" if load_seconds is not None else "      -  "
+        print(f"{extension:<9} {size / 1024:>9.0f} KiB  write {write_seconds:>6.2f} s  read {read_seconds:>6.2f} s  "
+              f"load {load}  ETL+load {total:>7.2f} s")
@@ -0,0 +1,167 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Make the project root importable when run as `python3 benchmarks/bench_episodes_query.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from api.episode_query import build_episodes_query
+from database.db import connection
+
+# Compares the /episodes query before and after the EXISTS/HAVING rewrite on
+# a copy of the loaded data scaled up SCALE times. The copy lives in its own
+# schema, so the real tables are never touched:
+#
+#   python3 benchmarks/bench_episodes_query.py --scale 100 --plans
+
+SCHEMA = "bench_episodes"
+
+CASES = [
+    ("one subject", dict(subjects=["tree"])),
+    ("subjects or color", dict(subjects=["cabin", "lake"], colors=["Prussian Blue"])),
+    ("month or subject", dict(broadcast_months=["January"], subjects=["waterfall"])),
+    ("all subjects and colors", dict(subjects=["tree", "mountain", "lake"],
+                                     colors=["Prussian Blue", "Titanium White"], match_all=True)),
+    ("month and subject", dict(broadcast_months=["January"], subjects=["cabin"], match_all=True)),
+]
+
+NEW_INDEXES = [
+    "CREATE INDEX ON episodesubjects (subject_id, episode_id)",
+    "CREATE INDEX ON episodecolors (color_id, episode_id)",
+    "CREATE INDEX ON episodes (broadcast_month)",
+    "CREATE INDEX ON episodes (air_date, episode_id)",
+]
+
+
+def legacy_episodes_query(broadcast_months=(), subjects=(), colors=(), match_all=False):
+    # The query api/theapi.py used to build
+    query = """
+        SELECT DISTINCT e.episode_id, e.title, e.air_date, e.broadcast_month
+        FROM episodes e
+        LEFT JOIN episodesubjects es ON e.episode_id = es.episode_id
+        LEFT JOIN subjects s ON es.subject_id = s.subject_id
+        LEFT JOIN episodecolors ec ON e.episode_id = ec.episode_id
+        LEFT JOIN colors c ON ec.color_id = c.color_id
+        WHERE 1=1
+    """
+    filters = []
+    params = []
+    if broadcast_months:
+        filters.append(f"e.broadcast_month IN ({', '.join(['%s'] * len(broadcast_months))})")
+        params.extend(broadcast_months)
+    if subjects:
+        filters.append(f"s.name IN ({', '.join(['%s'] * len(subjects))})")
+        params.extend(subjects)
+    if colors:
+        filters.append(f"c.name IN ({', '.join(['%s'] * len(colors))})")
+        params.extend(colors)
+    if filters:
+        if match_all:
+            query += f" AND {' AND '.join(filters)}"
+        else:
+            query += f" AND ({' OR '.join(filters)})"
+    query += " ORDER BY e.air_date"
+    return query, params
+
+
+def build_scaled_copy(cursor, scale):
+    """
+    Copy the tables into SCHEMA with every episode repeated `scale` times,
+    keeping the same keys and constraints as database/schema.sql.
+    """
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute("SELECT max(episode_id) FROM public.episodes")
+    offset = cursor.fetchone()[0]
+
+    cursor.execute("CREATE TABLE subjects AS SELECT subject_id, name FROM public.subjects")
+    cursor.execute("ALTER TABLE subjects ADD PRIMARY KEY (subject_id), ADD UNIQUE (name)")
+    cursor.execute("CREATE TABLE colors AS SELECT color_id, name, hex_code FROM public.colors")
+    cursor.execute("ALTER TABLE colors ADD PRIMARY KEY (color_id), ADD UNIQUE (name, hex_code)")
+    cursor.execute("""
+        CREATE TABLE episodes AS
+        SELECT e.episode_id + copy * %s AS episode_id, e.title,
+               (e.air_date + make_interval(years => copy %% 40))::date AS air_date, e.broadcast_month
+        FROM public.episodes e, generate_series(0, %s - 1) AS copy
+    """, (offset, scale))
+    cursor.execute("ALTER TABLE episodes ADD PRIMARY KEY (episode_id)")
+    for table, column in (("episodesubjects", "subject_id"), ("episodecolors", "color_id")):
+        cursor.execute(f"""
+            CREATE TABLE {table} AS
+            SELECT j.episode_id + copy * %s AS episode_id, j.{column}
+            FROM public.{table} j, generate_series(0, %s - 1) AS copy
+        """, (offset, scale))
+        cursor.execute(f"ALTER TABLE {table} ADD UNIQUE (episode_id, {column})")
+    cursor.execute("ANALYZE")
+
+    cursor.execute("SELECT count(*) FROM episodes")
+    return cursor.fetchone()[0]
+
+
+def measure(cursor, query, params, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), {row[0] for row in rows}
+
+
+def explain(cursor, query, params):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+    return "\n".join(row[0] for row in cursor.fetchall())
+
+
+def run_cases(cursor, label, build_query, runs, plans):
+    print(f"\n== {label}")
+    results = {}
+    for name, filters in CASES:
+        query, params = build_query(**filters)
+        seconds, episode_ids = measure(cursor, query, params, runs)
+        results[name] = episode_ids
+        print(f"{name:<26} {seconds * 1000:>9.2f} ms  {len(episode_ids):>6} episodes")
+        if plans:
+            print(explain(cursor, query, params))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the /episodes query on a scaled-up copy of the data")
+    parser.add_argument("--scale", type=int, default=100, help="copies of every episode")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per case, the median is reported")
+    parser.add_argument("--plans", action="store_true", help="print EXPLAIN ANALYZE for every case")
+    parser.add_argument("--keep", action="store_true", help=f"keep the {SCHEMA} schema afterwards")
+    args = parser.parse_args()
+
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            episodes = build_scaled_copy(cursor, args.scale)
+            print(f"{episodes} episodes in {SCHEMA} ({args.scale}x)")
+
+            before = run_cases(cursor, "before: LEFT JOIN + DISTINCT, constraint indexes only",
+                               legacy_episodes_query, args.runs, args.plans)
+            for statement in NEW_INDEXES:
+                cursor.execute(statement)
+            cursor.execute("ANALYZE")
+            after = run_cases(cursor, "after: EXISTS / HAVING COUNT with the schema.sql indexes",
+                              build_episodes_query, args.runs, args.plans)
+
+            print()
+            for name, filters in CASES:
+                if filters.get("match_all"):
+                    # The old query accepted any one value from each list,
+                    # so match_all returned episodes missing some of them
+                    print(f"{name:<26} {len(before[name])} -> {len(after[name])} episodes (match_all fixed)")
+                elif before[name] != after[name]:
+                    print(f"{name:<26} results differ!")
+        finally:
+            if args.keep:
+                conn.commit()
+            else:
+                conn.rollback()
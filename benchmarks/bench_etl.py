@@ -0,0 +1,127 @@
+import argparse
+import ast
+import os
+import re
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+# Make the project root importable when run as `python3 benchmarks/bench_etl.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from etl.etl_pipline import clean_colors, clean_episodes, get_absolute_path, remove_special_characters
+
+# Times clean_colors and clean_episodes on the raw files repeated until
+# they have --rows rows, against the per-row versions they replaced:
+#
+#   python3 benchmarks/bench_etl.py --rows 100000
+
+
+def legacy_clean_colors(file_path):
+    """
+    clean_colors as it was, with df.apply per row and per cell (eval swapped
+    for ast.literal_eval, which costs about the same).
+    """
+    df = pd.read_csv(file_path)
+    df['Season-Episode'] = df.apply(
+        lambda row: f"S{int(row['season']):02d}E{int(row['episode']):02d}", axis=1
+    )
+    df['painting_title'] = df['painting_title'].apply(remove_special_characters)
+
+    def clean_list_field(field):
+        try:
+            if isinstance(field, str) and field.startswith('[') and field.endswith(']'):
+                field = ast.literal_eval(field)
+            cleaned_items = [remove_special_characters(str(item).strip()) for item in field]
+            return " | ".join(cleaned_items)
+        except Exception:
+            return remove_special_characters(str(field))
+
+    df['colors'] = df['colors'].apply(clean_list_field)
+    df['color_hex'] = df['color_hex'].apply(clean_list_field)
+    df['colors'] = df['colors'].str.replace('"', '', regex=False)
+    df['color_hex'] = df['color_hex'].str.replace('"', '', regex=False)
+    df = df[['Season-Episode', 'painting_title', 'colors', 'color_hex', 'youtube_src']]
+    return df.drop_duplicates(subset=['Season-Episode', 'colors', 'color_hex'])
+
+
+def legacy_clean_episodes(file_path, colors_cleaned):
+    """
+    clean_episodes as it was, matching the regex line by line.
+    """
+    with open(file_path, 'r') as file:
+        lines = file.readlines()
+
+    titles, air_dates = [], []
+    for line in lines:
+        match = re.match(r'"(.+)" \((.+)\)', line.strip())
+        if match:
+            titles.append(match.group(1))
+            air_dates.append(match.group(2))
+
+    df = pd.DataFrame({'title': titles, 'air_date': air_dates})
+    df['air_date'] = pd.to_datetime(df['air_date'], format='%B %d, %Y')
+    df['Season-Episode'] = df.index.map(
+        lambda idx: f"S{(idx // 13) + 1:02d}E{(idx % 13) + 1:02d}"
+    )
+    df = df.drop_duplicates(subset=['title', 'air_date'])
+    df = df.merge(colors_cleaned[['Season-Episode', 'youtube_src']], on='Season-Episode', how='left')
+    return df[['Season-Episode', 'title', 'air_date', 'youtube_src']]
+
+
+def write_scaled_inputs(directory, rows):
+    """
+    Repeat the raw colors and episode files up to `rows` rows, shifting the
+    season numbers (and air dates) of every copy so the keys stay unique.
+    """
+    colors = pd.read_csv(get_absolute_path('data/raw/colors_used.csv'))
+    copies = -(-rows // len(colors))
+    seasons = colors['season'].max()
+    scaled = pd.concat(
+        [colors.assign(season=colors['season'] + copy * seasons) for copy in range(copies)],
+        ignore_index=True,
+    ).head(rows)
+    colors_path = os.path.join(directory, 'colors_used.csv')
+    scaled.to_csv(colors_path, index=False)
+
+    with open(get_absolute_path('data/raw/episode_dates.csv'), 'r') as file:
+        lines = [line.strip() for line in file if line.strip()]
+    episodes_path = os.path.join(directory, 'episode_dates.csv')
+    with open(episodes_path, 'w') as file:
+        for index in range(rows):
+            line = lines[index % len(lines)]
+            # Same title on a different year, so drop_duplicates keeps it
+            file.write(re.sub(r'\d{4}\)$', lambda match: f"{int(match.group()[:4]) + index // len(lines)})", line) + '\n')
+    return colors_path, episodes_path
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized ETL cleaning")
+    parser.add_argument("--rows", type=int, default=100000, help="rows in each scaled raw file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        colors_path, episodes_path = write_scaled_inputs(directory, args.rows)
+
+        legacy_colors, legacy_colors_time = timed(lambda: legacy_clean_colors(colors_path))
+        colors, colors_time = timed(lambda: clean_colors(colors_path))
+        legacy_episodes, legacy_episodes_time = timed(lambda: legacy_clean_episodes(episodes_path, legacy_colors))
+        episodes, episodes_time = timed(lambda: clean_episodes(episodes_path, colors))
+
+    for name, legacy, legacy_time, current, current_time in [
+        ("clean_colors", legacy_colors, legacy_colors_time, colors, colors_time),
+        ("clean_episodes", legacy_episodes, legacy_episodes_time, episodes, episodes_time),
+    ]:
+        identical = legacy.to_csv(index=False) == current.to_csv(index=False)
+        print(f"{name:<15} {len(current):>8} rows  per-row {legacy_time:>7.2f} s  vectorized {current_time:>7.2f} s  "
+              f"{legacy_time / current_time:>5.1f}x  identical CSV: {identical}")
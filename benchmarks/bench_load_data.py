@@ -0,0 +1,121 @@
+import argparse
+import os
+import sys
+
+import pandas as pd
+import psycopg2
+import psycopg2.extensions
+
+# Make the project root importable when run as `python3 benchmarks/bench_load_data.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from database.db import get_db_settings
+from database.load_data import load_all, read_cleaned_data
+
+# Times database/load_data.py in both modes, each into a freshly created
+# scratch database with schema.sql applied, so the real one is untouched.
+# Needs a user that may CREATE DATABASE:
+#
+#   python3 benchmarks/bench_load_data.py --scale 10
+
+
+def scale_up(episodes_data, subjects_data, colors_data, scale):
+    """
+    Repeat every episode `scale` times under new Season-Episode codes.
+    """
+    if scale == 1:
+        return episodes_data, subjects_data, colors_data
+
+    def repeat(frame):
+        copies = []
+        for copy in range(scale):
+            frame_copy = frame.copy()
+            if copy:
+                frame_copy['season-episode'] = frame_copy['season-episode'] + f"-{copy}"
+            copies.append(frame_copy)
+        return pd.concat(copies, ignore_index=True)
+
+    return repeat(episodes_data), repeat(subjects_data), repeat(colors_data)
+
+
+def recreate_database(name):
+    admin = psycopg2.connect(**{**get_db_settings(), "dbname": "postgres"})
+    admin.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+        cursor.execute(f"CREATE DATABASE {name}")
+    admin.close()
+
+    conn = psycopg2.connect(**{**get_db_settings(), "dbname": name})
+    with open(os.path.join(project_root, 'database/schema.sql')) as file, conn.cursor() as cursor:
+        cursor.execute(file.read())
+    conn.commit()
+    return conn
+
+
+def drop_database(name):
+    admin = psycopg2.connect(**{**get_db_settings(), "dbname": "postgres"})
+    admin.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+    admin.close()
+
+
+# Table contents by natural key, so both modes can be compared even though
+# the generated ids may differ
+CONTENT_QUERIES = {
+    "episodes": "SELECT season_episode, title, air_date, broadcast_month, youtube_link FROM episodes",
+    "subjects": "SELECT name FROM subjects",
+    "colors": "SELECT name, hex_code FROM colors",
+    "episodesubjects": """
+        SELECT e.season_episode, s.name FROM episodesubjects es
+        JOIN episodes e USING (episode_id) JOIN subjects s USING (subject_id)
+    """,
+    "episodecolors": """
+        SELECT e.season_episode, c.name, c.hex_code FROM episodecolors ec
+        JOIN episodes e USING (episode_id) JOIN colors c USING (color_id)
+    """,
+}
+
+
+def table_contents(conn):
+    """
+    Return {table: (row count, md5 of the sorted rows)}.
+    """
+    contents = {}
+    with conn.cursor() as cursor:
+        for table, query in CONTENT_QUERIES.items():
+            cursor.execute(f"SELECT count(*), md5(string_agg(t::text, '|' ORDER BY t::text)) FROM ({query}) t")
+            contents[table] = cursor.fetchone()
+    return contents
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the row by row and bulk loaders")
+    parser.add_argument("--scale", type=int, default=1, help="copies of every episode to load")
+    parser.add_argument("--database", default="painting_db_bench", help="scratch database, dropped afterwards")
+    parser.add_argument("--modes", nargs="+", default=["rows", "bulk"], choices=["rows", "bulk"])
+    args = parser.parse_args()
+
+    data = scale_up(*read_cleaned_data(), args.scale)
+    results = {}
+    try:
+        for mode in args.modes:
+            conn = recreate_database(args.database)
+            try:
+                rows, seconds, _ = load_all(conn, *data, mode=mode)
+                results[mode] = (rows, seconds, table_contents(conn))
+            finally:
+                conn.close()
+    finally:
+        drop_database(args.database)
+
+    print()
+    for mode, (rows, seconds, contents) in results.items():
+        counts = {table: count for table, (count, _) in contents.items()}
+        print(f"{mode:<5} {rows:>8} rows {seconds:>8.2f} s {rows / seconds:>10.0f} rows/s  {counts}")
+    if len(results) == 2:
+        (_, rows_seconds, rows_contents), (_, bulk_seconds, bulk_contents) = results["rows"], results["bulk"]
+        print(f"bulk is {rows_seconds / bulk_seconds:.1f}x faster, same table contents: {rows_contents == bulk_contents}")
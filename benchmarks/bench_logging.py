@@ -0,0 +1,95 @@
+import argparse
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+from logging.handlers import QueueListener
+
+# Make the project root importable when run as `python3 benchmarks/bench_logging.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.log_setup import LocalQueueHandler, setup_logging, stop_logging
+
+# Compares what a request thread pays per log line with the old setup
+# (basicConfig at DEBUG, FileHandler written on the calling thread, f-string
+# dumps of the matched episodes) and with backend/log_setup.py (INFO, queued
+# to a listener thread, %-formatting only when the level is enabled), and
+# the same on a disk that stalls for a millisecond on every write.
+#
+#   python3 benchmarks/bench_logging.py --lines 20000
+
+EPISODES = [
+    {"episode_id": number, "title": f"Episode {number}", "air_date": "1983-01-11", "season_episode": f"S01E{number:02}",
+     "youtube_link": f"https://www.youtube.com/embed/{number:011}"}
+    for number in range(10)
+]
+
+
+def per_line(func, lines):
+    started = time.perf_counter()
+    for _ in range(lines):
+        func()
+    return (time.perf_counter() - started) / lines * 1e6
+
+
+class SlowFileHandler(logging.FileHandler):
+    """
+    A FileHandler on a disk that takes a millisecond per write.
+    """
+
+    def emit(self, record):
+        time.sleep(0.001)
+        super().emit(record)
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark logging on the request thread")
+    parser.add_argument("--lines", type=int, default=20000, help="log calls to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "app.log")
+        logger = logging.getLogger("bench")
+
+        logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(message)s",
+                            handlers=[logging.FileHandler(path)])
+        old_line = per_line(lambda: logger.info(f"Label cache hit for reference: {'abc123'}"), args.lines)
+        old_dump = per_line(lambda: logger.info(f"Matched episodes: {EPISODES}"), args.lines)
+        reset_root()
+
+        setup_logging("INFO", path=path, console=False)
+        queued_line = per_line(lambda: logger.info("Label cache hit for reference: %s", "abc123"), args.lines)
+        skipped_dump = per_line(lambda: logger.debug("Matched episodes: %s", EPISODES), args.lines)
+        started = time.perf_counter()
+        stop_logging()
+        drain_ms = (time.perf_counter() - started) * 1000
+
+        slow_lines = max(1, args.lines // 100)
+        reset_root()
+        logging.getLogger().addHandler(SlowFileHandler(path))
+        old_slow = per_line(lambda: logger.info("Label cache hit for reference: %s", "abc123"), slow_lines)
+        reset_root()
+        queue_handler = LocalQueueHandler(queue.SimpleQueue())
+        listener = QueueListener(queue_handler.queue, SlowFileHandler(path))
+        listener.start()
+        logging.getLogger().addHandler(queue_handler)
+        queued_slow = per_line(lambda: logger.info("Label cache hit for reference: %s", "abc123"), slow_lines)
+        listener.stop()
+        reset_root()
+
+    print(f"{'':32} {'old':>10} {'queued':>10}")
+    print(f"{'short INFO line':32} {old_line:8.2f}us {queued_line:8.2f}us")
+    print(f"{'matched episodes dump':32} {old_dump:8.2f}us {skipped_dump:8.2f}us  (DEBUG, off by default)")
+    print(f"{'short INFO line, slow disk':32} {old_slow:8.2f}us {queued_slow:8.2f}us")
+    print(f"listener finished writing the queued lines {drain_ms:.0f} ms after the last call")
@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+from flask import Flask
+
+# Make the project root importable when run as `python3 benchmarks/bench_metrics.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.metrics import Metrics, instrument
+
+# Measures what the /metrics instrumentation costs: a span around a stage,
+# an observation from several threads at once, rendering /metrics, and a
+# whole Flask request with and without instrument(). No database needed:
+#
+#   python3 benchmarks/bench_metrics.py --iterations 200000
+
+
+def per_call(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def flask_app(metrics=None):
+    app = Flask(__name__)
+
+    @app.route("/episodes")
+    def episodes():
+        if metrics is None:
+            return {"episodes": []}
+        with metrics.span("episodes_page"):
+            return {"episodes": []}
+
+    if metrics is not None:
+        instrument(app, metrics)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the metrics instrumentation")
+    parser.add_argument("--iterations", type=int, default=200000, help="spans/observations to time")
+    parser.add_argument("--requests", type=int, default=5000, help="Flask requests to time")
+    parser.add_argument("--threads", type=int, default=8, help="threads observing at once")
+    args = parser.parse_args()
+
+    metrics = Metrics()
+
+    def empty_span():
+        with metrics.span("stage", upstream="service"):
+            pass
+
+    print(f"span                 {per_call(empty_span, args.iterations):8.2f} us")
+    print(f"observe              {per_call(lambda: metrics.observe('stage_duration_seconds', 0.003, stage='x'), args.iterations):8.2f} us")
+
+    def observe_many():
+        for _ in range(args.iterations // args.threads):
+            metrics.observe("stage_duration_seconds", 0.003, stage="threads")
+
+    threads = [threading.Thread(target=observe_many) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    contended = (time.perf_counter() - started) / (args.iterations // args.threads * args.threads) * 1e6
+    print(f"observe, {args.threads} threads  {contended:8.2f} us")
+
+    for stage in range(50):
+        metrics.observe("stage_duration_seconds", 0.01, stage=f"stage {stage}")
+    print(f"render /metrics      {per_call(metrics.render, 200) / 1000:8.2f} ms  ({len(metrics.render()) // 1024} KiB)")
+
+    # Alternate the two apps and keep each one's best round, the test client
+    # varies more from run to run than the instrumentation costs
+    clients = {"plain": flask_app().test_client(), "instrumented": flask_app(Metrics()).test_client()}
+    best = {name: float("inf") for name in clients}
+    for _ in range(5):
+        for name, client in clients.items():
+            best[name] = min(best[name], per_call(lambda: client.get("/episodes"), args.requests // 5))
+    for name, seconds in best.items():
+        print(f"request, {name:<12} {seconds:8.1f} us")
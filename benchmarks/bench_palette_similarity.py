@@ -0,0 +1,110 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Make the project root importable when run as `python3 benchmarks/bench_palette_similarity.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from api.palette_index import DELTA_E_SCALE, SET_WEIGHT, PaletteIndex, delta_e, hex_to_lab
+from etl import cleaned_data
+from etl.etl_pipline import get_absolute_path
+
+# Builds the palette index from the cleaned episodes and episode colors,
+# repeated --scale times, and times /episodes/similar queries against it.
+# At scale 1 the scores are checked against a plain per-episode loop.
+# Needs no database:
+#
+#   python3 benchmarks/bench_palette_similarity.py --scale 100
+
+
+def catalog(scale):
+    """
+    (episode rows, episode color rows) from data/cleaned_up, every episode
+    repeated `scale` times under a new Season-Episode code.
+    """
+    episodes = cleaned_data.read(get_absolute_path('data/cleaned_up/episodes_cleaned.csv'))
+    colors = cleaned_data.read(get_absolute_path('data/cleaned_up/episode_colors_cleaned.csv'))
+    codes = {code: position for position, code in enumerate(episodes['Season-Episode'])}
+    episode_rows, color_rows = [], []
+    for copy in range(scale):
+        offset = copy * len(episodes)
+        suffix = f"-{copy}" if copy else ""
+        episode_rows += [
+            (offset + position, code + suffix, title, str(air_date).strip())
+            for position, (code, title, air_date) in enumerate(
+                episodes[['Season-Episode', 'title', 'air_date']].itertuples(index=False)
+            )
+        ]
+        color_rows += [
+            (offset + codes[code], name, hex_code)
+            for code, name, hex_code in colors[['Season-Episode', 'color', 'color_hex']].itertuples(index=False)
+            if code in codes
+        ]
+    return episode_rows, color_rows
+
+
+def naive_like_episode(episode_rows, color_rows, season_episode):
+    """
+    PaletteIndex.like_episode's Jaccard scores, one episode at a time.
+    """
+    palettes = {row[1]: [] for row in episode_rows}
+    by_id = {row[0]: row[1] for row in episode_rows}
+    for episode_id, name, code in color_rows:
+        palettes[by_id[episode_id]].append((name, code.upper()))
+    lab = {code: hex_to_lab([code])[0] for palette in palettes.values() for _, code in palette}
+
+    def chamfer(left, right):
+        return np.mean([min(np.linalg.norm(lab[a] - lab[b]) for _, b in right) for _, a in left])
+
+    query = palettes[season_episode]
+    scores = {}
+    for code, palette in palettes.items():
+        if code == season_episode:
+            continue
+        if not palette or not query:
+            scores[code] = SET_WEIGHT * 0.0
+            continue
+        shared = len(set(query) & set(palette))
+        overlap = shared / len(set(query) | set(palette))
+        distance = (chamfer(query, palette) + chamfer(palette, query)) / 2
+        scores[code] = SET_WEIGHT * overlap + (1 - SET_WEIGHT) / (1 + distance / DELTA_E_SCALE)
+    return scores
+
+
+def per_query(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /episodes/similar scoring")
+    parser.add_argument("--scale", type=int, default=100, help="copies of the catalog")
+    parser.add_argument("--repeat", type=int, default=200, help="queries to time")
+    args = parser.parse_args()
+
+    assert len(delta_e(hex_to_lab(['#000000']), hex_to_lab(['#FFFFFF']))) == 1
+
+    for scale in sorted({1, args.scale}):
+        episode_rows, color_rows = catalog(scale)
+        index = PaletteIndex()
+        started = time.perf_counter()
+        index.load(episode_rows, color_rows)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        episode_ms = per_query(lambda: index.like_episode('S03E05', 10), args.repeat)
+        colors_ms = per_query(lambda: index.like_colors(['#DB0000', '#102E3C', '#FFFFFF'], 10), args.repeat)
+        print(f"{len(episode_rows):>7} episodes  load {load_ms:>8.1f} ms  "
+              f"like episode {episode_ms:>7.3f} ms  like colors {colors_ms:>7.3f} ms")
+
+        if scale == 1:
+            expected = naive_like_episode(episode_rows, color_rows, 'S03E05')
+            scored = index.like_episode('S03E05', len(episode_rows))
+            worst = max(abs(score - expected[row[1]]) for row, score in scored)
+            print(f"{'':>7}           largest difference from the per-episode loop: {worst:.2e}")
@@ -0,0 +1,90 @@
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+# Make the project root importable when run as `python3 benchmarks/bench_photo_colors.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from api.palette_index import PaletteIndex, rgb_to_lab
+from backend.photo_colors import DOMINANT_COLORS, decode_pixels, dominant_colors, kmeans, require_pillow
+from benchmarks.bench_palette_similarity import catalog
+
+# Times the /analyze photo colors on synthetic 800px JPEGs (sky, hills,
+# trees and water with noise, like a Place Photo): decoding to a thumbnail,
+# finding the dominant colors, and matching them to paints and episodes.
+# For comparison it also runs k-means on every pixel of the full-size photo.
+# Needs Pillow, not the database:
+#
+#   python3 benchmarks/bench_photo_colors.py --photos 20
+
+
+def synthetic_photo(seed, width=800, height=600):
+    rng = np.random.default_rng(seed)
+    rows = np.arange(height)[:, None, None]
+    sky = np.array([110, 170, 230]) + rng.integers(-30, 30, 3)
+    hills = np.array([70, 90, 110]) + rng.integers(-20, 20, 3)
+    trees = np.array([40, 100, 45]) + rng.integers(-20, 20, 3)
+    water = np.array([60, 110, 140]) + rng.integers(-20, 20, 3)
+    bands = np.cumsum(rng.dirichlet([4, 2, 3, 2]) * height)
+    pixels = np.select(
+        [rows < bands[0], rows < bands[1], rows < bands[2]],
+        [sky + rows / 10, hills, trees],
+        water,
+    ) * np.ones((1, width, 1))
+    pixels += rng.normal(0, 14, pixels.shape)
+    buffer = io.BytesIO()
+    require_pillow().fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def full_size_colors(content, k=DOMINANT_COLORS):
+    """
+    The straightforward version: decode the whole photo and cluster every
+    pixel in Lab.
+    """
+    Image = require_pillow()
+    with Image.open(io.BytesIO(content)) as image:
+        pixels = np.asarray(image.convert("RGB")).reshape(-1, 3)
+    kmeans(rgb_to_lab(pixels), np.ones(len(pixels)), k)
+
+
+def per_photo(func, photos):
+    started = time.perf_counter()
+    for content in photos:
+        func(content)
+    return (time.perf_counter() - started) / len(photos) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dominant color extraction for /analyze")
+    parser.add_argument("--photos", type=int, default=20, help="synthetic photos to time")
+    parser.add_argument("--full-size", type=int, default=3, help="photos to time the full-size k-means on")
+    args = parser.parse_args()
+
+    photos = [synthetic_photo(seed) for seed in range(args.photos)]
+    index = PaletteIndex()
+    index.load(*catalog(1))
+    pixels = [decode_pixels(content) for content in photos]
+    colors = [dominant_colors(sample) for sample in pixels]
+
+    def match(found):
+        paints = index.nearest_paints([code for code, _ in found])
+        index.like_colors(list(dict.fromkeys(code for _, code, _ in paints)), 10)
+
+    decode_ms = per_photo(decode_pixels, photos)
+    colors_ms = per_photo(dominant_colors, pixels)
+    match_ms = per_photo(match, colors)
+    print(f"{len(photos)} photos, {len(photos[0]) // 1024} KiB each")
+    print(f"decode to thumbnail  {decode_ms:8.2f} ms")
+    print(f"dominant colors      {colors_ms:8.2f} ms")
+    print(f"paints and episodes  {match_ms:8.2f} ms")
+    print(f"total per photo      {decode_ms + colors_ms + match_ms:8.2f} ms")
+    if args.full_size:
+        print(f"full-size k-means    {per_photo(full_size_colors, photos[:args.full_size]):8.2f} ms")
+    print(f"e.g. {colors[0]}")
@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Make the project root importable when run as `python3 benchmarks/bench_streaming_etl.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.bench_etl import write_scaled_inputs
+from etl.etl_pipline import (
+    CLEANED_OUTPUTS, clean_colors, clean_episode_colors, clean_episodes, clean_subjects, get_absolute_path,
+    save_cleaned_data,
+)
+from etl.dag import etl_stages, run
+
+# Runs the whole ETL on raw files repeated up to --rows rows, once in
+# memory and once streamed --chunksize rows at a time, and prints the time
+# and the tracemalloc peak of each. The cleaned tables are written as CSV:
+# tracemalloc sees numpy and Python allocations but not Arrow's, so
+# Feather would under-report the streamed run.
+#
+#   python3 benchmarks/bench_streaming_etl.py --rows 100000 --chunksize 10000
+
+
+def write_scaled_subjects(directory, rows):
+    """
+    Repeat the raw subjects file up to `rows` rows, shifting the season of
+    every copy like write_scaled_inputs does.
+    """
+    subjects = pd.read_csv(get_absolute_path('data/raw/subject_matter.csv'))
+    seasons = subjects['EPISODE'].str[1:3].astype(int)
+    copies = -(-rows // len(subjects))
+    scaled = pd.concat([
+        subjects.assign(EPISODE="S" + (seasons + copy * seasons.max()).astype(str).str.zfill(2) + subjects['EPISODE'].str[3:])
+        for copy in range(copies)
+    ], ignore_index=True).head(rows)
+    path = os.path.join(directory, 'subject_matter.csv')
+    scaled.to_csv(path, index=False)
+    return path
+
+
+def clean_in_memory(inputs, outputs):
+    colors_path, subjects_path, episodes_path = inputs
+    colors_output, episode_colors_output, subjects_output, episodes_output = outputs
+    colors = clean_colors(colors_path)
+    save_cleaned_data(colors, colors_output + '.csv')
+    save_cleaned_data(clean_episode_colors(colors_path), episode_colors_output + '.csv')
+    save_cleaned_data(clean_subjects(subjects_path), subjects_output + '.csv')
+    save_cleaned_data(clean_episodes(episodes_path, colors), episodes_output + '.csv')
+
+
+def stream_clean(inputs, outputs, chunksize, cache_dir):
+    # The cleaning stages `etl/dag.py --chunksize` runs, in this process so
+    # tracemalloc sees them
+    stages = [stage for stage in etl_stages(['.csv'], chunksize, inputs, outputs) if stage.name != 'manifest']
+    run(stages, workers=1, cache_dir=cache_dir, force=True)
+
+
+def measured(func):
+    """
+    (seconds, peak traced MiB) of a call.
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        func()
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak / 2 ** 20
+
+
+def same_rows(left, right):
+    with open(left) as left_file, open(right) as right_file:
+        left_lines, right_lines = left_file.read().splitlines(), right_file.read().splitlines()
+    return left_lines == right_lines, sorted(left_lines) == sorted(right_lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the streamed ETL's time and peak memory")
+    parser.add_argument("--rows", type=int, default=100000, help="rows in each scaled raw file (dates overflow past about 100,000)")
+    parser.add_argument("--chunksize", type=int, default=10000, help="rows per chunk when streaming")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        colors_path, episodes_path = write_scaled_inputs(directory, args.rows)
+        inputs = [colors_path, write_scaled_subjects(directory, args.rows), episodes_path]
+        names = [os.path.basename(output) for output in CLEANED_OUTPUTS]
+        in_memory = [os.path.join(directory, 'memory_' + name) for name in names]
+        streamed = [os.path.join(directory, 'streamed_' + name) for name in names]
+
+        memory_seconds, memory_peak = measured(lambda: clean_in_memory(inputs, in_memory))
+        streamed_seconds, streamed_peak = measured(
+            lambda: stream_clean(inputs, streamed, args.chunksize, os.path.join(directory, 'cache')))
+        print()
+        print(f"in memory {memory_seconds:>8.2f} s  peak {memory_peak:>8.1f} MiB")
+        print(f"streamed  {streamed_seconds:>8.2f} s  peak {streamed_peak:>8.1f} MiB  ({args.chunksize} rows a chunk)")
+
+        for name, left, right in zip(names, in_memory, streamed):
+            identical, same_set = same_rows(left + '.csv', right + '.csv')
+            print(f"{name:<24} identical CSV: {identical}  same rows: {same_set}")
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+import pandas as pd
+
+# Make the project root importable when run as `python3 benchmarks/bench_subject_matcher.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.subjects import SubjectMatcher, find_subjects
+from database.db import connection
+
+# A typical label_detection response for a landscape photo
+LABELS = [
+    "sky", "cloud", "mountain", "natural landscape", "tree", "water",
+    "lake", "highland", "wilderness", "mountainous landforms",
+]
+ITERATIONS = 10000
+
+
+def timed(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations
+
+
+def report(name, seconds):
+    print(f"{name:<40} {seconds * 1e6:>10.2f} us/call")
+
+
+if __name__ == "__main__":
+    matcher = SubjectMatcher()
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            matcher.refresh(cursor)
+            # The SQL path (one batched query, as analyze_photo did before) and
+            # the per-label ILIKE loop it replaced
+            sql_time = timed(lambda: find_subjects(cursor, LABELS), ITERATIONS // 10)
+
+            def ilike_loop():
+                for label in LABELS:
+                    cursor.execute("SELECT subject_id, name FROM subjects WHERE name ILIKE %s", (label,))
+                    cursor.fetchall()
+            ilike_time = timed(ilike_loop, ITERATIONS // 100)
+    except Exception as e:
+        print(f"Database not reachable ({e}), only timing the in-memory matcher")
+        subjects = pd.read_csv(os.path.join(project_root, 'data/cleaned_up/subjects_cleaned.csv'))['subject'].unique()
+        matcher.load(enumerate(subjects, start=1))
+        sql_time = ilike_time = None
+
+    print(f"Matched: {[subject['name'] for subject in matcher.resolve(LABELS)]}")
+    memory_time = timed(lambda: matcher.resolve(LABELS), ITERATIONS)
+    report("SubjectMatcher.resolve", memory_time)
+    if sql_time is not None:
+        report("find_subjects (1 batched query)", sql_time)
+        report("per-label ILIKE loop", ilike_time)
+        print(f"In-memory matcher is {sql_time / memory_time:.0f}x faster than the batched query")
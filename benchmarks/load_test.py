@@ -0,0 +1,512 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import requests
+
+# Make the project root importable when run as `python3 benchmarks/load_test.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.bench_load_data import drop_database, recreate_database
+from database.db import get_db_settings
+from database.load_data import load_all, read_cleaned_data
+
+# Load test for backend/app.py and api/theapi.py together, fully offline:
+#
+#   1. seeds a scratch database from data/cleaned_up, scaled up with
+#      synthetic episodes (--scale, --seed),
+#   2. starts benchmarks/stub_google.py with the given upstream latency and
+#      both apps as threaded Werkzeug servers pointed at the stub and the
+#      scratch database, each in its own process,
+#   3. keeps --concurrency clients busy with a mix of /places, /photo,
+#      /analyze (paging through the matches) and /episodes (filtered, paged)
+#      for --duration seconds after a --warmup,
+#   4. prints p50/p95/p99 latency, requests per second and error rate, in
+#      total and per route, as JSON.
+#
+# Save the output of two commits and compare them:
+#
+#   python3 benchmarks/load_test.py --output before.json
+#   python3 benchmarks/load_test.py --compare before.json
+#
+# App settings go through --env, e.g. --env EPISODE_INDEX_ENABLED=True.
+# Needs a database user that may CREATE DATABASE, like bench_load_data.py.
+
+SCENARIOS = ("places", "photo", "analyze", "episodes")
+
+DEFAULT_MIX = "places=30,photo=25,analyze=25,episodes=20"
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September",
+          "October", "November", "December"]
+
+
+def synthesize(episodes_data, subjects_data, colors_data, scale, seed=0):
+    """
+    The cleaned tables plus `scale` - 1 synthetic copies of every episode.
+    A copy airs `copy` years later under a new Season-Episode code and keeps
+    a random 80% of the original's subjects and colors, so filtered queries
+    don't just return the same episodes `scale` times over.
+    """
+    if scale == 1:
+        return episodes_data, subjects_data, colors_data
+
+    rng = np.random.default_rng(seed)
+    air_date = pd.to_datetime(episodes_data['air_date'].astype(str).str.strip())
+    episodes_data = episodes_data.assign(air_date=air_date)
+    episodes, subjects, colors = [episodes_data], [subjects_data], [colors_data]
+    for copy in range(1, scale):
+        suffix = f"-{copy}"
+        episodes_copy = episodes_data.copy()
+        episodes_copy['season-episode'] = episodes_copy['season-episode'] + suffix
+        episodes_copy['air_date'] = air_date + pd.DateOffset(years=copy % 40)
+        episodes.append(episodes_copy)
+        for frame, copies in ((subjects_data, subjects), (colors_data, colors)):
+            frame_copy = frame[rng.random(len(frame)) < 0.8].copy()
+            frame_copy['season-episode'] = frame_copy['season-episode'] + suffix
+            copies.append(frame_copy)
+
+    return tuple(pd.concat(frames, ignore_index=True) for frames in (episodes, subjects, colors))
+
+
+def seed_database(name, scale, seed):
+    """
+    Recreate the scratch database and load the synthetic data into it.
+    Returns the filter values to draw /episodes queries from.
+    """
+    conn = recreate_database(name)
+    try:
+        # The loader reports progress on stdout, keep that for the result
+        with contextlib.redirect_stdout(sys.stderr):
+            rows, seconds, _ = load_all(conn, *synthesize(*read_cleaned_data(), scale, seed))
+        print(f"Seeded {name}: {rows} rows in {seconds:.1f}s", file=sys.stderr)
+        return filter_values(conn)
+    finally:
+        conn.close()
+
+
+def filter_values(conn, top=30):
+    """
+    {"subject": [...], "color": [...]}: the `top` subjects and colors
+    featured in the most episodes.
+    """
+    values = {}
+    with conn.cursor() as cursor:
+        for param, table, junction, key in (("subject", "subjects", "episodesubjects", "subject_id"),
+                                            ("color", "colors", "episodecolors", "color_id")):
+            cursor.execute(f"""
+                SELECT t.name FROM {table} t JOIN {junction} j USING ({key})
+                GROUP BY t.name ORDER BY count(*) DESC, t.name LIMIT %s
+            """, (top,))
+            values[param] = [row[0] for row in cursor.fetchall()]
+    return values
+
+
+def parse_mix(spec):
+    """
+    {scenario: weight} from "places=30,photo=25,...".
+    """
+    mix = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name.strip()}, expected one of {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError(f"Empty traffic mix: {spec}")
+    return mix
+
+
+def percentile(ordered, fraction):
+    # Nearest rank on an already sorted list
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(samples, seconds):
+    """
+    Latency percentiles (ms), requests per second and error rate for a
+    list of (latency seconds, error) samples taken over `seconds`.
+    """
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, error in samples if error)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "rps": round(len(samples) / seconds, 1),
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+class Client:
+    """
+    One simulated user: a keep-alive session and its own seeded random
+    stream, recording every request it makes once the warmup is over.
+    """
+
+    def __init__(self, harness, number):
+        self.harness = harness
+        self.random = random.Random(harness.seed * 1000 + number)
+        self.session = requests.Session()
+        self.samples = []
+        self.failures = {}
+
+    def request(self, route, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=self.harness.timeout, **kwargs)
+            body = response.content
+            error = response.status_code >= 400
+            failure = str(response.status_code)
+        except requests.RequestException as e:
+            response, body, error, failure = None, None, True, type(e).__name__
+        finished = time.perf_counter()
+        if started >= self.harness.measure_from:
+            self.samples.append((route, finished - started, error))
+            if error:
+                self.failures[f"{route} {failure}"] = self.failures.get(f"{route} {failure}", 0) + 1
+        if error or not body or not response.headers.get("Content-Type", "").startswith("application/json"):
+            return None
+        return response.json()
+
+    def region(self):
+        harness = self.harness
+        return self.random.choices(harness.regions, cum_weights=harness.region_weights)[0]
+
+    def photo_reference(self):
+        # A photo of a place in a (popular) region, searching for the
+        # region first when nobody has yet, like the page does
+        region = self.region()
+        references = self.harness.photo_references.get(region)
+        if references is None:
+            references = self.places(region)
+        return self.random.choice(references) if references else None
+
+    def places(self, region=None):
+        region = region or self.region()
+        places = self.request("places", "GET", f"{self.harness.backend_url}/places", params={"region": region})
+        if places is None:
+            return None
+        references = [place["photo_reference"] for place in places if place.get("photo_reference")]
+        self.harness.photo_references[region] = references
+        return references
+
+    def photo(self):
+        reference = self.photo_reference()
+        if reference:
+            self.request("photo", "GET", f"{self.harness.backend_url}/photo", params={"photo_reference": reference})
+
+    def analyze(self):
+        reference = self.photo_reference()
+        cursor = None
+        for page in range(self.random.randint(1, self.harness.max_pages)):
+            params = {"page_size": 10, **({"cursor": cursor} if cursor else {})}
+            result = self.request("analyze" if page == 0 else "analyze_next", "POST",
+                                  f"{self.harness.backend_url}/analyze", params=params,
+                                  json={"photo_reference": reference})
+            cursor = result and result["pagination"]["next_cursor"]
+            if not cursor:
+                break
+
+    def episodes(self):
+        values = self.harness.filter_values
+        params = {"limit": 20}
+        if self.random.random() < 0.8:
+            params["subject"] = self.random.sample(values["subject"], self.random.randint(1, 2))
+        if self.random.random() < 0.3:
+            params["color"] = self.random.choice(values["color"])
+        if self.random.random() < 0.2:
+            params["broadcast_month"] = self.random.choice(MONTHS)
+        if self.random.random() < 0.3:
+            params["match_all"] = "true"
+        cursor = None
+        for page in range(self.random.randint(1, self.harness.max_pages)):
+            result = self.request("episodes" if page == 0 else "episodes_next", "GET",
+                                  f"{self.harness.api_url}/episodes",
+                                  params={**params, **({"cursor": cursor} if cursor else {})})
+            cursor = result and result["next_cursor"]
+            if not cursor:
+                break
+
+    def run(self, until):
+        harness = self.harness
+        while time.perf_counter() < until:
+            scenario = self.random.choices(harness.scenarios, cum_weights=harness.scenario_weights)[0]
+            getattr(self, scenario)()
+
+
+class Harness:
+    """
+    Drives the running apps: `concurrency` clients in threads, each
+    running scenarios picked by `mix` weights back to back.
+    """
+
+    def __init__(self, backend_url, api_url, filter_values, mix, concurrency, seed=0, regions=200, max_pages=3,
+                 timeout=30):
+        self.backend_url = backend_url
+        self.api_url = api_url
+        self.filter_values = filter_values
+        self.scenarios = list(mix)
+        self.scenario_weights = list(np.cumsum(list(mix.values())))
+        self.concurrency = concurrency
+        self.seed = seed
+        # A few regions get most of the searches
+        self.regions = [f"Region {number}" for number in range(regions)]
+        self.region_weights = list(np.cumsum([1 / (rank + 1) for rank in range(regions)]))
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.photo_references = {}
+        self.measure_from = float("inf")
+
+    def run(self, duration, warmup=0):
+        """
+        Run for warmup + duration seconds and summarize the requests that
+        started after the warmup.
+        """
+        started = time.perf_counter()
+        self.measure_from = started + warmup
+        until = self.measure_from + duration
+        clients = [Client(self, number) for number in range(self.concurrency)]
+        threads = [threading.Thread(target=client.run, args=(until,), daemon=True) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Requests still in flight at the end count towards the window they started in
+        seconds = max(until, time.perf_counter()) - self.measure_from
+
+        samples = [sample for client in clients for sample in client.samples]
+        routes = sorted({route for route, _, _ in samples})
+        failures = {}
+        for client in clients:
+            for failure, count in client.failures.items():
+                failures[failure] = failures.get(failure, 0) + count
+        return {
+            "total": summarize([(latency, error) for _, latency, error in samples], seconds),
+            "routes": {
+                route: summarize([(latency, error) for name, latency, error in samples if name == route], seconds)
+                for route in routes
+            },
+            "failures": dict(sorted(failures.items())),
+        }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} didn't come up within {timeout}s")
+
+
+def serve(service, port):
+    """
+    Run one app on a threaded Werkzeug server, like `flask run`. Used for
+    the processes the load test starts.
+    """
+    from werkzeug.serving import make_server
+
+    if service == "backend":
+        from backend.app import app
+    else:
+        from api.theapi import app
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def start_process(command, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT, cwd=project_root)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=project_root,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, result):
+    """
+    Text table of the latency and throughput changes from `baseline` to
+    `result`, per route.
+    """
+    columns = ("p50_ms", "p95_ms", "p99_ms", "rps", "error_rate")
+    lines = [f"{baseline.get('commit')} -> {result.get('commit')}",
+             f"{'route':<14}" + "".join(f" {column:>24}" for column in columns)]
+    routes = [("total", baseline["total"], result["total"])] + [
+        (route, baseline["routes"][route], stats)
+        for route, stats in result["routes"].items() if route in baseline["routes"]
+    ]
+    for route, before, after in routes:
+        cells = []
+        for column in columns:
+            old, new = before.get(column), after.get(column)
+            if old is None or new is None:
+                cells.append(f" {'-':>24}")
+                continue
+            change = f" ({(new - old) / old:+.0%})" if old else ""
+            cells.append(f" {f'{old:g} -> {new:g}{change}':>24}")
+        lines.append(f"{route:<14}" + "".join(cells))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the backend and API against stub upstreams")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients sending requests at once")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured traffic")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of traffic before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights")
+    parser.add_argument("--max-pages", type=int, default=3, help="most /analyze and /episodes pages a client reads")
+    parser.add_argument("--regions", type=int, default=200, help="distinct /places regions")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic data and the traffic")
+    parser.add_argument("--scale", type=int, default=10, help="copies of every episode in the scratch database")
+    parser.add_argument("--database", default="painting_db_load", help="scratch database")
+    parser.add_argument("--no-seed", action="store_true", help="use --database as it is instead of recreating it")
+    parser.add_argument("--keep-database", action="store_true", help="don't drop the scratch database afterwards")
+    parser.add_argument("--latency-ms", type=float, default=100, help="stub upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--photo-latency-ms", type=float)
+    parser.add_argument("--vision-latency-ms", type=float)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="setting for both apps, may be repeated")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="print the changes from an earlier result")
+    parser.add_argument("--serve", choices=["backend", "api"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        sys.exit()
+
+    try:
+        mix = parse_mix(args.mix)
+        settings = dict(item.split("=", 1) for item in args.env)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.no_seed:
+        with psycopg2.connect(**{**get_db_settings(), "dbname": args.database}) as conn:
+            values = filter_values(conn)
+    else:
+        values = seed_database(args.database, args.scale, args.seed)
+
+    processes = []
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            stub_port, backend_port, api_port = free_port(), free_port(), free_port()
+            stub_url = f"http://127.0.0.1:{stub_port}"
+            stub_command = [sys.executable, os.path.join(project_root, "benchmarks", "stub_google.py"),
+                            "--port", str(stub_port), "--latency-ms", str(args.latency_ms),
+                            "--jitter-ms", str(args.jitter_ms)]
+            for option, value in (("--photo-latency-ms", args.photo_latency_ms),
+                                  ("--vision-latency-ms", args.vision_latency_ms)):
+                if value is not None:
+                    stub_command += [option, str(value)]
+            processes.append(start_process(stub_command, os.environ, os.path.join(directory, "stub.log")))
+            wait_until_up(stub_url, processes[-1])
+
+            env = {
+                **os.environ,
+                "DB_NAME": args.database,
+                "GOOGLE_MAPS_BASE_URL": stub_url,
+                "VISION_API_ENDPOINT": stub_url,
+                "GOOGLE_API_KEY": "stub-key",
+                # Start every run with cold caches
+                "PHOTO_CACHE_DIR": os.path.join(directory, "photos"),
+                "LOG_FILE": os.path.join(directory, "app.log"),
+                **settings,
+            }
+            for service, port in (("backend", backend_port), ("api", api_port)):
+                command = [sys.executable, os.path.abspath(__file__), "--serve", service, "--port", str(port)]
+                processes.append(start_process(command, env, os.path.join(directory, f"{service}.log")))
+            backend_url, api_url = f"http://127.0.0.1:{backend_port}", f"http://127.0.0.1:{api_port}"
+            wait_until_up(f"{backend_url}/metrics", processes[1])
+            wait_until_up(f"{api_url}/metrics", processes[2])
+
+            print(f"Running {args.concurrency} clients for {args.warmup:g}s + {args.duration:g}s, mix {mix}",
+                  file=sys.stderr)
+            harness = Harness(backend_url, api_url, values, mix, args.concurrency, seed=args.seed,
+                              regions=args.regions, max_pages=args.max_pages)
+            stats = harness.run(args.duration, args.warmup)
+            caches = requests.get(f"{backend_url}/cache/stats", timeout=10).json()
+        except Exception:
+            for name in ("stub", "backend", "api"):
+                path = os.path.join(directory, f"{name}.log")
+                if os.path.exists(path):
+                    with open(path) as file:
+                        print(f"--- {name} output:\n{file.read()[-2000:]}", file=sys.stderr)
+            raise
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+            if not args.no_seed and not args.keep_database:
+                drop_database(args.database)
+
+    result = {
+        "commit": git_commit(),
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": mix,
+            "max_pages": args.max_pages,
+            "regions": args.regions,
+            "seed": args.seed,
+            "scale": None if args.no_seed else args.scale,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "photo_latency_ms": args.photo_latency_ms,
+            "vision_latency_ms": args.vision_latency_ms,
+            "env": settings,
+        },
+        **stats,
+        "caches": caches,
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    if args.compare:
+        with open(args.compare) as file:
+            print(compare(json.load(file), result), file=sys.stderr)
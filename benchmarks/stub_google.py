@@ -0,0 +1,195 @@
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Google APIs backend/app.py calls, so throughput can
+# be measured offline. Start it and point the backend at it:
+#
+#   python3 benchmarks/stub_google.py --port 8099 --latency-ms 150
+#   GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8099 VISION_API_ENDPOINT=http://127.0.0.1:8099 python3 backend/app.py
+#
+# It serves Places text search, Place Photos (small generated PNGs) and the
+# Vision REST images:annotate call (including batches).
+
+# Label sets handed out by Vision, picked by a hash of the image bytes
+LABEL_SETS = [
+    ["Mountain", "Sky", "Cloud", "Natural landscape", "Tree", "Lake", "Highland", "Wilderness"],
+    ["Sea", "Beach", "Coast", "Sky", "Wind wave", "Sand", "Cloud"],
+    ["Forest", "Tree", "Conifer", "Woodland", "Grass", "Path"],
+    ["Waterfall", "River", "Rock", "Stream", "Vegetation"],
+    ["Snow", "Winter", "Mountain", "Freezing", "Conifer", "Cabin"],
+]
+
+# (sky, land, accent) colors for the generated photos
+PALETTES = [
+    ((112, 160, 220), (40, 90, 45), (120, 110, 100)),
+    ((150, 200, 235), (220, 200, 150), (30, 90, 140)),
+    ((90, 130, 180), (20, 60, 30), (60, 100, 40)),
+    ((170, 190, 210), (90, 80, 70), (200, 220, 230)),
+    ((200, 210, 225), (240, 240, 245), (30, 50, 35)),
+]
+
+
+def make_png(width, height, palette):
+    """
+    Encode a simple landscape (sky, a mountain, ground) as a PNG.
+    """
+    sky, land, accent = palette
+    rows = []
+    top, horizon, middle = height // 6, height * 2 // 3, width // 2
+    for y in range(height):
+        if y < top:
+            row = bytes(sky) * width
+        elif y < horizon:
+            half = middle * (y - top) // (horizon - top)
+            row = bytes(sky) * (middle - half) + bytes(accent) * (2 * half) + bytes(sky) * (width - middle - half)
+        else:
+            row = bytes(land) * width
+        rows.append(b"\x00" + row)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"".join(rows))) + chunk(b"IEND", b"")
+
+
+def pick(key, options):
+    return options[int(hashlib.sha1(key.encode()).hexdigest(), 16) % len(options)]
+
+
+class StubConfig:
+    def __init__(self, latency_ms=100, jitter_ms=20, photo_latency_ms=None, vision_latency_ms=None,
+                 places_per_region=10, photo_width=800):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.photo_latency_ms = latency_ms if photo_latency_ms is None else photo_latency_ms
+        self.vision_latency_ms = latency_ms if vision_latency_ms is None else vision_latency_ms
+        self.places_per_region = places_per_region
+        self.photos = [make_png(photo_width, photo_width * 3 // 4, palette) for palette in PALETTES]
+        self.counts = {"places": 0, "photo": 0, "vision": 0, "vision_images": 0}
+        self.lock = threading.Lock()
+
+    def sleep(self, latency_ms):
+        time.sleep(max(0.0, latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        self.send_body(status, json.dumps(data).encode(), "application/json")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == "/maps/api/place/textsearch/json":
+            self.config.count("places")
+            self.config.sleep(self.config.latency_ms)
+            region = params.get("query", "").replace("nature in ", "")
+            region_key = hashlib.sha1(region.lower().encode()).hexdigest()[:12]
+            results = [
+                {
+                    "name": f"{region} Nature Spot {i + 1}",
+                    "formatted_address": f"{i + 1} Happy Little Trail, {region}",
+                    "photos": [{"photo_reference": f"stub-{region_key}-{i + 1}"}],
+                }
+                for i in range(self.config.places_per_region)
+            ]
+            self.send_json(200, {"results": results, "status": "OK"})
+
+        elif url.path == "/maps/api/place/photo":
+            self.config.count("photo")
+            reference = params.get("photoreference")
+            if not reference:
+                self.send_json(400, {"error": "photoreference is required"})
+                return
+            self.config.sleep(self.config.photo_latency_ms)
+            self.send_body(200, pick(reference, self.config.photos), "image/png")
+
+        else:
+            self.send_json(404, {"error": f"No stub for {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if url.path == "/v1/images:annotate":
+            annotate_requests = json.loads(body or b"{}").get("requests", [])
+            self.config.count("vision")
+            self.config.count("vision_images", len(annotate_requests))
+            self.config.sleep(self.config.vision_latency_ms)
+            responses = []
+            for item in annotate_requests:
+                content = base64.b64decode(item.get("image", {}).get("content", ""))
+                labels = pick(hashlib.sha1(content).hexdigest(), LABEL_SETS)
+                responses.append({"labelAnnotations": [
+                    {"description": label, "score": round(0.95 - i * 0.03, 2), "topicality": round(0.95 - i * 0.03, 2)}
+                    for i, label in enumerate(labels)
+                ]})
+            self.send_json(200, {"responses": responses})
+        else:
+            self.send_json(404, {"error": f"No stub for {url.path}"})
+
+
+def start_stub_server(host="127.0.0.1", port=0, **config_kwargs):
+    """
+    Start the stub in a background thread. Returns the server; its URL is
+    f"http://{host}:{server.server_port}" and server.config.counts tracks calls.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": StubConfig(**config_kwargs)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.config = handler.config
+    threading.Thread(target=server.serve_forever, name="stub-google", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Google Places/Photo/Vision server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--photo-latency-ms", type=float)
+    parser.add_argument("--vision-latency-ms", type=float)
+    parser.add_argument("--places-per-region", type=int, default=10)
+    args = parser.parse_args()
+
+    server = start_stub_server(
+        args.host, args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        photo_latency_ms=args.photo_latency_ms,
+        vision_latency_ms=args.vision_latency_ms,
+        places_per_region=args.places_per_region,
+    )
+    print(f"Stub Google APIs listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,497 @@
+import logging
+import os
+import select
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+# Shared PostgreSQL connection pool for backend/app.py, api/theapi.py and
+# database/load_data.py. Settings come from the environment (or .env):
+#
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#   DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_POOL_CHECK_INTERVAL
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Notified by database/load_data.py after it changes the tables, so in-process
+# copies of the data (e.g. backend/subjects.py SubjectMatcher) can reload.
+# The payload is the new data version.
+DATA_CHANGED_CHANNEL = "painting_data_changed"
+
+# Single row table (see schema.sql) stamping the loaded data
+DATA_VERSION_QUERY = "SELECT version, updated_at FROM DataVersion;"
+BUMP_DATA_VERSION_QUERY = """
+    UPDATE DataVersion SET version = version + 1, updated_at = now()
+    RETURNING version, updated_at;
+"""
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection frees up within the acquire timeout.
+    """
+
+
+def get_db_settings():
+    """
+    Read the connection settings from the environment.
+    """
+    return {
+        "dbname": os.getenv("DB_NAME", "painting_db"),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", ""),
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": os.getenv("DB_PORT", "5432"),
+    }
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    Connections are opened on demand up to max_size, and the first checkout
+    tops the pool up to min_size. Idle connections are health-checked with
+    a `SELECT 1` before they're handed out, and broken ones are replaced
+    with a fresh connection. A check_interval skips the check for ones idle
+    less than that many seconds, saving a round trip per checkout at the
+    cost of handing out connections the server dropped in the meantime.
+    """
+
+    def __init__(self, min_size=1, max_size=10, timeout=5.0, check_interval=0.0, **connect_kwargs):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, released_at)
+        self._size = 0
+        self._warmed = False
+        self._closed = False
+
+        # Gauges and counters
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _connect(self):
+        return psycopg2.connect(**self.connect_kwargs)
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _warm(self):
+        # Best effort; the caller already has a working connection
+        while True:
+            with self._cond:
+                if self._warmed or self._size >= self.min_size:
+                    self._warmed = True
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except psycopg2.Error:
+                with self._cond:
+                    self._size -= 1
+                    self._warmed = True
+                return
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self, timeout=None):
+        """
+        Check a connection out of the pool, waiting up to `timeout` seconds
+        (the pool default if not given) for one to be released.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {timeout}s")
+                self.waiting += 1
+                self._cond.wait(remaining)
+                self.waiting -= 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, time.monotonic() - released_at):
+                self._discard(conn)
+                conn = None
+                with self._cond:
+                    self.reconnects += 1
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+        if not self._warmed:
+            self._warm()
+        return conn
+
+    def putconn(self, conn, close=False):
+        """
+        Return a connection to the pool. Pass close=True for connections
+        that hit a connection-level error so they get replaced.
+        """
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        with self._cond:
+            self.in_use -= 1
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager around getconn/putconn. Callers commit their own
+        writes; anything left uncommitted is rolled back on release.
+        """
+        conn = self.getconn(timeout)
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "reconnects": self.reconnects,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max,
+                "wait_time_avg": self.wait_time_total / self.checkouts if self.checkouts else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the process-wide pool, creating it from the environment on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", 5)),
+                check_interval=float(os.getenv("DB_POOL_CHECK_INTERVAL", 0)),
+                **get_db_settings(),
+            )
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats():
+    """
+    Pool gauges, or an empty dict if nothing has used the pool yet.
+    """
+    with _pool_lock:
+        return _pool.stats() if _pool is not None else {}
+
+
+def connection(timeout=None):
+    return get_pool().connection(timeout)
+
+
+def notify_data_changed(conn, payload=""):
+    """
+    Send a NOTIFY on DATA_CHANGED_CHANNEL. It's delivered when conn commits.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s);", (DATA_CHANGED_CHANNEL, payload))
+
+
+def bump_data_version(conn):
+    """
+    Increment the data version and notify DATA_CHANGED_CHANNEL with it.
+    Both take effect when conn commits. Returns (version, updated_at).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(BUMP_DATA_VERSION_QUERY)
+        version, updated_at = cursor.fetchone()
+    notify_data_changed(conn, str(version))
+    return version, updated_at
+
+
+class DataVersion:
+    """
+    This process's view of the DataVersion row, used to key and validate
+    response caches. It's read on first use and re-read whenever the loader
+    notifies DATA_CHANGED_CHANNEL; on_change() is called when it moves.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self._value = None
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def set(self, version, updated_at):
+        previous = self._value
+        self._value = (version, updated_at)
+        if previous is not None and previous != self._value and self.on_change is not None:
+            self.on_change()
+
+    def refresh(self, payload=None):
+        try:
+            with connection() as conn, conn.cursor() as cursor:
+                cursor.execute(DATA_VERSION_QUERY)
+                self.set(*cursor.fetchone())
+        except Exception as e:
+            logger.warning("Could not read the data version: %s", e)
+
+    def get(self):
+        """
+        Return (version, updated_at), or None if it can't be read, in which
+        case callers shouldn't cache.
+        """
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    # Listen first, so a change made during the read isn't missed
+                    if not self._listening:
+                        listen(DATA_CHANGED_CHANNEL, self.refresh)
+                        self._listening = True
+                    self.refresh()
+        return self._value
+
+
+class Reloadable:
+    """
+    An in-memory copy of some tables (anything with a `loaded` property
+    and a refresh(cursor) method, like backend/subjects.py SubjectMatcher),
+    loaded from the pool on first use and reloaded from the listener thread
+    whenever the loader notifies DATA_CHANGED_CHANNEL.
+    """
+
+    def __init__(self, data, name):
+        self.data = data
+        self.name = name
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def reload(self, payload=None):
+        try:
+            with connection() as conn, conn.cursor() as cursor:
+                self.data.refresh(cursor)
+            logger.info("%s reloaded", self.name)
+        except Exception as e:
+            logger.error("Error reloading %s: %s", self.name, e)
+
+    def get(self):
+        """
+        Return the data, loading it first if needed. Errors from the first
+        load go to the caller.
+        """
+        if not self.data.loaded:
+            with self._lock:
+                if not self.data.loaded:
+                    if not self._listening:
+                        listen(DATA_CHANGED_CHANNEL, self.reload)
+                        self._listening = True
+                    with connection() as conn, conn.cursor() as cursor:
+                        self.data.refresh(cursor)
+        return self.data
+
+
+class Listener:
+    """
+    One LISTEN connection (outside the pool) and daemon thread for a
+    channel, calling every subscriber's callback(payload) for each NOTIFY.
+
+    If the connection drops it reconnects and calls every callback(None),
+    since notifications may have been missed in between. Subscribers that
+    gave up waiting for the first LISTEN get the same call once it's in
+    place.
+    """
+
+    def __init__(self, channel, reconnect_delay=5.0):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._callbacks = []
+        self._late = []
+        self._lock = threading.Lock()
+        self._listening = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._conn = None
+
+    def subscribe(self, callback, timeout=5.0):
+        """
+        Add a callback. Returns True once the LISTEN is in place, so data
+        read afterwards can't miss a change, or False after `timeout`
+        seconds, in which case callback(None) comes when it is.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"listen-{self.channel}", daemon=True)
+                self._thread.start()
+        if self._listening.wait(timeout):
+            return True
+        with self._lock:
+            if self._listening.is_set():
+                return True
+            self._late.append(callback)
+            return False
+
+    def _connected(self, reconnected):
+        with self._lock:
+            callbacks = list(self._callbacks) if reconnected else self._late
+            self._late = []
+            self._listening.set()
+        for callback in callbacks:
+            callback(None)
+
+    def _dispatch(self, payload):
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback(payload)
+
+    def _run(self):
+        connected_before = False
+        while not self._stopped.is_set():
+            try:
+                self._conn = psycopg2.connect(**get_db_settings())
+                self._conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with self._conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel};")
+                self._connected(connected_before)
+                connected_before = True
+
+                while not self._stopped.is_set():
+                    if select.select([self._conn], [], [], 60) == ([], [], []):
+                        continue
+                    self._conn.poll()
+                    while self._conn.notifies:
+                        self._dispatch(self._conn.notifies.pop(0).payload)
+            except Exception as e:
+                with self._lock:
+                    self._listening.clear()
+                if self._stopped.is_set():
+                    return
+                logger.warning("Listener on %s failed, reconnecting in %ss: %s", self.channel, self.reconnect_delay, e)
+                self._close_conn()
+                self._stopped.wait(self.reconnect_delay)
+
+    def _close_conn(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+
+    def close(self):
+        self._stopped.set()
+        self._close_conn()
+
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def listen(channel, callback, timeout=5.0):
+    """
+    Call callback(payload) for every NOTIFY on channel, from the process's
+    one Listener for it. See Listener.subscribe for `timeout`.
+    """
+    with _listeners_lock:
+        listener = _listeners.get(channel)
+        if listener is None:
+            listener = _listeners[channel] = Listener(channel)
+    return listener.subscribe(callback, timeout)
@@ -1,7 +1,18 @@
-import psycopg2
 import pandas as pd
+import argparse
+import io
 import os
-import re
+import sys
+import time
+
+# Make the project root importable when run as `python3 database/load_data.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from database.db import get_pool, close_pool, bump_data_version
+from etl import cleaned_data
+from etl.manifest import current_episode_hashes, diff_episodes
 
 # Helper function to get absolute paths
 # I'm hoping this works on all machines, but
@@ -11,16 +22,10 @@ def get_absolute_path(relative_path):
     return os.path.join(base_dir, relative_path)
 
 # Database connection function
+# Settings come from the environment now, see database/db.py
 def connect_to_db():
     try:
-        conn = psycopg2.connect(
-            dbname="painting_db",
-            user="postgres",
-            password="Juikiuj*88*",
-            host="localhost",
-            port="5432"
-        )
-        return conn
+        return get_pool().getconn()
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
@@ -42,7 +47,7 @@ def get_or_insert_unknown_subject(cursor):
 # Function to load data into BobRossEpisodes table
 # I feel like this is the only table nessecary, but after
 # All the research tells me otherwise.
-def load_data_to_bobross_episodes(conn):
+def load_data_to_bobross_episodes(conn, commit=True):
     try:
         with conn.cursor() as cursor:
             # Ensure "Unknown" subject exists
@@ -64,7 +69,8 @@ def load_data_to_bobross_episodes(conn):
                 WHERE ec.color_id IS NOT NULL
                 ON CONFLICT (episode_id) DO NOTHING;
             """, (unknown_subject_id,))
-            conn.commit()
+            if commit:
+                conn.commit()
             print("Data loaded into BobRossEpisodes successfully.")
     except Exception as e:
         conn.rollback()
@@ -111,26 +117,22 @@ def load_data_to_table(conn, table_name, data):
                         ON CONFLICT DO NOTHING;
                     """, (row['subject'], row['season-episode']))
                 elif table_name.lower() == 'colors':
-                    colors = re.split(r'\s*\|\s*', row['colors'])
-                    hex_codes = re.split(r'\s*\|\s*', row['color_hex'])
-                    if len(colors) != len(hex_codes):
-                        continue
-                    for color, hex_code in zip(colors, hex_codes):
-                        cursor.execute("""
-                            INSERT INTO colors (name, hex_code)
-                            VALUES (%s, %s)
-                            ON CONFLICT (name, hex_code) DO NOTHING;
-                        """, (color.strip(), hex_code.strip()))
-                        cursor.execute("""
-                            INSERT INTO episodecolors (episode_id, color_id)
-                            SELECT 
-                                e.episode_id,
-                                c.color_id
-                            FROM episodes e
-                            INNER JOIN colors c ON c.name = %s AND c.hex_code = %s
-                            WHERE e.season_episode = %s
-                            ON CONFLICT DO NOTHING;
-                        """, (color.strip(), hex_code.strip(), row['season-episode']))
+                    # One row per paint used in the episode
+                    cursor.execute("""
+                        INSERT INTO colors (name, hex_code)
+                        VALUES (%s, %s)
+                        ON CONFLICT (name, hex_code) DO NOTHING;
+                    """, (row['color'], row['color_hex']))
+                    cursor.execute("""
+                        INSERT INTO episodecolors (episode_id, color_id)
+                        SELECT 
+                            e.episode_id,
+                            c.color_id
+                        FROM episodes e
+                        INNER JOIN colors c ON c.name = %s AND c.hex_code = %s
+                        WHERE e.season_episode = %s
+                        ON CONFLICT DO NOTHING;
+                    """, (row['color'], row['color_hex'], row['season-episode']))
         conn.commit()
         print(f"Data loaded into {table_name} successfully.")
     except Exception as e:
@@ -138,12 +140,347 @@ def load_data_to_table(conn, table_name, data):
         print(f"Error loading data into {table_name}: {e}")
         raise
 
+# Bulk mode: COPY the cleaned frames into temp tables, then upsert from
+# them with one statement per table. Everything happens in the caller's
+# transaction, so the load is all or nothing.
+STAGING_TABLES_SQL = """
+    CREATE TEMP TABLE staging_episodes (
+        ord INTEGER,
+        season_episode TEXT,
+        title TEXT,
+        air_date DATE,
+        broadcast_month TEXT,
+        youtube_link TEXT
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE staging_subjects (season_episode TEXT, name TEXT) ON COMMIT DROP;
+    CREATE TEMP TABLE staging_colors (season_episode TEXT, name TEXT, hex_code TEXT) ON COMMIT DROP;
+"""
+
+BULK_UPSERTS = [
+    # The last row wins when a season_episode repeats, like the row by row path
+    ("episodes", """
+        INSERT INTO episodes (season_episode, title, air_date, broadcast_month, youtube_link)
+        SELECT DISTINCT ON (season_episode) season_episode, title, air_date, broadcast_month, youtube_link
+        FROM staging_episodes
+        ORDER BY season_episode, ord DESC
+        ON CONFLICT (season_episode) DO UPDATE
+        SET
+            title = EXCLUDED.title,
+            air_date = EXCLUDED.air_date,
+            broadcast_month = EXCLUDED.broadcast_month,
+            youtube_link = EXCLUDED.youtube_link;
+    """),
+    ("subjects", """
+        INSERT INTO subjects (name)
+        SELECT DISTINCT name FROM staging_subjects WHERE name IS NOT NULL
+        ON CONFLICT (name) DO NOTHING;
+    """),
+    ("episodesubjects", """
+        INSERT INTO episodesubjects (episode_id, subject_id)
+        SELECT DISTINCT e.episode_id, s.subject_id
+        FROM staging_subjects st
+        JOIN episodes e ON e.season_episode = st.season_episode
+        JOIN subjects s ON s.name = st.name
+        ON CONFLICT DO NOTHING;
+    """),
+    ("colors", """
+        INSERT INTO colors (name, hex_code)
+        SELECT DISTINCT name, hex_code FROM staging_colors
+        ON CONFLICT (name, hex_code) DO NOTHING;
+    """),
+    ("episodecolors", """
+        INSERT INTO episodecolors (episode_id, color_id)
+        SELECT DISTINCT e.episode_id, c.color_id
+        FROM staging_colors st
+        JOIN episodes e ON e.season_episode = st.season_episode
+        JOIN colors c ON c.name = st.name AND c.hex_code = st.hex_code
+        ON CONFLICT DO NOTHING;
+    """),
+]
+
+def copy_frame(cursor, table_name, frame):
+    """
+    Stream a DataFrame into a table with COPY. Missing values become NULL.
+    """
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table_name} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def episodes_frame(episodes_data, start=0):
+    air_date = episodes_data['air_date']
+    if not pd.api.types.is_datetime64_any_dtype(air_date):
+        air_date = pd.to_datetime(air_date.astype(str).str.strip())
+    return pd.DataFrame({
+        'ord': range(start, start + len(episodes_data)),
+        'season_episode': episodes_data['season-episode'].values,
+        'title': episodes_data['title'].values,
+        'air_date': air_date.dt.strftime('%Y-%m-%d').values,
+        'broadcast_month': air_date.dt.strftime('%B').values,
+        'youtube_link': episodes_data['youtube_src'].values,
+    })
+
+def subjects_frame(subjects_data):
+    return pd.DataFrame({
+        'season_episode': subjects_data['season-episode'].values,
+        'name': subjects_data['subject'].values,
+    })
+
+def colors_frame(colors_data):
+    """
+    The long-format episode colors (one row per paint used) as staged.
+    """
+    return pd.DataFrame({
+        'season_episode': colors_data['season-episode'].values,
+        'name': colors_data['color'].values,
+        'hex_code': colors_data['color_hex'].values,
+    })
+
+def bulk_load_data(conn, episodes_data, subjects_data, colors_data):
+    """
+    Load the cleaned episodes, subjects and colors in bulk without
+    committing. Returns the number of staged rows.
+    """
+    return bulk_load_batches(conn, [episodes_data], [subjects_data], [colors_data])
+
+def bulk_load_batches(conn, episodes_batches, subjects_batches, colors_batches):
+    """
+    bulk_load_data for tables given as iterables of DataFrames: each batch
+    is COPYed into the staging tables as it comes, so only one is held in
+    memory, and the upserts run once at the end. Returns the number of
+    staged rows.
+    """
+    rows = 0
+    with conn.cursor() as cursor:
+        cursor.execute(STAGING_TABLES_SQL)
+        for episodes_data in episodes_batches:
+            copy_frame(cursor, 'staging_episodes', episodes_frame(episodes_data, start=rows))
+            rows += len(episodes_data)
+        for table_name, batches, to_frame in [
+            ('staging_subjects', subjects_batches, subjects_frame),
+            ('staging_colors', colors_batches, colors_frame),
+        ]:
+            for data in batches:
+                copy_frame(cursor, table_name, to_frame(data))
+                rows += len(data)
+        for table_name, query in BULK_UPSERTS:
+            cursor.execute(query)
+            print(f"Upserted {cursor.rowcount} rows into {table_name}.")
+    return rows
+
+# Incremental bulk loads: every episode's cleaned rows are hashed (see
+# etl/manifest.py) and compared with the hashes stored at the last load, so
+# only new, changed and removed episodes are touched.
+LOADED_HASHES_QUERY = """
+    SELECT COALESCE(e.season_episode, l.season_episode), l.row_hash
+    FROM episodes e
+    FULL JOIN LoadedEpisodes l ON l.season_episode = e.season_episode
+    WHERE COALESCE(e.season_episode, l.season_episode) IS NOT NULL;
+"""
+
+# Links of the episodes being reloaded or removed, so a subject or color
+# dropped from an episode doesn't linger
+CLEAR_EPISODE_LINKS = [
+    ("episodesubjects", """
+        DELETE FROM episodesubjects
+        WHERE episode_id IN (SELECT episode_id FROM episodes WHERE season_episode = ANY(%s));
+    """),
+    ("episodecolors", """
+        DELETE FROM episodecolors
+        WHERE episode_id IN (SELECT episode_id FROM episodes WHERE season_episode = ANY(%s));
+    """),
+    ("bobrossepisodes", """
+        DELETE FROM bobrossepisodes
+        WHERE episode_id IN (SELECT episode_id FROM episodes WHERE season_episode = ANY(%s));
+    """),
+]
+
+DELETE_EPISODES = "DELETE FROM episodes WHERE season_episode = ANY(%s);"
+
+RECORD_HASHES = """
+    INSERT INTO LoadedEpisodes (season_episode, row_hash)
+    SELECT * FROM unnest(%s::text[], %s::text[])
+    ON CONFLICT (season_episode) DO UPDATE SET row_hash = EXCLUDED.row_hash;
+"""
+
+def loaded_hashes(conn):
+    """
+    {season_episode: hash as of the last load}. Episodes loaded without a
+    hash map to None, so they count as changed (or removed).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(LOADED_HASHES_QUERY)
+        return dict(cursor.fetchall())
+
+def load_changes(conn, episodes_data, subjects_data, colors_data, hashes, full=False):
+    """
+    Bulk load the episodes whose hash changed since the last load and delete
+    the ones no longer in the cleaned data, without committing. `full`
+    reloads every episode. Returns (rows, changed, deleted).
+    """
+    return load_changed_batches(conn, [episodes_data], [subjects_data], [colors_data], hashes, full)
+
+def load_changed_batches(conn, episodes_batches, subjects_batches, colors_batches, hashes, full=False):
+    """
+    load_changes for tables given as iterables of DataFrames, see
+    bulk_load_batches.
+    """
+    changed, deleted = clear_changes(conn, hashes, full)
+    if not changed and not deleted:
+        return 0, changed, deleted
+
+    rows = bulk_load_batches(
+        conn,
+        only_changed(episodes_batches, changed),
+        only_changed(subjects_batches, changed),
+        only_changed(colors_batches, changed),
+    )
+    record_hashes(conn, hashes, changed, deleted)
+    return rows, changed, deleted
+
+def clear_changes(conn, hashes, full=False):
+    """
+    Compare `hashes` with the last load's, clear the links of the changed
+    episodes and delete the removed ones. Returns (changed, deleted).
+    """
+    changed, deleted = diff_episodes(loaded_hashes(conn), hashes)
+    if full:
+        changed = sorted(hashes)
+    if not changed and not deleted:
+        return changed, deleted
+
+    with conn.cursor() as cursor:
+        for table_name, query in CLEAR_EPISODE_LINKS:
+            cursor.execute(query, (changed + deleted,))
+        if deleted:
+            cursor.execute(DELETE_EPISODES, (deleted,))
+            print(f"Deleted {cursor.rowcount} episodes.")
+    return changed, deleted
+
+def only_changed(batches, changed):
+    keep = set(changed)
+    for data in batches:
+        yield data[data['season-episode'].astype(str).isin(keep)]
+
+def record_hashes(conn, hashes, changed, deleted):
+    with conn.cursor() as cursor:
+        cursor.execute(RECORD_HASHES, (changed, [hashes[key] for key in changed]))
+        cursor.execute("DELETE FROM LoadedEpisodes WHERE season_episode = ANY(%s);", (deleted,))
+    print(f"Loaded {len(changed)} new or changed episodes, deleted {len(deleted)}.")
+
+# The cleaned tables to load, without their extension. Each is read from
+# its Feather file when the ETL wrote one, from the CSV otherwise.
+CLEANED_DATA = [
+    'data/cleaned_up/episodes_cleaned',
+    'data/cleaned_up/subjects_cleaned',
+    'data/cleaned_up/episode_colors_cleaned',
+]
+
+def cleaned_files():
+    return [
+        path + (cleaned_data.FEATHER if os.path.exists(get_absolute_path(path + cleaned_data.FEATHER)) else cleaned_data.CSV)
+        for path in CLEANED_DATA
+    ]
+
+def read_cleaned_data(paths=None):
+    """
+    Read the episodes, subjects and episode colors tables, from `paths` if
+    given, else from data/cleaned_up.
+    """
+    episodes_path, subjects_path, colors_path = paths or map(get_absolute_path, cleaned_files())
+    subjects_data = cleaned_data.read(subjects_path)
+    colors_data = cleaned_data.read(colors_path)
+    # Feather keeps air_date typed, only the CSV needs parsing
+    episodes_data = cleaned_data.read(episodes_path, parse_dates=['air_date'])
+
+    # Normalize column names
+    episodes_data.columns = episodes_data.columns.str.strip().str.lower()
+    subjects_data.columns = subjects_data.columns.str.strip().str.lower()
+    colors_data.columns = colors_data.columns.str.strip().str.lower()
+    return episodes_data, subjects_data, colors_data
+
+def read_cleaned_batches(chunksize, paths=None):
+    """
+    read_cleaned_data, `chunksize` rows at a time: three generators of
+    DataFrames.
+    """
+    episodes_path, subjects_path, colors_path = paths or map(get_absolute_path, cleaned_files())
+
+    def batches(path, **csv_options):
+        for data in cleaned_data.read_batches(path, chunksize, **csv_options):
+            data.columns = data.columns.str.strip().str.lower()
+            yield data
+
+    return batches(episodes_path, parse_dates=['air_date']), batches(subjects_path), batches(colors_path)
+
+def load_batches(conn, episodes_batches, subjects_batches, colors_batches, hashes, full=False):
+    """
+    Bulk load the episodes whose hash changed, from iterables of DataFrames
+    (see read_cleaned_batches), bump the data version and commit. Returns
+    (rows, seconds, version) like load_all.
+    """
+    started = time.perf_counter()
+    rows, changed, deleted = load_changed_batches(conn, episodes_batches, subjects_batches, colors_batches, hashes, full)
+    if not changed and not deleted:
+        conn.rollback()
+        return 0, time.perf_counter() - started, None
+    return rows, time.perf_counter() - started, finish_load(conn)
+
+def finish_load(conn):
+    """
+    Fill BobRossEpisodes, bump the data version and commit. Returns the new
+    version.
+    """
+    load_data_to_bobross_episodes(conn, commit=False)
+
+    # Stamp the new data and let running services know they should
+    # reload their in-memory copies and drop cached responses
+    version, _ = bump_data_version(conn)
+    conn.commit()
+    return version
+
+def load_all(conn, episodes_data, subjects_data, colors_data, mode="bulk", hashes=None, full=False):
+    """
+    Load the cleaned data, bump the data version and commit. Bulk mode only
+    touches the episodes whose hash changed, `hashes` defaulting to the
+    hashes of the cleaned files, the same ones the command line compares
+    (pass episode_hashes of the files when loading others). Returns (rows,
+    seconds, version), rows being the input rows loaded and version None
+    when nothing had changed.
+    """
+    started = time.perf_counter()
+    if hashes is None:
+        hashes = current_episode_hashes(cleaned_files())
+
+    if mode == "bulk":
+        rows, _, version = load_batches(conn, [episodes_data], [subjects_data], [colors_data], hashes, full)
+        return rows, time.perf_counter() - started, version
+
+    load_data_to_table(conn, 'Episodes', episodes_data)
+    load_data_to_table(conn, 'Subjects', subjects_data)
+    load_data_to_table(conn, 'Colors', colors_data)
+    load_data_to_bobross_episodes(conn)
+    rows = len(episodes_data) + len(subjects_data) + len(colors_data)
+    # Everything was reloaded, so the next bulk run can start from here
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM LoadedEpisodes;")
+        cursor.execute(RECORD_HASHES, (list(hashes), list(hashes.values())))
+
+    version, _ = bump_data_version(conn)
+    conn.commit()
+    return rows, time.perf_counter() - started, version
+
 if __name__ == "__main__":
-    # Define file paths, I hope it works for you... I couldn't get it 
-    # To work otherwise
-    subjects_file = get_absolute_path('data/cleaned_up/subjects_cleaned.csv')
-    colors_file = get_absolute_path('data/cleaned_up/colors_cleaned.csv')
-    episodes_file = get_absolute_path('data/cleaned_up/episodes_cleaned.csv')
+    parser = argparse.ArgumentParser(description="Load the cleaned CSVs into PostgreSQL")
+    parser.add_argument("--mode", choices=["bulk", "rows"], default="bulk",
+                        help="bulk: COPY + set-based upserts in one transaction, rows: one INSERT per row")
+    parser.add_argument("--full", action="store_true",
+                        help="reload every episode instead of only the new and changed ones (bulk mode)")
+    parser.add_argument("--chunksize", type=int,
+                        help="read the cleaned files this many rows at a time instead of whole (bulk mode)")
+    args = parser.parse_args()
+    if args.chunksize and args.mode != "bulk":
+        parser.error("--chunksize needs --mode bulk")
 
     # Connect to the database
     conn = connect_to_db()
@@ -151,27 +488,28 @@ if __name__ == "__main__":
         exit()
 
     try:
-        # Load cleaned data
-        subjects_data = pd.read_csv(subjects_file)
-        colors_data = pd.read_csv(colors_file)
-        episodes_data = pd.read_csv(episodes_file, parse_dates=['air_date'])
-
-        # Normalize column names
-        episodes_data.columns = episodes_data.columns.str.strip().str.lower()
-        subjects_data.columns = subjects_data.columns.str.strip().str.lower()
-        colors_data.columns = colors_data.columns.str.strip().str.lower()
-
-        # Insert data into tables
-        load_data_to_table(conn, 'Episodes', episodes_data)
-        load_data_to_table(conn, 'Subjects', subjects_data)
-        load_data_to_table(conn, 'Colors', colors_data)
-        load_data_to_bobross_episodes(conn)
+        # The manifest's hashes let an unchanged rerun stop before reading any CSV
+        hashes = current_episode_hashes(cleaned_files(), chunksize=args.chunksize)
+        if args.mode == "bulk" and not args.full and diff_episodes(loaded_hashes(conn), hashes) == ([], []):
+            print("No episodes changed since the last load, nothing to do.")
+        elif args.chunksize:
+            rows, seconds, version = load_batches(conn, *read_cleaned_batches(args.chunksize), hashes, full=args.full)
+            print(f"Loaded {rows} rows in {seconds:.2f}s ({rows / seconds:.0f} rows/s, {args.chunksize} rows at a time)")
+            print(f"Data version is now {version}")
+        else:
+            episodes_data, subjects_data, colors_data = read_cleaned_data()
+            rows, seconds, version = load_all(conn, episodes_data, subjects_data, colors_data, args.mode,
+                                              hashes=hashes, full=args.full)
+            print(f"Loaded {rows} rows in {seconds:.2f}s ({rows / seconds:.0f} rows/s, {args.mode} mode)")
+            print(f"Data version is now {version}")
 
     except Exception as e:
+        conn.rollback()
         print(f"Error during data loading: {e}")
         import traceback
         traceback.print_exc()
 
     finally:
-        conn.close()
+        get_pool().putconn(conn)
+        close_pool()
         print("Database connection closed.")
\ No newline at end of file
@@ -35,6 +35,26 @@ BEGIN
     END IF;
 END $$;
 
+-- Index the normalized subject name used by the batched label lookup in backend/subjects.py
+CREATE INDEX IF NOT EXISTS subjects_name_normalized_idx ON Subjects (lower(replace(name, '_', ' ')));
+
+-- Enable pg_trgm for similarity matching of labels like "mountains" -> "mountain".
+-- It's optional, so keep going if the extension isn't installed on the server.
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm is not available, trigram subject matching will not be indexed';
+END $$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS subjects_name_trgm_idx
+            ON Subjects USING gin (lower(replace(name, '_', ' ')) gin_trgm_ops);
+    END IF;
+END $$;
+
 -- Ensure the Colors table exists and create/alter it
 DO $$
 BEGIN
@@ -104,6 +124,31 @@ BEGIN
     END IF;
 END $$;
 
+-- Indexes for the /episodes filters in api/episode_query.py. The unique
+-- constraints already cover (episode_id, subject_id), (episode_id, color_id)
+-- and colors by name, these add the subject/color-first direction and the
+-- month filter and air date ordering on episodes.
+CREATE INDEX IF NOT EXISTS episodesubjects_subject_episode_idx ON EpisodeSubjects (subject_id, episode_id);
+CREATE INDEX IF NOT EXISTS episodecolors_color_episode_idx ON EpisodeColors (color_id, episode_id);
+CREATE INDEX IF NOT EXISTS episodes_broadcast_month_idx ON Episodes (broadcast_month);
+CREATE INDEX IF NOT EXISTS episodes_air_date_idx ON Episodes (air_date, episode_id);
+
+-- Version stamp of the loaded data, bumped by database/load_data.py. The APIs
+-- use it to validate cached responses (ETag / Last-Modified).
+CREATE TABLE IF NOT EXISTS DataVersion (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO DataVersion (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+-- Per-episode hashes of the cleaned rows as of the last load (see
+-- etl/manifest.py), so database/load_data.py only reloads what changed.
+CREATE TABLE IF NOT EXISTS LoadedEpisodes (
+    season_episode TEXT PRIMARY KEY,
+    row_hash TEXT NOT NULL
+);
+
 -- Ensure the BobRossEpisodes table exists and create it if not
 DO $$
 BEGIN
@@ -0,0 +1,124 @@
+import io
+
+import pandas as pd
+
+# Cleaned data is written as Feather (Arrow IPC) files: typed columns, the
+# subject and paint names as categoricals, air_date as a timestamp, and no
+# compression so the loader can memory-map them instead of parsing text.
+# CSV is still written when asked for (etl_pipline.py --csv), and the
+# loader falls back to it when there is no Feather file, e.g. for the CSVs
+# committed under data/cleaned_up. Feather needs pyarrow, which is optional.
+
+FEATHER = '.feather'
+CSV = '.csv'
+
+def require_pyarrow():
+    try:
+        import pyarrow.feather
+    except ImportError as e:
+        raise ImportError("Feather cleaned data needs pyarrow: pip install pyarrow") from e
+    return pyarrow.feather
+
+
+def save(frame, path, categories=()):
+    """
+    Write a cleaned DataFrame, as Feather or CSV depending on the extension.
+    Feather stores the `categories` columns as categoricals.
+    """
+    if path.endswith(FEATHER):
+        feather = require_pyarrow()
+        frame = frame.reset_index(drop=True)
+        for column in categories:
+            frame[column] = frame[column].astype('category')
+        feather.write_feather(frame, path, compression='uncompressed')
+    else:
+        frame.to_csv(path, index=False)
+
+
+def as_text_frame(frame):
+    # Exactly what the CSV export would hold
+    return pd.read_csv(io.StringIO(frame.to_csv(index=False)), dtype=str, keep_default_na=False)
+
+
+def read(path, as_text=False, **csv_options):
+    """
+    Read a cleaned file written by save(). as_text renders every value as
+    the string the CSV would hold, '' for missing ones. csv_options go to
+    pd.read_csv.
+    """
+    if path.endswith(FEATHER):
+        frame = require_pyarrow().read_table(path, memory_map=True).to_pandas()
+        return as_text_frame(frame) if as_text else frame
+    if as_text:
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    return pd.read_csv(path, **csv_options)
+
+
+def read_batches(path, chunksize, as_text=False, **csv_options):
+    """
+    read() `chunksize` rows at a time, as a generator of DataFrames. Feather
+    files are memory-mapped, so only the current batch is converted.
+    """
+    if path.endswith(FEATHER):
+        require_pyarrow()
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            # Slices are zero-copy views, whatever batches the file was written in
+            for offset in range(0, table.num_rows, chunksize):
+                frame = table.slice(offset, chunksize).to_pandas()
+                yield as_text_frame(frame) if as_text else frame
+        return
+    if as_text:
+        csv_options = {'dtype': str, 'keep_default_na': False}
+    yield from pd.read_csv(path, chunksize=chunksize, **csv_options)
+
+
+class ChunkWriter:
+    """
+    Write a cleaned table one DataFrame at a time, as Feather or CSV
+    depending on the extension. Every chunk needs the same columns.
+
+    Feather can't change a categorical's categories between batches, so
+    streamed files store names as plain strings; columns that are missing
+    from the first chunk are typed as strings too.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.schema = None
+        self.chunks = 0
+
+    def write(self, frame):
+        frame = frame.reset_index(drop=True)
+        if self.path.endswith(FEATHER):
+            self.write_feather(frame)
+        else:
+            frame.to_csv(self.path, index=False, mode='a' if self.chunks else 'w', header=not self.chunks)
+        self.chunks += 1
+
+    def write_feather(self, frame):
+        require_pyarrow()
+        import pyarrow as pa
+        for column in frame.columns:
+            if isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = frame[column].astype(object)
+        if self.writer is None:
+            schema = pa.Schema.from_pandas(frame, preserve_index=False).remove_metadata()
+            self.schema = pa.schema([
+                field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema
+            ])
+            self.writer = pa.ipc.new_file(self.path, self.schema)
+        self.writer.write_table(pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,404 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Make the project root importable when run as `python3 etl/dag.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from etl.manifest import file_hash, file_hashes, project_path
+
+# A small DAG runner for the ETL and the loader.
+#
+# A stage declares the files it reads and writes; a stage reading another
+# one's output runs after it, and `after` adds orderings that don't go
+# through a file (loading the database after the manifest). Stages
+# whose dependencies are done run side by side in a process pool, and a
+# stage with outputs is cached: its outputs are copied to CACHE_DIR under
+# a hash of its inputs, arguments and code (its package's sources), and
+# restored from there instead of rerunning it. Local stages run in this process, one at a
+# time, so they can share a database connection; they are never cached.
+#
+#   python3 etl/dag.py [--force] [--csv] [--chunksize N] [--workers N] [--load]
+
+CACHE_DIR = 'data/cleaned_up/.cache'
+
+# Cache entries kept per stage, newest first
+CACHE_ENTRIES = 3
+
+
+class Stage:
+    """
+    One step of a DAG: func(**kwargs), reading `inputs` and writing
+    `outputs` (paths relative to the project root, or absolute).
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), after=(), kwargs=None, local=False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.after = list(after)
+        self.kwargs = kwargs or {}
+        self.local = local
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+class StageResult:
+    """
+    What running a stage gave: its return value (None when it came from
+    the cache), 'ran', 'cached' or 'restored', and how long it took.
+    """
+
+    def __init__(self, name, status, seconds, value=None):
+        self.name = name
+        self.status = status
+        self.seconds = seconds
+        self.value = value
+
+
+def dependencies(stages):
+    """
+    {stage name: names of the stages it runs after}, from `after` and from
+    the inputs that are another stage's outputs.
+    """
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique")
+
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"{output} is written by both {producers[output]} and {stage.name}")
+            producers[output] = stage.name
+
+    graph = {}
+    for stage in stages:
+        unknown = [name for name in stage.after if name not in names]
+        if unknown:
+            raise ValueError(f"Stage {stage.name} runs after unknown stages: {', '.join(unknown)}")
+        graph[stage.name] = set(stage.after) | {producers[path] for path in stage.inputs if path in producers}
+
+    # Every stage has to be reachable without going round in circles
+    done = set()
+    while len(done) < len(graph):
+        ready = [name for name in graph if name not in done and graph[name] <= done]
+        if not ready:
+            raise ValueError(f"Stages depend on each other: {', '.join(sorted(set(graph) - done))}")
+        done.update(ready)
+    return graph
+
+
+def code_files(func):
+    """
+    The source files a stage's code depends on: every module of the
+    function's package, since the ETL stages in etl_pipline.py do their
+    work in helpers from streaming.py, cleaned_data.py and manifest.py.
+    """
+    path = getattr(sys.modules[func.__module__], '__file__', None)
+    if not path:
+        return []
+    directory = os.path.dirname(os.path.abspath(path))
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.py'))
+
+
+def cache_key(stage):
+    """
+    Hash of what a stage's outputs depend on: its name, its code (the
+    sources of the function's package), its arguments and the contents of
+    its inputs.
+    """
+    key = {
+        'stage': stage.name,
+        'func': f"{stage.func.__module__}.{stage.func.__qualname__}",
+        'code': {os.path.basename(path): file_hash(path) for path in code_files(stage.func)},
+        'kwargs': repr(sorted(stage.kwargs.items())),
+        'inputs': file_hashes(stage.inputs),
+        'outputs': stage.outputs,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_entry(cache_dir, stage, key):
+    return os.path.join(project_path(cache_dir), stage.name, key)
+
+
+def restore(stage, entry):
+    """
+    Put the cached outputs in place. Returns None when there is no such
+    entry, else True when a file had to be copied back.
+    """
+    try:
+        with open(os.path.join(entry, 'outputs.json')) as file:
+            recorded = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    restored = False
+    for index, (output, digest) in enumerate(zip(stage.outputs, recorded)):
+        path = project_path(output)
+        if not os.path.exists(path) or file_hash(path) != digest:
+            shutil.copyfile(os.path.join(entry, str(index)), path)
+            restored = True
+    # Mark the entry as recently used for pruning
+    os.utime(entry)
+    return restored
+
+
+def store(stage, entry):
+    """
+    Copy a stage's outputs into the cache, then drop the oldest entries.
+    """
+    temporary_entry = entry + '.tmp'
+    shutil.rmtree(temporary_entry, ignore_errors=True)
+    os.makedirs(temporary_entry)
+    for index, output in enumerate(stage.outputs):
+        shutil.copyfile(project_path(output), os.path.join(temporary_entry, str(index)))
+    with open(os.path.join(temporary_entry, 'outputs.json'), 'w') as file:
+        json.dump([file_hash(project_path(output)) for output in stage.outputs], file)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(temporary_entry, entry)
+
+    stage_dir = os.path.dirname(entry)
+    entries = sorted(
+        (os.path.join(stage_dir, name) for name in os.listdir(stage_dir) if not name.endswith('.tmp')),
+        key=os.path.getmtime, reverse=True,
+    )
+    for old_entry in entries[CACHE_ENTRIES:]:
+        shutil.rmtree(old_entry, ignore_errors=True)
+
+
+def timed_call(func, kwargs):
+    # Runs in the worker, so the time doesn't include waiting for the pool
+    started = time.perf_counter()
+    value = func(**kwargs)
+    return value, time.perf_counter() - started
+
+
+def run(stages, workers=None, cache_dir=CACHE_DIR, force=False):
+    """
+    Run the stages in dependency order. Ready stages start in the order
+    they were given; up to `workers` run at once in a process pool (None:
+    one per CPU, 1 or less: all in this process). `force` reruns cached
+    stages. Returns {stage name: StageResult}. A failing stage raises
+    RuntimeError once the running ones finish.
+    """
+    graph = dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    workers = os.cpu_count() if workers is None else workers
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and any(not stage.local for stage in stages) else None
+
+    results, running, keys = {}, {}, {}
+
+    def finish(stage, value, seconds):
+        if stage.outputs and not stage.local:
+            store(stage, cache_entry(cache_dir, stage, keys[stage.name]))
+        results[stage.name] = StageResult(stage.name, 'ran', seconds, value)
+
+    def start(stage):
+        """
+        Run or submit a stage. Returns True when it finished here.
+        """
+        if stage.outputs and not stage.local:
+            keys[stage.name] = cache_key(stage)
+            if not force:
+                started = time.perf_counter()
+                restored = restore(stage, cache_entry(cache_dir, stage, keys[stage.name]))
+                if restored is not None:
+                    results[stage.name] = StageResult(
+                        stage.name, 'restored' if restored else 'cached', time.perf_counter() - started
+                    )
+                    return True
+
+        if pool is None or stage.local:
+            try:
+                value, seconds = timed_call(stage.func, stage.kwargs)
+            except Exception as e:
+                raise RuntimeError(f"Stage {stage.name} failed: {e}") from e
+            finish(stage, value, seconds)
+            return True
+        running[pool.submit(timed_call, stage.func, stage.kwargs)] = stage
+        return False
+
+    try:
+        while len(results) < len(stages):
+            ready = [
+                stage for stage in stages
+                if stage.name not in results and stage not in running.values() and graph[stage.name] <= results.keys()
+            ]
+            # Pool stages are only submitted; a local stage or a cache hit
+            # finishes right away and may make later stages ready
+            if any(start(stage) for stage in ready):
+                continue
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    value, seconds = future.result()
+                except Exception as e:
+                    wait(running)
+                    raise RuntimeError(f"Stage {stage.name} failed: {e}") from e
+                finish(stage, value, seconds)
+    finally:
+        if pool is not None:
+            for future in running:
+                future.cancel()
+            pool.shutdown()
+    return {name: results[name] for name in by_name}
+
+
+def report(results, seconds):
+    """
+    Print one line per stage and the wall time of the whole run.
+    """
+    width = max(len(name) for name in results) if results else 0
+    for result in results.values():
+        print(f"{result.name:<{width}}  {result.status:<8} {result.seconds:>8.2f} s")
+    busy = sum(result.seconds for result in results.values())
+    print(f"{'total':<{width}}  {'':<8} {seconds:>8.2f} s wall, {busy:.2f} s in stages")
+
+
+def etl_stages(extensions, chunksize=None, inputs=None, cleaned_outputs=None):
+    """
+    The ETL: the colors, episode colors and subjects are cleaned side by
+    side; the episodes need the cleaned colors for their YouTube links,
+    and the manifest covers everything. `inputs` and `cleaned_outputs`
+    default to etl_pipline.RAW_INPUTS and CLEANED_OUTPUTS.
+    """
+    from etl import cleaned_data
+    from etl import etl_pipline
+
+    colors_input, subjects_input, episodes_input = inputs or etl_pipline.RAW_INPUTS
+    colors_output, episode_colors_output, subjects_output, episodes_output = (
+        cleaned_outputs or etl_pipline.CLEANED_OUTPUTS
+    )
+
+    def outputs(base):
+        return [base + extension for extension in extensions]
+
+    # The first extension is the one the episodes stage reads the colors from
+    cleaned = [
+        Stage('colors', etl_pipline.colors_stage, [colors_input], outputs(colors_output),
+              kwargs={'colors_path': colors_input, 'outputs': outputs(colors_output), 'chunksize': chunksize}),
+        Stage('episode_colors', etl_pipline.episode_colors_stage, [colors_input], outputs(episode_colors_output),
+              kwargs={'colors_path': colors_input, 'outputs': outputs(episode_colors_output), 'chunksize': chunksize}),
+        Stage('subjects', etl_pipline.subjects_stage, [subjects_input], outputs(subjects_output),
+              kwargs={'subjects_path': subjects_input, 'outputs': outputs(subjects_output), 'chunksize': chunksize}),
+        Stage('episodes', etl_pipline.episodes_stage, [episodes_input, outputs(colors_output)[0]],
+              outputs(episodes_output),
+              kwargs={'episodes_path': episodes_input, 'colors_path': outputs(colors_output)[0],
+                      'outputs': outputs(episodes_output), 'chunksize': chunksize}),
+    ]
+    all_outputs = [path for stage in cleaned for path in stage.outputs]
+    loaded = [base + cleaned_data.FEATHER for base in etl_pipline.LOADED_OUTPUTS]
+    return cleaned + [
+        Stage('manifest', etl_pipline.manifest_stage, etl_pipline.RAW_INPUTS + all_outputs,
+              [etl_pipline.MANIFEST_PATH],
+              kwargs={'outputs': all_outputs, 'loaded': loaded, 'chunksize': chunksize}),
+    ]
+
+
+def load_stages(conn, chunksize=None, full=False, after=()):
+    """
+    database/load_data.py's incremental bulk load on `conn`, reading the
+    cleaned files (`chunksize` rows at a time if given) once the stages
+    `after` are done: clear the changed episodes, bulk load them, then
+    record the hashes and commit. Local stages, so they share `conn`. The
+    last one returns the new data version, None when nothing changed.
+    """
+    from database import load_data
+    from etl.manifest import current_episode_hashes
+
+    state = {}
+
+    def prepare():
+        state['hashes'] = current_episode_hashes(load_data.cleaned_files(), chunksize=chunksize)
+        state['changed'], state['deleted'] = load_data.clear_changes(conn, state['hashes'], full)
+        return len(state['changed']), len(state['deleted'])
+
+    def bulk_load():
+        if not state['changed']:
+            return 0
+        if chunksize:
+            tables = load_data.read_cleaned_batches(chunksize)
+        else:
+            tables = [[data] for data in load_data.read_cleaned_data()]
+        return load_data.bulk_load_batches(conn, *[load_data.only_changed(table, state['changed']) for table in tables])
+
+    def finish():
+        if not state['changed'] and not state['deleted']:
+            conn.rollback()
+            print("No episodes changed since the last load, nothing to do.")
+            return None
+        load_data.record_hashes(conn, state['hashes'], state['changed'], state['deleted'])
+        version = load_data.finish_load(conn)
+        print(f"Data version is now {version}")
+        return version
+
+    return [
+        Stage('load changes', prepare, after=after, local=True),
+        Stage('bulk load', bulk_load, after=['load changes'], local=True),
+        Stage('load finish', finish, after=['bulk load'], local=True),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean the raw Bob Ross CSVs, and optionally load them")
+    parser.add_argument("--force", action="store_true", help="rerun every stage instead of using cached outputs")
+    parser.add_argument("--csv", action="store_true", help="also export the cleaned data as CSV")
+    parser.add_argument("--chunksize", type=int,
+                        help="stream the raw files this many rows at a time instead of reading them whole")
+    parser.add_argument("--workers", type=int, help="stages to run at once (default: one per CPU, 1: no pool)")
+    parser.add_argument("--load", action="store_true",
+                        help="then load the cleaned data into PostgreSQL (incremental bulk load)")
+    parser.add_argument("--full", action="store_true", help="with --load, reload every episode")
+    args = parser.parse_args(argv)
+
+    from etl import cleaned_data
+
+    # Check for pyarrow before spending time on the cleaning
+    cleaned_data.require_pyarrow()
+    extensions = [cleaned_data.FEATHER] + ([cleaned_data.CSV] if args.csv else [])
+    stages = etl_stages(extensions, args.chunksize)
+
+    conn = None
+    if args.load:
+        from database.db import close_pool, get_pool
+        from database.load_data import connect_to_db
+
+        conn = connect_to_db()
+        if conn is None:
+            sys.exit(1)
+        stages += load_stages(conn, chunksize=args.chunksize, full=args.full, after=['manifest'])
+
+    started = time.perf_counter()
+    try:
+        results = run(stages, workers=args.workers, force=args.force)
+    except RuntimeError as e:
+        if conn is not None:
+            conn.rollback()
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if conn is not None:
+            get_pool().putconn(conn)
+            close_pool()
+
+    print()
+    report(results, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
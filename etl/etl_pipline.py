@@ -1,7 +1,17 @@
+import ast
 import os
+import sys
 import pandas as pd
 import re
 
+# Make the project root importable when run as `python3 etl/etl_pipline.py`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from etl import cleaned_data
+from etl.manifest import MANIFEST_PATH, build_manifest, diff_episodes, episode_hashes, read_manifest, write_manifest
+
 # I originally wanted this to be moduler, but I
 # COULD NOT get it to work. But if I had more time
 # I could have. (There was plenty of time for the project,
@@ -15,38 +25,70 @@ def get_absolute_path(relative_path):
     return os.path.join(base_dir, relative_path)
 
 
+# Everything remove_special_characters drops
+SPECIAL_CHARACTERS = r"[^a-zA-Z0-9# ]"
+
+
 def remove_special_characters(text):
     """
     Remove special characters from a string, except for '#' characters.
     """
-    return re.sub(r"[^a-zA-Z0-9# ]", "", text)
+    return re.sub(SPECIAL_CHARACTERS, "", text)
+
+
+def season_episode(season, episode):
+    """
+    Build S01E01 style identifiers from season and episode number columns.
+    """
+    return (
+        "S" + season.astype(int).astype(str).str.zfill(2)
+        + "E" + episode.astype(int).astype(str).str.zfill(2)
+    )
+
+
+def clean_list_field(field):
+    """
+    Turn a "['Bright Red', 'Sap Green']" style cell into "Bright Red | Sap Green".
+    """
+    try:
+        if isinstance(field, str) and field.startswith('[') and field.endswith(']'):
+            # literal_eval only accepts Python literals, never code
+            field = ast.literal_eval(field)
+        cleaned_items = [remove_special_characters(str(item).strip()) for item in field]
+        return " | ".join(cleaned_items)
+    except Exception:
+        return remove_special_characters(str(field))
+
+
+def clean_list_column(column):
+    """
+    clean_list_field over a whole column, parsing each distinct value once.
+    The colors and color_hex columns repeat the same few palettes.
+    """
+    distinct = column.drop_duplicates()
+    cleaned = pd.Series(distinct.map(clean_list_field).values, index=distinct.values)
+    return column.map(cleaned)
 
 
 def clean_colors(file_path):
     """
     Clean the colors dataset and include YouTube source links.
     """
-    df = pd.read_csv(file_path)
+    return clean_colors_frame(pd.read_csv(file_path))
 
-    df['Season-Episode'] = df.apply(
-        lambda row: f"S{int(row['season']):02d}E{int(row['episode']):02d}", axis=1
-    )
+
+def clean_colors_frame(df):
+    """
+    clean_colors on an already read DataFrame (or a chunk of one).
+    """
+    df['Season-Episode'] = season_episode(df['season'], df['episode'])
 
     # Clean string columns for painting_title
-    df['painting_title'] = df['painting_title'].apply(remove_special_characters)
+    df['painting_title'] = df['painting_title'].str.replace(SPECIAL_CHARACTERS, "", regex=True)
 
     # Parse and clean 'colors' and 'color_hex' fields
-    def clean_list_field(field):
-        try:
-            if isinstance(field, str) and field.startswith('[') and field.endswith(']'):
-                field = eval(field)
-            cleaned_items = [remove_special_characters(str(item).strip()) for item in field]
-            return " | ".join(cleaned_items)
-        except:
-            return remove_special_characters(str(field))
-
-    df['colors'] = df['colors'].apply(clean_list_field)
-    df['color_hex'] = df['color_hex'].apply(clean_list_field)
+    df['colors'] = clean_list_column(df['colors'])
+    df['color_hex'] = clean_list_column(df['color_hex'])
 
     df['colors'] = df['colors'].str.replace('"', '', regex=False)
     df['color_hex'] = df['color_hex'].str.replace('"', '', regex=False)
@@ -56,12 +98,70 @@ def clean_colors(file_path):
     return df
 
 
+def paint_hexes(df):
+    """
+    {paint name: hex code}, read off the colors and color_hex lists of the
+    rows where the two line up.
+    """
+    hexes = {}
+    for names, codes in df[['colors', 'color_hex']].drop_duplicates().itertuples(index=False):
+        try:
+            names, codes = ast.literal_eval(names), ast.literal_eval(codes)
+        except (ValueError, TypeError, SyntaxError):
+            continue
+        if len(names) != len(codes):
+            continue
+        for name, code in zip(names, codes):
+            hexes.setdefault(remove_special_characters(str(name).strip()), remove_special_characters(str(code).strip()))
+    return hexes
+
+
+def clean_episode_colors(file_path):
+    """
+    One row per paint used in an episode, melted from the one-hot paint
+    columns (Black_Gesso ... Alizarin_Crimson) of the colors dataset.
+    """
+    df = pd.read_csv(file_path)
+    return clean_episode_colors_frame(df, paint_hexes(df))
+
+
+def clean_episode_colors_frame(df, hexes):
+    """
+    clean_episode_colors on an already read DataFrame (or a chunk of one),
+    with the {paint name: hex code} map to use.
+    """
+    df['Season-Episode'] = season_episode(df['season'], df['episode'])
+
+    # The one-hot paint columns come after color_hex
+    paint_columns = df.columns[df.columns.get_loc('color_hex') + 1:].drop('Season-Episode')
+    long = df.melt(
+        id_vars=['Season-Episode'], value_vars=paint_columns,
+        var_name='color', value_name='used', ignore_index=False,
+    )
+    # Back to file order: episode by episode, paints in column order
+    long = long[long['used'] == 1].sort_index(kind='stable')
+    long['color'] = long['color'].str.replace('_', ' ', regex=False)
+
+    long['color_hex'] = long['color'].map(hexes)
+    missing = long.loc[long['color_hex'].isna(), 'color'].unique()
+    if len(missing):
+        raise ValueError(f"No hex code for paints: {', '.join(missing)}")
+
+    long = long.drop_duplicates(subset=['Season-Episode', 'color'])
+    return long[['Season-Episode', 'color', 'color_hex']].reset_index(drop=True)
+
+
 def clean_subjects(file_path):
     """
     Clean the subjects dataset.
     """
-    df = pd.read_csv(file_path)
+    return clean_subjects_frame(pd.read_csv(file_path))
+
 
+def clean_subjects_frame(df):
+    """
+    clean_subjects on an already read DataFrame (or a chunk of one).
+    """
     # Lowercase column names
     df.columns = [col.lower() for col in df.columns]
 
@@ -77,27 +177,34 @@ def clean_subjects(file_path):
     return df[['Season-Episode', 'subject']]
 
 
+# Lines look like: "A Walk in the Woods" (January 11, 1983). Leading
+# whitespace on a line is skipped, as line.strip() used to.
+EPISODE_LINE = re.compile(r'^[^\S\n]*"(.+)" \((.+)\)', re.MULTILINE)
+
+
+def parse_episode_lines(text, start=0):
+    """
+    Title, air date and Season-Episode of every episode line in `text`.
+    `start` is the number of episode lines before it in the file.
+    """
+    # One regex pass over the whole text rather than one match per line
+    df = pd.DataFrame(EPISODE_LINE.findall(text), columns=['title', 'air_date'])
+    df['air_date'] = pd.to_datetime(df['air_date'], format='%B %d, %Y')
+
+    # Generate Season-Episode identifiers based on title order
+    order = pd.Series(range(start, start + len(df)))
+    df['Season-Episode'] = season_episode(order // 13 + 1, order % 13 + 1)
+    return df
+
+
 def clean_episodes(file_path, colors_cleaned):
     """
     Clean the episodes dataset and join YouTube links.
     """
     with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    titles, air_dates = [], []
-    for line in lines:
-        match = re.match(r'"(.+)" \((.+)\)', line.strip())
-        if match:
-            titles.append(match.group(1))
-            air_dates.append(match.group(2))
+        text = file.read()
 
-    df = pd.DataFrame({'title': titles, 'air_date': air_dates})
-    df['air_date'] = pd.to_datetime(df['air_date'], format='%B %d, %Y')
-
-    # Generate Season-Episode identifiers based on title order
-    df['Season-Episode'] = df.index.map(
-        lambda idx: f"S{(idx // 13) + 1:02d}E{(idx % 13) + 1:02d}"
-    )
+    df = parse_episode_lines(text)
 
     # Deduplicate based on 'title' and 'air_date'
     df = df.drop_duplicates(subset=['title', 'air_date'])
@@ -107,43 +214,100 @@ def clean_episodes(file_path, colors_cleaned):
     return df[['Season-Episode', 'title', 'air_date', 'youtube_src']]
 
 
-def save_cleaned_data(cleaned_df, output_path):
+def save_cleaned_data(cleaned_df, output_path, categories=()):
     """
-    Save the cleaned DataFrame to a CSV file.
+    Save the cleaned DataFrame, as Feather or CSV depending on the extension.
     """
-    cleaned_df.to_csv(output_path, index=False)
+    cleaned_data.save(cleaned_df, output_path, categories)
 
 
-if __name__ == "__main__":
-    # Define paths using get_absolute_path
-    colors_input_path = get_absolute_path('data/raw/colors_used.csv')
-    subjects_input_path = get_absolute_path('data/raw/subject_matter.csv')
-    episodes_input_path = get_absolute_path('data/raw/episode_dates.csv')
+# Raw inputs and cleaned outputs (without their extension), relative to the
+# project root. These are what the manifest (etl/manifest.py) hashes.
+RAW_INPUTS = ['data/raw/colors_used.csv', 'data/raw/subject_matter.csv', 'data/raw/episode_dates.csv']
+CLEANED_OUTPUTS = [
+    'data/cleaned_up/colors_cleaned',
+    'data/cleaned_up/episode_colors_cleaned',
+    'data/cleaned_up/subjects_cleaned',
+    'data/cleaned_up/episodes_cleaned',
+]
+# The ones database/load_data.py loads, which the per-episode hashes cover
+LOADED_OUTPUTS = CLEANED_OUTPUTS[1:]
 
-    colors_output_path = get_absolute_path('data/cleaned_up/colors_cleaned.csv')
-    subjects_output_path = get_absolute_path('data/cleaned_up/subjects_cleaned.csv')
-    episodes_output_path = get_absolute_path('data/cleaned_up/episodes_cleaned.csv')
 
-    print("Cleaning colors data...")
-    try:
-        colors_cleaned = clean_colors(colors_input_path)
-        save_cleaned_data(colors_cleaned, colors_output_path)
-        print(f"Colors data cleaned and saved to {colors_output_path}")
-    except Exception as e:
-        print(f"Error cleaning colors data: {e}")
+def save_outputs(cleaned_df, outputs, categories=()):
+    """
+    Save a cleaned DataFrame to each of `outputs`. Returns its row count.
+    """
+    for output in outputs:
+        save_cleaned_data(cleaned_df, get_absolute_path(output), categories)
+    return len(cleaned_df)
+
+
+# The stages etl/dag.py runs. Each cleans one table into `outputs`, the
+# same file in every format asked for, reading its inputs whole or, with a
+# chunksize, streaming them through etl/streaming.py. They return the
+# number of rows written.
+
+def colors_stage(colors_path, outputs, chunksize=None):
+    if chunksize:
+        from etl.streaming import stream_colors, stream_table
+        rows = stream_table(stream_colors, get_absolute_path(colors_path), outputs, chunksize)
+    else:
+        rows = save_outputs(clean_colors(get_absolute_path(colors_path)), outputs)
+    print(f"Colors data cleaned and saved to {', '.join(outputs)}")
+    return rows
+
+
+def episode_colors_stage(colors_path, outputs, chunksize=None):
+    if chunksize:
+        from etl.streaming import stream_episode_colors, stream_table
+        rows = stream_table(stream_episode_colors, get_absolute_path(colors_path), outputs, chunksize)
+    else:
+        rows = save_outputs(clean_episode_colors(get_absolute_path(colors_path)), outputs, ['color', 'color_hex'])
+    print(f"Episode colors data cleaned and saved to {', '.join(outputs)}")
+    return rows
+
+
+def subjects_stage(subjects_path, outputs, chunksize=None):
+    if chunksize:
+        from etl.streaming import stream_subjects, stream_table
+        rows = stream_table(stream_subjects, get_absolute_path(subjects_path), outputs, chunksize)
+    else:
+        rows = save_outputs(clean_subjects(get_absolute_path(subjects_path)), outputs, ['subject'])
+    print(f"Subjects data cleaned and saved to {', '.join(outputs)}")
+    return rows
+
+
+def episodes_stage(episodes_path, colors_path, outputs, chunksize=None):
+    """
+    `colors_path` is the cleaned colors table, for the YouTube links.
+    """
+    if chunksize:
+        from etl.streaming import stream_episodes, stream_table
+        rows = stream_table(stream_episodes, get_absolute_path(episodes_path), outputs, chunksize,
+                            colors_path=get_absolute_path(colors_path))
+    else:
+        colors_cleaned = cleaned_data.read(get_absolute_path(colors_path))
+        rows = save_outputs(clean_episodes(get_absolute_path(episodes_path), colors_cleaned), outputs)
+    print(f"Episodes data cleaned and saved to {', '.join(outputs)}")
+    return rows
+
+
+def manifest_stage(outputs, loaded, chunksize=None):
+    """
+    Record what was cleaned in the manifest and report which episodes the
+    loader will pick up. Returns (changed, deleted) counts.
+    """
+    previous_manifest = read_manifest()
+    manifest = build_manifest(RAW_INPUTS, outputs, episodes=episode_hashes(loaded, chunksize))
+    changed, deleted = diff_episodes((previous_manifest or {}).get('episodes', {}), manifest['episodes'])
+    write_manifest(manifest)
+    print(f"{len(changed)} new or changed episodes, {len(deleted)} removed.")
+    return len(changed), len(deleted)
 
-    print("\nCleaning subjects data...")
-    try:
-        subjects_cleaned = clean_subjects(subjects_input_path)
-        save_cleaned_data(subjects_cleaned, subjects_output_path)
-        print(f"Subjects data cleaned and saved to {subjects_output_path}")
-    except Exception as e:
-        print(f"Error cleaning subjects data: {e}")
 
-    print("\nCleaning episodes data...")
-    try:
-        episodes_cleaned = clean_episodes(episodes_input_path, colors_cleaned)
-        save_cleaned_data(episodes_cleaned, episodes_output_path)
-        print(f"Episodes data cleaned and saved to {episodes_output_path}")
-    except Exception as e:
-        print(f"Error cleaning episodes data: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    # The cleaning runs as a DAG now, see etl/dag.py for the options
+    from etl.dag import main
+
+    main()
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from functools import reduce
+
+import pandas as pd
+
+from etl import cleaned_data
+
+# The manifest records what the last ETL run consumed and produced:
+#
+#   {
+#     "inputs":   {"data/raw/colors_used.csv": "<sha256>", ...},
+#     "outputs":  {"data/cleaned_up/colors_cleaned.feather": "<sha256>", ...},
+#     "episodes": {"S01E01": "<sha256 of every cleaned row for S01E01>", ...}
+#   }
+#
+# Skipping unchanged cleaning is up to etl/dag.py's per-stage cache. The
+# loader compares the per-episode hashes with the ones it stored at its
+# last load so it only touches new, changed and removed episodes.
+
+MANIFEST_PATH = 'data/cleaned_up/manifest.json'
+
+KEY_COLUMN = 'season-episode'
+
+
+def project_path(relative_path):
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    return os.path.join(base_dir, relative_path)
+
+
+def file_hash(path):
+    """
+    sha256 of a file's bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_hashes(relative_paths):
+    """
+    {relative path: sha256}, None for files that don't exist.
+    """
+    return {
+        path: file_hash(project_path(path)) if os.path.exists(project_path(path)) else None
+        for path in relative_paths
+    }
+
+
+def rendered_rows(name, frame):
+    """
+    (key, row) for every row of a table, row being the table name and the
+    row's values as text. The per-episode hashes are taken over these.
+    """
+    columns = {str(column).strip().lower(): column for column in frame.columns}
+    key = frame[columns[KEY_COLUMN]].astype(str)
+    values = [frame[column].astype(str).where(frame[column].notna(), '') for column in frame.columns]
+    text = reduce(lambda left, right: left + '\x1f' + right, values)
+    return pd.DataFrame({'key': key.values, 'row': (name + '\x1e' + text).values})
+
+
+def frame_hashes(frames):
+    """
+    Hash every episode's rows across the given {name: DataFrame} tables.
+
+    Each row is rendered as text and the rows of an episode are sorted
+    before hashing, so row order within a file doesn't matter.
+    """
+    rows = pd.concat([rendered_rows(name, frame) for name, frame in sorted(frames.items())], ignore_index=True)
+    rows = rows.sort_values(['key', 'row'])
+    return {
+        key: hashlib.sha256('\n'.join(group).encode('utf-8')).hexdigest()
+        for key, group in rows.groupby('key', sort=True)['row']
+    }
+
+
+class EpisodeHasher:
+    """
+    frame_hashes for tables too big to hold at once. add() them chunk by
+    chunk; the rendered rows go to a temporary SQLite file, which does the
+    sorting in digests().
+    """
+
+    def __init__(self):
+        file, self.path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(file)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("CREATE TABLE rows (key TEXT, row TEXT)")
+
+    def add(self, name, frame):
+        self.db.executemany("INSERT INTO rows VALUES (?, ?)", rendered_rows(name, frame).itertuples(index=False))
+
+    def digests(self):
+        # SQLite orders TEXT by its UTF-8 bytes, the same order as Python strings
+        hashes, key, digest = {}, None, None
+        for row_key, row in self.db.execute("SELECT key, row FROM rows ORDER BY key, row"):
+            if row_key != key:
+                if digest is not None:
+                    hashes[key] = digest.hexdigest()
+                key, digest = row_key, hashlib.sha256(row.encode('utf-8'))
+            else:
+                digest.update(b'\n' + row.encode('utf-8'))
+        if digest is not None:
+            hashes[key] = digest.hexdigest()
+        return hashes
+
+    def close(self):
+        self.db.close()
+        os.remove(self.path)
+
+
+def episode_hashes(relative_paths, chunksize=None):
+    """
+    Per-episode hashes of cleaned files, read as the text the CSV holds so
+    the ETL and the loader agree whichever format they read. With a
+    chunksize the files are read that many rows at a time.
+    """
+    names = [os.path.splitext(os.path.basename(path))[0] for path in relative_paths]
+    if chunksize is None:
+        return frame_hashes({
+            name: cleaned_data.read(project_path(path), as_text=True) for name, path in zip(names, relative_paths)
+        })
+
+    hasher = EpisodeHasher()
+    try:
+        for name, path in zip(names, relative_paths):
+            for batch in cleaned_data.read_batches(project_path(path), chunksize, as_text=True):
+                hasher.add(name, batch)
+        return hasher.digests()
+    finally:
+        hasher.close()
+
+
+def build_manifest(inputs, outputs, loaded=None, episodes=None):
+    """
+    Hash the inputs and outputs, and per episode the `loaded` outputs
+    (all of them by default), i.e. the ones database/load_data.py reads.
+    `episodes` passes in per-episode hashes computed elsewhere.
+    """
+    return {
+        'inputs': file_hashes(inputs),
+        'outputs': file_hashes(outputs),
+        'episodes': episodes if episodes is not None else episode_hashes(outputs if loaded is None else loaded),
+    }
+
+
+def read_manifest(path=MANIFEST_PATH):
+    """
+    Return the manifest, or None if there isn't a readable one.
+    """
+    try:
+        with open(project_path(path)) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or not {'inputs', 'outputs', 'episodes'} <= manifest.keys():
+        return None
+    return manifest
+
+
+def write_manifest(manifest, path=MANIFEST_PATH):
+    # Write then rename, so an interrupted run never leaves half a manifest
+    temporary_path = project_path(path) + '.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.write('\n')
+    os.replace(temporary_path, project_path(path))
+
+
+def outputs_current(manifest, outputs):
+    """
+    True when every cleaned file is still exactly what the manifest recorded.
+    """
+    if manifest is None:
+        return False
+    recorded = manifest['outputs']
+    current = file_hashes(outputs)
+    return all(current[path] is not None and recorded.get(path) == current[path] for path in outputs)
+
+
+def current_episode_hashes(outputs, path=MANIFEST_PATH, chunksize=None):
+    """
+    Per-episode hashes of the cleaned files, taken from the manifest when it
+    still matches them and recomputed otherwise.
+    """
+    manifest = read_manifest(path)
+    if outputs_current(manifest, outputs):
+        return manifest['episodes']
+    return episode_hashes(outputs, chunksize)
+
+
+def diff_episodes(previous, current):
+    """
+    Compare two {season_episode: hash} maps. Returns (changed, deleted),
+    changed including new episodes, both sorted.
+    """
+    changed = sorted(key for key, digest in current.items() if previous.get(key) != digest)
+    deleted = sorted(key for key in previous if key not in current)
+    return changed, deleted
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import tempfile
+from itertools import islice
+
+import pandas as pd
+
+from etl import cleaned_data
+from etl.etl_pipline import (
+    clean_colors_frame, clean_episode_colors_frame, clean_subjects_frame, paint_hexes, parse_episode_lines,
+)
+
+# The ETL for raw files too big to hold in memory (etl_pipline.py
+# --chunksize). Every table is read, cleaned and written `chunksize` rows
+# (or episode lines) at a time with the same *_frame functions as the
+# in-memory ETL. What has to be remembered across chunks, the rows already
+# seen for the first-wins deduplication and the YouTube links that
+# episodes are joined with, is spilled to a temporary SQLite file instead
+# of being kept in pandas.
+#
+# The output holds the same rows as the in-memory ETL. Only the subjects
+# come out in a different order: they are melted chunk by chunk rather
+# than over the whole file.
+
+# Text columns of colors_used.csv, read as strings so a chunk where one is
+# empty throughout doesn't come back as floats
+COLOR_TEXT_COLUMNS = {'painting_title': str, 'colors': str, 'color_hex': str, 'youtube_src': str}
+
+
+class Spill:
+    """
+    A temporary SQLite file holding what the streamed ETL remembers between
+    chunks.
+    """
+
+    def __init__(self):
+        file, self.path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(file)
+        self.db = sqlite3.connect(self.path)
+        # Scratch data: no journal and no fsync, and the per-chunk table in memory
+        self.db.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            PRAGMA temp_store = MEMORY;
+            CREATE TABLE seen (name TEXT, key TEXT, PRIMARY KEY (name, key)) WITHOUT ROWID;
+            CREATE TABLE youtube (season_episode TEXT, youtube_src TEXT);
+            CREATE INDEX youtube_season_episode ON youtube (season_episode);
+            CREATE TEMP TABLE chunk (position INTEGER, key TEXT);
+        """)
+
+    def stage(self, keys):
+        self.db.execute("DELETE FROM chunk")
+        self.db.executemany("INSERT INTO chunk VALUES (?, ?)", enumerate(keys))
+
+    def first_seen(self, name, frame, columns):
+        """
+        The rows of `frame` whose `columns` didn't occur in it or in an
+        earlier chunk of the `name` table, as drop_duplicates would keep.
+        """
+        frame = frame.drop_duplicates(subset=columns)
+        keys = frame[columns[0]].astype(str)
+        for column in columns[1:]:
+            keys = keys + '\x1f' + frame[column].astype(str)
+        self.stage(keys)
+        new = self.db.execute(
+            "SELECT position FROM chunk WHERE NOT EXISTS (SELECT 1 FROM seen WHERE name = ? AND key = chunk.key)",
+            (name,),
+        ).fetchall()
+        self.db.execute("INSERT OR IGNORE INTO seen SELECT ?, key FROM chunk", (name,))
+        return frame.iloc[sorted(position for (position,) in new)]
+
+    def add_youtube(self, colors):
+        self.db.executemany("INSERT INTO youtube VALUES (?, ?)", (
+            (season_episode, None if pd.isna(youtube_src) else youtube_src)
+            for season_episode, youtube_src in colors[['Season-Episode', 'youtube_src']].itertuples(index=False)
+        ))
+
+    def youtube_links(self, season_episodes):
+        """
+        The Season-Episode and youtube_src rows of the cleaned colors for
+        these episodes, in file order.
+        """
+        self.stage(season_episodes)
+        rows = self.db.execute("""
+            SELECT season_episode, youtube_src FROM youtube
+            WHERE season_episode IN (SELECT key FROM chunk)
+            ORDER BY rowid
+        """).fetchall()
+        return pd.DataFrame(rows, columns=['Season-Episode', 'youtube_src'], dtype=object)
+
+    def close(self):
+        self.db.close()
+        os.remove(self.path)
+
+
+def stream_colors(path, chunksize, spill):
+    """
+    clean_colors, chunk by chunk.
+    """
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=COLOR_TEXT_COLUMNS):
+        yield spill.first_seen('colors', clean_colors_frame(chunk), ['Season-Episode', 'colors', 'color_hex'])
+
+
+def stream_episode_colors(path, chunksize, spill):
+    """
+    clean_episode_colors, chunk by chunk. The paint hex codes are collected
+    in a first pass over the file.
+    """
+    hexes = {}
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=['colors', 'color_hex'], dtype=str):
+        for name, code in paint_hexes(chunk).items():
+            hexes.setdefault(name, code)
+
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=COLOR_TEXT_COLUMNS):
+        yield spill.first_seen('episode_colors', clean_episode_colors_frame(chunk, hexes), ['Season-Episode', 'color'])
+
+
+def stream_subjects(path, chunksize, spill):
+    """
+    clean_subjects, chunk by chunk.
+    """
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        yield spill.first_seen('subjects', clean_subjects_frame(chunk), ['Season-Episode', 'subject'])
+
+
+def stream_episodes(path, chunksize, spill):
+    """
+    clean_episodes, `chunksize` lines at a time. The spill has to hold the
+    cleaned colors' YouTube links (see stream_table).
+    """
+    start = 0
+    with open(path, 'r') as file:
+        while True:
+            lines = list(islice(file, chunksize))
+            if not lines:
+                break
+            df = parse_episode_lines(''.join(lines), start)
+            start += len(df)
+
+            df = spill.first_seen('episodes', df, ['title', 'air_date'])
+            df = df.merge(spill.youtube_links(df['Season-Episode']), on='Season-Episode', how='left')
+            yield df[['Season-Episode', 'title', 'air_date', 'youtube_src']]
+
+
+def write_batches(batches, paths):
+    """
+    Write every batch to each of `paths`. Returns the number of rows.
+    """
+    writers = [cleaned_data.ChunkWriter(path) for path in paths]
+    rows = 0
+    try:
+        for batch in batches:
+            for writer in writers:
+                writer.write(batch)
+            rows += len(batch)
+    finally:
+        for writer in writers:
+            writer.close()
+    return rows
+
+
+def stream_table(stream, path, outputs, chunksize, colors_path=None):
+    """
+    Write one streamed table (stream_colors, ...) to each of `outputs`
+    with a spill of its own. `colors_path` is the cleaned colors file
+    stream_episodes takes the YouTube links from. Returns the number of
+    rows.
+    """
+    spill = Spill()
+    try:
+        if colors_path is not None:
+            for batch in cleaned_data.read_batches(colors_path, chunksize):
+                spill.add_youtube(batch)
+        return write_batches(stream(path, chunksize, spill), outputs)
+    finally:
+        spill.close()
+
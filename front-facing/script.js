@@ -2,6 +2,8 @@ const API_BASE_URL = "http://127.0.0.1:5005";
 
 let currentPage = 1;
 const pageSize = 10;
+// next_cursor returned for each page, so Previous/Next can jump back and forth
+let pageCursors = [null];
 
 // Get the Photos
 async function fetchNaturePhotos(region) {
@@ -55,7 +57,11 @@ function populateCarousel(photos) {
 
 async function fetchPaginatedEpisodes(photoReference) {
     try {
-        const response = await fetch(`${API_BASE_URL}/analyze?page=${currentPage}&page_size=${pageSize}`, {
+        const params = new URLSearchParams({ page_size: pageSize });
+        const cursor = pageCursors[currentPage - 1];
+        if (cursor) params.set("cursor", cursor);
+
+        const response = await fetch(`${API_BASE_URL}/analyze?${params}`, {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -71,6 +77,7 @@ async function fetchPaginatedEpisodes(photoReference) {
             console.error("Pagination data missing in API response");
             return;
         }
+        pageCursors[currentPage] = data.pagination.next_cursor;
 
         displayResults(data.matched_subjects, data.matched_episodes, data.pagination, photoReference);
     } catch (error) {
@@ -87,6 +94,7 @@ async function analyzePhoto(photoReference) {
         }
 
         currentPage = 1;
+        pageCursors = [null];
         fetchPaginatedEpisodes(photoReference);
     } catch (error) {
         console.error("Error analyzing photo:", error);
@@ -125,13 +133,13 @@ function displayResults(subjects, episodes, pagination, photoReference) {
     if (pagination) {
         const paginationControls = `
         <div>
-            <button onclick="changePage(${pagination.current_page - 1}, '${photoReference}')"
-                ${pagination.current_page === 1 ? "disabled" : ""}>
+            <button onclick="changePage(${currentPage - 1}, '${photoReference}')"
+                ${currentPage === 1 ? "disabled" : ""}>
                 Previous
             </button>
-            Page ${pagination.current_page} of ${pagination.total_pages}
-            <button onclick="changePage(${pagination.current_page + 1}, '${photoReference}')"
-                ${pagination.current_page >= pagination.total_pages ? "disabled" : ""}>
+            Page ${currentPage} of ${pagination.total_pages}
+            <button onclick="changePage(${currentPage + 1}, '${photoReference}')"
+                ${pagination.next_cursor ? "" : "disabled"}>
                 Next
             </button>
         </div>
@@ -141,7 +149,7 @@ function displayResults(subjects, episodes, pagination, photoReference) {
 }
 
 function changePage(newPage, photoReference) {
-    if (newPage > 0) {
+    if (newPage > 0 && newPage <= pageCursors.length) {
         currentPage = newPage;
         fetchPaginatedEpisodes(photoReference);
     }
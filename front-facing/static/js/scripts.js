@@ -2,12 +2,23 @@ document.addEventListener("DOMContentLoaded", async () => {
     const API_URL = "http://127.0.0.1:5005/episodes";
     const episodesTableBody = document.getElementById("episodes-table-body");
     const filterForm = document.getElementById("filter-form");
+    const pageSize = 50;
 
-    // Function to fetch and populate episodes
-    async function fetchEpisodes(params = {}) {
+    // "Load more" button under the table, shown while there are more pages
+    const loadMoreButton = document.createElement("button");
+    loadMoreButton.textContent = "Load more";
+    loadMoreButton.style.display = "none";
+    episodesTableBody.closest("table").after(loadMoreButton);
+
+    let currentFilters = {};
+    let nextCursor = null;
+
+    // Function to fetch and populate episodes, one page at a time
+    async function fetchEpisodes(params = {}, cursor = null) {
         try {
             // Build query parameters
-            const query = new URLSearchParams(params).toString();
+            const query = new URLSearchParams({ ...params, limit: pageSize });
+            if (cursor) query.set("cursor", cursor);
             const response = await fetch(`${API_URL}?${query}`);
 
             if (!response.ok) {
@@ -15,15 +26,20 @@ document.addEventListener("DOMContentLoaded", async () => {
             }
 
             const data = await response.json();
-            renderEpisodes(data.episodes);
+            currentFilters = params;
+            nextCursor = data.next_cursor;
+            renderEpisodes(data.episodes, Boolean(cursor));
+            loadMoreButton.style.display = nextCursor ? "" : "none";
         } catch (error) {
             console.error("Error fetching episodes:", error);
         }
     }
 
+    loadMoreButton.addEventListener("click", () => fetchEpisodes(currentFilters, nextCursor));
+
     // Function to render episodes in the table
-    function renderEpisodes(episodes) {
-        episodesTableBody.innerHTML = ""; // Clear existing rows
+    function renderEpisodes(episodes, append = false) {
+        if (!append) episodesTableBody.innerHTML = ""; // Clear existing rows
         episodes.forEach((episode) => {
             const row = document.createElement("tr");
 
@@ -1,5 +1,8 @@
+import datetime
+import io
 import os
 import sys
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 from flask import json
@@ -8,6 +11,9 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+# Keep cached photos out of the real cache directory
+os.environ["PHOTO_CACHE_DIR"] = tempfile.mkdtemp(prefix="bobross-test-photos-")
+
 # Mock google.auth.default so it doesn't look for real credentials
 with patch('google.auth.default', return_value=(MagicMock(), "test-project-id")):
     # Create a mock Vision client that returns a label for "Mountain"
@@ -16,24 +22,52 @@ with patch('google.auth.default', return_value=(MagicMock(), "test-project-id"))
     mock_vision_client_instance.label_detection.return_value.label_annotations = [mock_label]
 
     with patch('google.cloud.vision.ImageAnnotatorClient', return_value=mock_vision_client_instance):
-        from backend.app import app
+        from backend.app import (
+            analysis_cache, app, color_cache, data_version, label_cache, metrics, palette_index, photo_cache,
+            places_cache, prefetch_places, subject_matcher, warm_labels,
+        )
+        from api.episode_query import decode_cursor
+        from backend.upstream import VISION_TIMEOUT
+        from database.db import close_pool
+        from google.api_core.retry import Retry
+
+try:
+    from PIL import Image
+    HAS_PILLOW = True
+except ImportError:
+    HAS_PILLOW = False
 
 class TestAppEndpoints(unittest.TestCase):
     def setUp(self):
         self.client = app.test_client()
+        label_cache.clear()
+        photo_cache.clear()
+        places_cache.clear()
+        close_pool()
+        subject_matcher.load([(1, "mountain"), (2, "tree")])
+        color_cache.clear()
+        palette_index.load(
+            [
+                (1, "S01E01", "A Walk in the Woods", datetime.date(1983, 1, 11)),
+                (2, "S01E02", "Mt. McKinley", datetime.date(1983, 1, 18)),
+            ],
+            [(1, "Phthalo Blue", "#0C0040"), (1, "Titanium White", "#FFFFFF"), (2, "Bright Red", "#DB0000")],
+        )
+        analysis_cache.clear()
+        data_version.set(1, datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
 
     def test_root_redirect(self):
         response = self.client.get('/')
         self.assertEqual(response.status_code, 302)
         self.assertIn('/index.html', response.location)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_places_no_region(self, mock_requests):
         response = self.client.get('/places')
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json, {"error": "Region is required"})
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_places_with_region(self, mock_requests):
         mock_response = MagicMock()
         mock_response.json.return_value = {
@@ -62,15 +96,37 @@ class TestAppEndpoints(unittest.TestCase):
         self.assertEqual(data[1]['location'], "456 Leafy Rd")
         self.assertIsNone(data[1]['photo_reference'])
 
+    @patch('requests.Session.get')
+    def test_get_places_cached_per_region(self, mock_requests):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"status": "OK", "results": [{"name": "Nature Park"}]}
+        mock_requests.return_value = mock_response
+
+        first = self.client.get('/places?region=Oregon')
+        second = self.client.get('/places?region=%20oregon%20')
+        self.assertEqual(first.get_json(), second.get_json())
+        mock_requests.assert_called_once()
+        self.assertEqual(mock_requests.call_args.kwargs["params"]["query"], "nature in oregon")
+
+    @patch('requests.Session.get')
+    def test_get_places_does_not_cache_errors(self, mock_requests):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"status": "OVER_QUERY_LIMIT", "results": []}
+        mock_requests.return_value = mock_response
+
+        self.client.get('/places?region=Oregon')
+        self.client.get('/places?region=Oregon')
+        self.assertEqual(mock_requests.call_count, 2)
+
     def test_get_photo_missing_reference(self):
         response = self.client.get('/photo')
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json, {"error": "Missing photo_reference"})
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_photo_success(self, mock_requests):
         mock_response = MagicMock()
-        mock_response.content = b'fake_image_data'
+        mock_response.iter_content.return_value = [b'fake_', b'image_data']
         mock_response.headers = {"Content-Type": "image/jpeg"}
         mock_response.raise_for_status = MagicMock()
         mock_requests.return_value = mock_response
@@ -79,12 +135,245 @@ class TestAppEndpoints(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data, b'fake_image_data')
         self.assertEqual(response.content_type, "image/jpeg")
+        self.assertIn("ETag", response.headers)
+        self.assertIn("max-age", response.headers["Cache-Control"])
+        response.close()
+        mock_response.close.assert_called()
+
+    @patch('requests.Session.get')
+    def test_get_photo_served_from_cache(self, mock_requests):
+        mock_response = MagicMock()
+        mock_response.iter_content.return_value = [b'fake_image_data']
+        mock_response.headers = {"Content-Type": "image/jpeg"}
+        mock_requests.return_value = mock_response
+
+        first = self.client.get('/photo?photo_reference=abc123')
+        self.assertEqual(first.data, b'fake_image_data')
+        second = self.client.get('/photo?photo_reference=abc123')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, b'fake_image_data')
+        self.assertEqual(second.content_type, "image/jpeg")
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+        self.assertEqual(mock_requests.call_count, 1)
+        self.assertEqual(photo_cache.stats()["hits"], 1)
+
+    @patch('requests.Session.get')
+    def test_get_photo_not_modified(self, mock_requests):
+        etag = '"%s"' % photo_cache.etag(photo_cache.key("abc123", 800))
+        response = self.client.get('/photo?photo_reference=abc123', headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        mock_requests.assert_not_called()
+
+    @patch('requests.Session.get')
+    def test_prefetch_leaves_the_label_cache_stats_alone(self, mock_requests):
+        mock_response = MagicMock()
+        mock_response.content = b'fake_image_data'
+        mock_response.headers = {"Content-Type": "image/jpeg"}
+        mock_requests.return_value = mock_response
+        label_cache.set("cached", ["tree"])
+        stats = label_cache.stats()
+
+        places = [{"photo_reference": "cached"}, {"photo_reference": "new"}, {"photo_reference": None}]
+        with patch('backend.app.prefetcher') as mock_prefetcher:
+            prefetch_places(places)
+        mock_prefetcher.submit.assert_called_once_with(["new"])
+
+        warm_labels("cached")
+        warm_labels("new")
+        self.assertEqual(mock_requests.call_count, 1)
+        self.assertEqual(label_cache.get("new"), ["mountain"])
+        self.assertEqual(label_cache.stats()["hits"] - stats["hits"], 1)
+        self.assertEqual(label_cache.stats()["misses"], stats["misses"])
 
     def test_analyze_photo_missing_reference(self):
         response = self.client.post('/analyze', json={})
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json, {"error": "Missing photo_reference"})
 
+    @patch('psycopg2.connect')
+    @patch('requests.Session.get')
+    def test_analyze_photo_reuses_cached_labels(self, mock_requests, mock_connect):
+        mock_response = MagicMock()
+        mock_response.content = b'fake_image_data'
+        mock_response.headers = {"Content-Type": "image/jpeg"}
+        mock_requests.return_value = mock_response
+        mock_cursor = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = (0,)
+        mock_cursor.fetchall.return_value = []
+        mock_vision_client_instance.label_detection.reset_mock()
+        hits = label_cache.stats()["hits"]
+
+        for _ in range(2):
+            response = self.client.post('/analyze', json={"photo_reference": "abc123"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()["labels"], ["mountain"])
+            self.assertEqual(response.get_json()["matched_subjects"], [{"subject_id": 1, "name": "mountain"}])
+
+        self.assertEqual(mock_requests.call_count, 1)
+        mock_vision_client_instance.label_detection.assert_called_once()
+        self.assertEqual(label_cache.stats()["hits"] - hits, 1)
+        kwargs = mock_vision_client_instance.label_detection.call_args.kwargs
+        self.assertEqual(kwargs["timeout"], VISION_TIMEOUT)
+        self.assertIsInstance(kwargs["retry"], Retry)
+
+    @patch('psycopg2.connect')
+    @patch('requests.Session.get')
+    def test_analyze_photo_stage_timings(self, mock_requests, mock_connect):
+        mock_response = MagicMock()
+        mock_response.content = b'fake_image_data'
+        mock_response.headers = {"Content-Type": "image/jpeg"}
+        mock_requests.return_value = mock_response
+        mock_cursor = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = (0,)
+        mock_cursor.fetchall.return_value = []
+        vision_calls = metrics.get("upstream_calls_total", service="vision")
+
+        response = self.client.post('/analyze', json={"photo_reference": "timed"})
+        self.assertEqual(response.status_code, 200)
+        stages = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+        self.assertEqual(stages[:3], ["photo_download", "vision", "colors_extract"])
+        self.assertIn("subjects", stages)
+        self.assertEqual(stages[-1], "total")
+
+        self.assertEqual(metrics.get("upstream_calls_total", service="vision") - vision_calls, 1)
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('bobross_http_request_duration_seconds_count{method="POST",route="/analyze"}', text)
+        self.assertIn('bobross_upstream_calls_total{service="places_photo"}', text)
+
+    @patch('psycopg2.connect')
+    def test_analyze_results_cached_per_data_version(self, mock_connect):
+        label_cache.set("abc123", ["mountain"])
+        mock_cursor = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = (0,)
+        mock_cursor.fetchall.return_value = []
+
+        self.client.post('/analyze', json={"photo_reference": "abc123"})
+        self.client.post('/analyze', json={"photo_reference": "abc123"})
+        self.assertEqual(mock_cursor.execute.call_count, 2)
+
+        data_version.set(2, datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+        self.client.post('/analyze', json={"photo_reference": "abc123"})
+        self.assertEqual(mock_cursor.execute.call_count, 4)
+
+    @unittest.skipUnless(HAS_PILLOW, "Pillow is not installed")
+    @patch('psycopg2.connect')
+    @patch('requests.Session.get')
+    def test_analyze_photo_ranks_episodes_by_color(self, mock_requests, mock_connect):
+        pixels = bytearray(b'\x10\x10\x50' * 600 * 800)
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (800, 600), bytes(pixels)).save(buffer, "PNG")
+        mock_response = MagicMock()
+        mock_response.content = buffer.getvalue()
+        mock_response.headers = {"Content-Type": "image/png"}
+        mock_requests.return_value = mock_response
+        mock_cursor = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = (0,)
+        mock_cursor.fetchall.return_value = []
+        hits = color_cache.stats()["hits"]
+
+        for _ in range(2):
+            response = self.client.post('/analyze', json={"photo_reference": "blue"})
+            self.assertEqual(response.status_code, 200)
+            colors = response.get_json()["colors"]
+            self.assertEqual(colors["dominant_colors"][0]["hex"], "#101050")
+            self.assertEqual(colors["dominant_colors"][0]["share"], 1.0)
+            self.assertEqual(colors["dominant_colors"][0]["paint"], {"name": "Phthalo Blue", "hex": "#0C0040"})
+            self.assertEqual([episode["season_episode"] for episode in colors["matched_episodes"]], ["S01E01", "S01E02"])
+
+        # The colors come from the photo downloaded for the labels, then the cache
+        self.assertEqual(mock_requests.call_count, 1)
+        self.assertEqual(color_cache.stats()["hits"] - hits, 2)
+
+    @patch('psycopg2.connect')
+    def test_analyze_photo_without_the_photo_has_no_colors(self, mock_connect):
+        label_cache.set("abc123", ["mountain"])
+        mock_cursor = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = (0,)
+        mock_cursor.fetchall.return_value = []
+
+        response = self.client.post('/analyze', json={"photo_reference": "abc123"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.get_json()["colors"])
+
+    def test_analyze_photo_invalid_cursor(self):
+        response = self.client.post('/analyze?cursor=nope', json={"photo_reference": "abc123"})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('psycopg2.connect')
+    def test_analyze_photo_keyset_pagination(self, mock_connect):
+        label_cache.set("abc123", ["mountain"])
+        mock_cursor = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = (3,)
+        mock_cursor.fetchall.return_value = [
+            (episode_id, f"Episode {episode_id}", datetime.date(1983, 1, episode_id), f"S01E0{episode_id}", None)
+            for episode_id in (1, 2, 3)
+        ]
+
+        response = self.client.post('/analyze?page_size=2', json={"photo_reference": "abc123"})
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([episode["episode_id"] for episode in data["matched_episodes"]], [1, 2])
+        self.assertEqual(data["pagination"]["total_pages"], 2)
+        self.assertEqual(decode_cursor(data["pagination"]["next_cursor"]), (datetime.date(1983, 1, 2), 2))
+        query, params = mock_cursor.execute.call_args.args
+        self.assertIn("ORDER BY e.air_date, e.episode_id", query)
+        self.assertEqual(params, [[1], 3])
+
+        mock_cursor.fetchall.return_value = mock_cursor.fetchall.return_value[2:]
+        cursor = data["pagination"]["next_cursor"]
+        response = self.client.post(f'/analyze?page_size=2&cursor={cursor}', json={"photo_reference": "abc123"})
+        self.assertIsNone(response.get_json()["pagination"]["next_cursor"])
+        self.assertEqual(mock_cursor.execute.call_args.args[1], [[1], datetime.date(1983, 1, 2), 2, 3])
+
+    def test_analyze_batch_requires_list(self):
+        response = self.client.post('/analyze/batch', json={"photo_references": "abc123"})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('requests.Session.get')
+    def test_analyze_batch_rejects_bad_input_before_fetching(self, mock_requests):
+        response = self.client.post('/analyze/batch', json={"photo_references": ["abc123", ["nested"]]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json, {"error": "photo_references must be a list of strings"})
+
+        response = self.client.post('/analyze/batch?page_size=lots', json={"photo_references": ["abc123"]})
+        self.assertEqual(response.status_code, 400)
+        mock_requests.assert_not_called()
+
+    @patch('psycopg2.connect')
+    @patch('requests.Session.get')
+    def test_analyze_batch_labels_uncached_photos_in_one_call(self, mock_requests, mock_connect):
+        mock_response = MagicMock()
+        mock_response.content = b'fake_image_data'
+        mock_response.headers = {"Content-Type": "image/jpeg"}
+        mock_requests.return_value = mock_response
+        mock_cursor = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = (0,)
+        mock_cursor.fetchall.return_value = []
+        label_cache.set("cached", ["tree"])
+
+        tree = MagicMock(label_annotations=[MagicMock(description="Tree")])
+        tree.error.message = ""
+        failed = MagicMock(label_annotations=[])
+        failed.error.message = "Bad image data"
+        mock_vision_client_instance.batch_annotate_images.reset_mock()
+        mock_vision_client_instance.batch_annotate_images.return_value.responses = [tree, failed]
+
+        response = self.client.post('/analyze/batch', json={"photo_references": ["cached", "one", "two"]})
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["results"]
+        self.assertEqual([result["photo_reference"] for result in results], ["cached", "one", "two"])
+        self.assertEqual(results[0]["labels"], ["tree"])
+        self.assertEqual(results[1]["matched_subjects"], [{"subject_id": 2, "name": "tree"}])
+        self.assertEqual(results[2]["error"], "Bad image data")
+
+        mock_vision_client_instance.batch_annotate_images.assert_called_once()
+        self.assertEqual(len(mock_vision_client_instance.batch_annotate_images.call_args.kwargs["requests"]), 2)
+        self.assertEqual(mock_vision_client_instance.batch_annotate_images.call_args.kwargs["timeout"], VISION_TIMEOUT)
+        self.assertEqual(mock_requests.call_count, 2)
+        self.assertEqual(label_cache.get("one"), ["tree"])
+        self.assertIsNone(label_cache.get("two"))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
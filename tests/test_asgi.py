@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Keep cached photos out of the real cache directory
+os.environ.setdefault("PHOTO_CACHE_DIR", tempfile.mkdtemp(prefix="bobross-test-photos-"))
+
+try:
+    import asgiref  # noqa: F401
+    import httpx  # noqa: F401
+    HAS_ASYNC_DEPS = True
+except ImportError:
+    HAS_ASYNC_DEPS = False
+
+with patch('google.auth.default', return_value=(MagicMock(), "test-project-id")):
+    with patch('google.cloud.vision.ImageAnnotatorClient', return_value=MagicMock()):
+        if HAS_ASYNC_DEPS:
+            from backend import asgi
+            from backend.photo_cache import PhotoCacheWriter
+
+
+def call(method, path, query=b"", body=b""):
+    """
+    Run one request through the ASGI app and return (status, headers, body).
+    """
+    scope = {
+        "type": "http", "http_version": "1.1", "scheme": "http", "method": method,
+        "path": path, "root_path": "", "query_string": query, "headers": [],
+        "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi.application(scope, receive, send))
+    start = messages[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+@unittest.skipUnless(HAS_ASYNC_DEPS, "async serving mode needs asgiref and httpx")
+class TestAsgiApplication(unittest.TestCase):
+
+    def setUp(self):
+        asgi.places_cache.clear()
+        asgi.photo_cache.clear()
+
+    def test_places_missing_region(self):
+        status, _, body = call("GET", "/places")
+        self.assertEqual(status, 400)
+        self.assertEqual(json.loads(body), {"error": "Region is required"})
+
+    @patch('backend.asgi.get_http_client')
+    def test_places_awaits_upstream(self, mock_get_client):
+        response = MagicMock()
+        response.json.return_value = {"results": [
+            {"name": "Nature Park", "formatted_address": "123 Green St", "photos": [{"photo_reference": "abc123"}]}
+        ]}
+
+        async def fake_get(url, params=None):
+            return response
+        mock_get_client.return_value.get = fake_get
+
+        status, headers, body = call("GET", "/places", b"region=Oregon")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b"access-control-allow-origin"], b"*")
+        self.assertRegex(headers[b"server-timing"], rb"^places_search;dur=[\d.]+, total;dur=[\d.]+$")
+        self.assertEqual(json.loads(body), [
+            {"name": "Nature Park", "location": "123 Green St", "photo_reference": "abc123"}
+        ])
+
+    @patch('backend.asgi.get_http_client')
+    def test_photo_is_cached_off_the_event_loop(self, mock_get_client):
+        response = MagicMock()
+        response.headers = {"Content-Type": "image/jpeg"}
+
+        async def chunks():
+            yield b"fake_"
+            yield b"image_data"
+
+        async def fake_stream(url, params=None):
+            return response
+
+        async def aclose():
+            pass
+        response.aiter_bytes = chunks
+        response.aclose = aclose
+        mock_get_client.return_value.stream = fake_stream
+
+        threads = []
+        write = PhotoCacheWriter.write
+        commit = PhotoCacheWriter.commit
+
+        def record(method):
+            def wrapper(writer, *args):
+                threads.append(threading.current_thread())
+                return method(writer, *args)
+            return wrapper
+
+        key = asgi.photo_cache.key("streamed", asgi.PHOTO_MAX_WIDTH)
+        with patch.object(PhotoCacheWriter, "write", record(write)), \
+                patch.object(PhotoCacheWriter, "commit", record(commit)):
+            status, _, body = call("GET", "/photo", b"photo_reference=streamed")
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b"fake_image_data")
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertEqual(asgi.photo_cache.read(key), (b"fake_image_data", "image/jpeg"))
+
+    def test_native_routes_are_timed(self):
+        before = asgi.metrics.get("http_requests_total", route="/places", method="GET", status=400)
+        call("GET", "/places")
+        self.assertEqual(asgi.metrics.get("http_requests_total", route="/places", method="GET", status=400), before + 1)
+
+    def test_cache_stats_match_the_flask_route(self):
+        status, _, body = call("GET", "/cache/stats")
+        self.assertEqual(status, 200)
+        stats = json.loads(body)
+        self.assertEqual(set(stats), {"labels", "photos", "places", "analysis", "colors"})
+        self.assertEqual(set(stats), set(asgi.app.test_client().get("/cache/stats").json))
+        self.assertIn("hit_ratio", stats["colors"])
+
+    def test_other_routes_fall_through_to_flask(self):
+        status, _, _ = call("GET", "/")
+        self.assertEqual(status, 302)
+
+
+if __name__ == '__main__':
+    unittest.main()
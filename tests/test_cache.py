@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.cache import LRUCache, SingleFlight, SQLiteStore
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_hit_and_miss_counters(self):
+        cache = LRUCache(max_entries=2)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", ["mountain"])
+        self.assertEqual(cache.get("a"), ["mountain"])
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    @patch('backend.cache.time.monotonic')
+    def test_entries_expire(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        cache = LRUCache(max_entries=2, ttl=10)
+        cache.set("a", 1)
+        mock_monotonic.return_value = 111.0
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_membership_check_is_not_counted(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertIn("a", cache)
+        self.assertNotIn("c", cache)
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (0, 0))
+        # Nor does it count as a use: "a" is still the first to go
+        cache.set("c", 3)
+        self.assertNotIn("a", cache)
+
+    def test_sqlite_store_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "labels.sqlite3")
+            store = SQLiteStore(path, ttl=60)
+            LRUCache(store=store).set("abc123", ["tree", "lake"])
+            store.close()
+
+            cache = LRUCache(store=SQLiteStore(path, ttl=60))
+            self.assertEqual(cache.get("abc123"), ["tree", "lake"])
+            self.assertEqual(cache.stats()["store_hits"], 1)
+            cache.store.close()
+
+    @patch('backend.cache.time.monotonic')
+    @patch('backend.cache.time.time')
+    def test_promoted_entries_keep_the_store_expiry(self, mock_time, mock_monotonic):
+        with tempfile.TemporaryDirectory() as tmp:
+            mock_time.return_value = 1000.0
+            mock_monotonic.return_value = 100.0
+            store = SQLiteStore(os.path.join(tmp, "labels.sqlite3"), ttl=60)
+            store.set("abc123", ["tree"])
+
+            # Read back 50s later, so the row only has 10s left
+            mock_time.return_value = 1050.0
+            cache = LRUCache(ttl=60, store=store)
+            self.assertEqual(cache.get("abc123"), ["tree"])
+            mock_time.return_value = 1061.0
+            mock_monotonic.return_value = 111.0
+            self.assertIsNone(cache.get("abc123"))
+            self.assertEqual(cache.stats()["expirations"], 1)
+            store.close()
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow_fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return ["Nature Park"]
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("oregon", slow_fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [["Nature Park"]] * 5)
+        self.assertEqual(flight.stats(), {"calls": 1, "coalesced": 4, "in_flight": 0})
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flight = SingleFlight()
+
+        def failing():
+            raise ValueError("upstream down")
+
+        with self.assertRaises(ValueError):
+            flight.do("oregon", failing)
+        self.assertEqual(flight.do("oregon", lambda: "ok"), "ok")
+
+
+if __name__ == '__main__':
+    unittest.main()
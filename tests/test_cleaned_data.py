@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from etl import cleaned_data
+from etl.manifest import episode_hashes
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+SUBJECTS = pd.DataFrame({'Season-Episode': ['S01E01', 'S01E01', 'S01E02'], 'subject': ['tree', 'river', 'tree']})
+EPISODES = pd.DataFrame({
+    'Season-Episode': ['S01E01', 'S01E02'],
+    'title': ['A Walk in the Woods', 'Mt. McKinley'],
+    'air_date': pd.to_datetime(['1983-01-11', '1983-01-18']),
+    'youtube_src': ['https://www.youtube.com/embed/oh5p5f5_-7A', None],
+})
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+class TestFeather(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_round_trip_keeps_types(self):
+        cleaned_data.save(SUBJECTS, self.path('subjects.feather'), ['subject'])
+        cleaned_data.save(EPISODES, self.path('episodes.feather'))
+
+        subjects = cleaned_data.read(self.path('subjects.feather'))
+        self.assertEqual(str(subjects['subject'].dtype), 'category')
+        self.assertEqual(subjects['subject'].tolist(), ['tree', 'river', 'tree'])
+        episodes = cleaned_data.read(self.path('episodes.feather'), parse_dates=['air_date'])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(episodes['air_date']))
+        self.assertTrue(episodes.equals(EPISODES))
+
+    def test_as_text_and_hashes_match_the_csv(self):
+        for extension in (cleaned_data.CSV, cleaned_data.FEATHER):
+            cleaned_data.save(SUBJECTS, self.path('subjects_cleaned' + extension), ['subject'])
+            cleaned_data.save(EPISODES, self.path('episodes_cleaned' + extension))
+
+        self.assertTrue(cleaned_data.read(self.path('episodes_cleaned.feather'), as_text=True).equals(
+            cleaned_data.read(self.path('episodes_cleaned.csv'), as_text=True)))
+        self.assertEqual(
+            episode_hashes([self.path('subjects_cleaned.feather'), self.path('episodes_cleaned.feather')]),
+            episode_hashes([self.path('subjects_cleaned.csv'), self.path('episodes_cleaned.csv')]),
+        )
+
+
+class TestCsv(unittest.TestCase):
+
+    def test_csv_needs_no_pyarrow(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'episodes.csv')
+            cleaned_data.save(EPISODES, path)
+            episodes = cleaned_data.read(path, parse_dates=['air_date'])
+            self.assertTrue(pd.api.types.is_datetime64_any_dtype(episodes['air_date']))
+            self.assertEqual(cleaned_data.read(path, as_text=True)['youtube_src'].tolist(),
+                             ['https://www.youtube.com/embed/oh5p5f5_-7A', ''])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,240 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+import psycopg2
+import psycopg2.extensions
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from database.db import (
+    DATA_CHANGED_CHANNEL, ConnectionPool, DataVersion, Listener, PoolTimeout, Reloadable, bump_data_version,
+)
+
+
+def make_connection():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    @patch('psycopg2.connect')
+    def test_reuses_released_connection(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: make_connection()
+        pool = ConnectionPool(min_size=1, max_size=2)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(first, second)
+        self.assertEqual(mock_connect.call_count, 1)
+        self.assertEqual(pool.stats()["in_use"], 0)
+        self.assertEqual(pool.stats()["checkouts"], 2)
+
+    @patch('psycopg2.connect')
+    def test_acquire_times_out_when_exhausted(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: make_connection()
+        pool = ConnectionPool(min_size=0, max_size=1, timeout=0.05)
+
+        conn = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+        # A waiting caller gets the connection once it's released
+        threading.Timer(0.02, pool.putconn, args=(conn,)).start()
+        self.assertIs(pool.getconn(timeout=1), conn)
+
+    @patch('psycopg2.connect')
+    def test_replaces_broken_connection_on_checkout(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: make_connection()
+        pool = ConnectionPool(min_size=0, max_size=1, check_interval=0)
+
+        broken = pool.getconn()
+        pool.putconn(broken)
+        broken.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.OperationalError()
+
+        conn = pool.getconn()
+        self.assertIsNot(conn, broken)
+        broken.close.assert_called_once()
+        self.assertEqual(pool.stats()["reconnects"], 1)
+
+    @patch('psycopg2.connect')
+    def test_checks_a_connection_released_just_now(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: make_connection()
+        pool = ConnectionPool(min_size=0, max_size=1)
+
+        dropped = pool.getconn()
+        pool.putconn(dropped)
+        dropped.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.OperationalError()
+        self.assertIsNot(pool.getconn(), dropped)
+
+    @patch('psycopg2.connect')
+    def test_operational_error_discards_connection(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: make_connection()
+        pool = ConnectionPool(min_size=0, max_size=1)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            with pool.connection():
+                raise psycopg2.OperationalError("server closed the connection")
+        self.assertEqual(pool.stats()["size"], 0)
+
+
+class TestDataVersion(unittest.TestCase):
+
+    def test_bump_notifies_with_the_new_version(self):
+        conn = make_connection()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (7, "2024-01-01")
+        self.assertEqual(bump_data_version(conn), (7, "2024-01-01"))
+        cursor.execute.assert_called_with("SELECT pg_notify(%s, %s);", (DATA_CHANGED_CHANNEL, "7"))
+
+    def test_on_change_only_when_the_version_moves(self):
+        on_change = MagicMock()
+        data_version = DataVersion(on_change=on_change)
+        data_version.set(1, "2024-01-01")
+        data_version.set(1, "2024-01-01")
+        on_change.assert_not_called()
+        data_version.set(2, "2024-02-01")
+        on_change.assert_called_once()
+        self.assertEqual(data_version.get(), (2, "2024-02-01"))
+
+
+class FakeTable:
+
+    def __init__(self):
+        self.loaded = False
+        self.refreshes = 0
+
+    def refresh(self, cursor):
+        self.loaded = True
+        self.refreshes += 1
+
+
+class TestReloadable(unittest.TestCase):
+
+    @patch('database.db.listen')
+    @patch('database.db.connection')
+    def test_loads_once_then_reloads_on_notify(self, mock_connection, mock_listen):
+        table = FakeTable()
+        data = Reloadable(table, "Fake table")
+        self.assertIs(data.get(), table)
+        self.assertIs(data.get(), table)
+        self.assertEqual(table.refreshes, 1)
+        mock_listen.assert_called_once_with(DATA_CHANGED_CHANNEL, data.reload)
+
+        data.reload("2")
+        self.assertEqual(table.refreshes, 2)
+
+    @patch('database.db.listen')
+    @patch('database.db.connection')
+    def test_listens_before_the_first_load(self, mock_connection, mock_listen):
+        order = []
+        mock_listen.side_effect = lambda *args: order.append("listen")
+        mock_connection.side_effect = lambda: order.append("read") or MagicMock()
+        Reloadable(FakeTable(), "Fake table").get()
+        DataVersion().get()
+        self.assertEqual(order, ["listen", "read", "listen", "read"])
+
+    @patch('database.db.listen')
+    @patch('database.db.connection')
+    def test_failed_reload_keeps_the_loaded_data(self, mock_connection, mock_listen):
+        table = FakeTable()
+        data = Reloadable(table, "Fake table")
+        data.get()
+        mock_connection.side_effect = psycopg2.OperationalError("server closed the connection")
+        with self.assertLogs('database.db', 'ERROR'):
+            data.reload()
+        self.assertIs(data.get(), table)
+        self.assertEqual(table.refreshes, 1)
+
+
+def idle_select(*args):
+    time.sleep(0.01)
+    return [], [], []
+
+
+def wait_until(condition, timeout=1):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestListener(unittest.TestCase):
+
+    def setUp(self):
+        # Started here so they're stopped after the listeners, which are cleaned up first
+        self.select = self.patch('database.db.select.select', side_effect=idle_select)
+        self.mock_connect = self.patch('psycopg2.connect')
+
+    def patch(self, target, **kwargs):
+        patcher = patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def listener(self):
+        listener = Listener(DATA_CHANGED_CHANNEL, reconnect_delay=0.01)
+        self.addCleanup(lambda: listener._thread and listener._thread.join(1))
+        self.addCleanup(listener.close)
+        return listener
+
+    def test_subscribers_share_one_connection(self):
+        conn = self.mock_connect.return_value
+        listener = self.listener()
+        first, second = MagicMock(), MagicMock()
+        self.assertTrue(listener.subscribe(first, timeout=1))
+        self.assertTrue(listener.subscribe(second, timeout=1))
+        self.assertEqual(self.mock_connect.call_count, 1)
+        conn.cursor.return_value.__enter__.return_value.execute.assert_called_once_with(
+            f"LISTEN {DATA_CHANGED_CHANNEL};")
+
+        listener._dispatch("2")
+        first.assert_called_once_with("2")
+        second.assert_called_once_with("2")
+
+    def test_late_subscriber_is_called_once_listening(self):
+        connected = threading.Event()
+        self.mock_connect.side_effect = lambda **kwargs: connected.wait(1) and make_connection()
+        listener = self.listener()
+        callback = MagicMock()
+        self.assertFalse(listener.subscribe(callback, timeout=0.01))
+        callback.assert_not_called()
+
+        connected.set()
+        wait_until(lambda: callback.called)
+        callback.assert_called_once_with(None)
+
+    def test_reconnect_calls_every_subscriber(self):
+        dropped = threading.Event()
+        broken = make_connection()
+        broken.poll.side_effect = psycopg2.OperationalError("server closed the connection")
+        connections = iter([broken, make_connection()])
+        self.mock_connect.side_effect = lambda **kwargs: next(connections)
+
+        def select(readable, *args):
+            time.sleep(0.01)
+            return (readable if readable[0] is broken and dropped.is_set() else []), [], []
+
+        self.select.side_effect = select
+        listener = self.listener()
+        callback = MagicMock()
+        self.assertTrue(listener.subscribe(callback, timeout=1))
+        callback.assert_not_called()
+
+        with self.assertLogs('database.db', 'WARNING'):
+            dropped.set()
+            wait_until(lambda: callback.called)
+        callback.assert_called_once_with(None)
+        self.assertEqual(self.mock_connect.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,16 @@
 import unittest
 from unittest.mock import patch, MagicMock, call
-from database.load_data import connect_to_db, get_or_insert_unknown_subject
+import pandas as pd
+from database.load_data import (
+    bulk_load_data, colors_frame, connect_to_db, episodes_frame, get_or_insert_unknown_subject,
+)
+from database.db import close_pool
 
 class TestLoadData(unittest.TestCase):
 
+    def setUp(self):
+        close_pool()
+
     @patch('psycopg2.connect')
     def test_connect_to_db_success(self, mock_connect):
         """Test successful database connection."""
@@ -38,5 +45,54 @@ class TestLoadData(unittest.TestCase):
         )
 
 
+class TestBulkLoad(unittest.TestCase):
+
+    def test_colors_frame_stages_the_long_format_as_is(self):
+        """Test one staged row per episode color, nothing split or skipped."""
+        colors_data = pd.DataFrame({
+            'season-episode': ['S01E01', 'S01E01', 'S01E02'],
+            'color': ['Bright Red', 'Titanium White', 'Sap Green'],
+            'color_hex': ['#DB0000', '#FFFFFF', '#0A3410'],
+        })
+        frame = colors_frame(colors_data)
+        self.assertEqual(list(frame.columns), ['season_episode', 'name', 'hex_code'])
+        self.assertEqual(frame.values.tolist(), [
+            ['S01E01', 'Bright Red', '#DB0000'],
+            ['S01E01', 'Titanium White', '#FFFFFF'],
+            ['S01E02', 'Sap Green', '#0A3410'],
+        ])
+
+    def test_episodes_frame_derives_broadcast_month(self):
+        """Test string air dates are parsed and the month name is filled in."""
+        episodes_data = pd.DataFrame({
+            'season-episode': ['S01E01'],
+            'title': ['A Walk in the Woods'],
+            'air_date': [' 1983-01-04'],
+            'youtube_src': ['https://www.youtube.com/embed/oh5p5f5_-7A'],
+        })
+        row = episodes_frame(episodes_data).iloc[0]
+        self.assertEqual(row['air_date'], '1983-01-04')
+        self.assertEqual(row['broadcast_month'], 'January')
+
+    def test_bulk_load_copies_then_upserts(self):
+        """Test the three frames are COPYed and merged without committing."""
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        episodes_data = pd.DataFrame({
+            'season-episode': ['S01E01'], 'title': ['A Walk in the Woods'],
+            'air_date': pd.to_datetime(['1983-01-04']), 'youtube_src': [None],
+        })
+        subjects_data = pd.DataFrame({'season-episode': ['S01E01', 'S01E01'], 'subject': ['tree', 'river']})
+        colors_data = pd.DataFrame({'season-episode': ['S01E01'], 'color': ['Sap Green'], 'color_hex': ['#0A3410']})
+
+        rows = bulk_load_data(conn, episodes_data, subjects_data, colors_data)
+        self.assertEqual(rows, 4)
+        copied = [args[0] for args, _ in cursor.copy_expert.call_args_list]
+        self.assertEqual([statement.split()[1] for statement in copied],
+                         ['staging_episodes', 'staging_subjects', 'staging_colors'])
+        self.assertEqual(cursor.execute.call_count, 6)
+        conn.commit.assert_not_called()
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,129 @@
+import datetime
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from api.episode_index import EpisodeIndex, iter_bits
+
+EPISODES = [
+    (3, "Winter Cabin", datetime.date(1983, 2, 1), "February"),
+    (1, "A Walk in the Woods", datetime.date(1983, 1, 11), "January"),
+    (2, "Mt. McKinley", datetime.date(1983, 1, 18), "January"),
+]
+EPISODE_SUBJECTS = [(1, "tree"), (1, "river"), (2, "tree"), (2, "mountain"), (3, "cabin"), (3, "tree")]
+EPISODE_COLORS = [(1, "Van Dyke Brown"), (2, "Titanium White"), (2, "Van Dyke Brown"), (3, "Titanium White")]
+
+
+class TestEpisodeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = EpisodeIndex()
+        self.index.load(EPISODES, EPISODE_SUBJECTS, EPISODE_COLORS)
+
+    def ids(self, *args, **kwargs):
+        return [row[0] for row in self.index.filter(*args, **kwargs)]
+
+    def test_iter_bits(self):
+        self.assertEqual(list(iter_bits(0b101001)), [0, 3, 5])
+
+    def test_no_filters_returns_everything_by_air_date(self):
+        self.assertEqual(self.ids(), [1, 2, 3])
+
+    def test_any_of(self):
+        self.assertEqual(self.ids(subjects=["mountain", "cabin"]), [2, 3])
+        self.assertEqual(self.ids(["February"], ["river"]), [1, 3])
+        self.assertEqual(self.ids(subjects=["unknown"]), [])
+
+    def test_match_all(self):
+        self.assertEqual(self.ids(subjects=["tree", "mountain"], match_all=True), [2])
+        self.assertEqual(self.ids(["January"], colors=["Titanium White", "Van Dyke Brown"], match_all=True), [2])
+        self.assertEqual(self.ids(subjects=["tree", "unknown"], match_all=True), [])
+
+    def test_keyset_page_and_count(self):
+        self.assertEqual(self.ids(subjects=["tree"], limit=2), [1, 2])
+        self.assertEqual(self.ids(subjects=["tree"], after=(datetime.date(1983, 1, 18), 2)), [3])
+        self.assertEqual(self.ids(after=(datetime.date(1983, 1, 12), 0), limit=1), [2])
+        self.assertEqual(self.index.count(subjects=["tree"]), 3)
+        self.assertEqual(self.index.count(subjects=["tree", "river"], match_all=True), 1)
+
+    def test_unloaded_index_raises(self):
+        with self.assertRaises(RuntimeError):
+            EpisodeIndex().filter()
+
+    def test_refresh_reads_all_three_tables(self):
+        cursor = MagicMock()
+        cursor.fetchall.side_effect = [EPISODES, EPISODE_SUBJECTS, []]
+        index = EpisodeIndex()
+        index.refresh(cursor)
+        self.assertEqual(cursor.execute.call_count, 3)
+        self.assertEqual([row[0] for row in index.filter(subjects=["cabin"])], [3])
+        self.assertEqual(index.loads, 1)
+
+
+class TestEpisodesEndpointWithIndex(unittest.TestCase):
+
+    def setUp(self):
+        from api.theapi import app, data_version, episode_index, episodes_cache
+        self.client = app.test_client()
+        self.data_version = data_version
+        self.episodes_cache = episodes_cache
+        episode_index.load(EPISODES, EPISODE_SUBJECTS, EPISODE_COLORS)
+        episodes_cache.clear()
+        data_version.set(1, datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+
+    @patch('api.theapi.EPISODE_INDEX_ENABLED', True)
+    @patch('psycopg2.connect')
+    def test_served_without_a_query(self, mock_connect):
+        response = self.client.get('/episodes?subject=tree&subject=cabin&match_all=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {
+            "episodes": [{
+                "episode_id": 3,
+                "title": "Winter Cabin",
+                "air_date": "Tue, 01 Feb 1983 00:00:00 GMT",
+                "broadcast_month": "February",
+            }],
+            "next_cursor": None,
+        })
+        mock_connect.assert_not_called()
+
+    @patch('api.theapi.EPISODE_INDEX_ENABLED', True)
+    def test_pages_with_cursor_fields_and_total(self):
+        first = self.client.get('/episodes?subject=tree&limit=2&fields=title&include_total=true').get_json()
+        self.assertEqual(first["episodes"], [{"title": "A Walk in the Woods"}, {"title": "Mt. McKinley"}])
+        self.assertEqual(first["total"], 3)
+        second = self.client.get(f'/episodes?subject=tree&limit=2&fields=title&cursor={first["next_cursor"]}').get_json()
+        self.assertEqual(second, {"episodes": [{"title": "Winter Cabin"}], "next_cursor": None})
+
+    @patch('api.theapi.EPISODE_INDEX_ENABLED', True)
+    def test_conditional_requests_until_the_data_version_changes(self):
+        first = self.client.get('/episodes?subject=tree&subject=cabin')
+        self.assertEqual(first.headers["Last-Modified"], "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.assertIn("no-cache", first.headers["Cache-Control"])
+
+        etag = first.headers["ETag"]
+        reordered = self.client.get('/episodes?subject=cabin&subject=tree', headers={"If-None-Match": etag})
+        self.assertEqual(reordered.status_code, 304)
+        again = self.client.get('/episodes?subject=cabin&subject=tree')
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(self.episodes_cache.stats()["hits"], 1)
+
+        self.data_version.set(2, datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(len(self.episodes_cache), 0)
+        after_load = self.client.get('/episodes?subject=tree&subject=cabin', headers={"If-None-Match": etag})
+        self.assertEqual(after_load.status_code, 200)
+        self.assertNotEqual(after_load.headers["ETag"], etag)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/episodes?fields=secret').status_code, 400)
+        self.assertEqual(self.client.get('/episodes?cursor=bad').status_code, 400)
+        self.assertEqual(self.client.get('/episodes?limit=ten').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import datetime
+import os
+import sys
+import unittest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from api.episode_query import (
+    EPISODE_FIELDS, build_count_query, build_episodes_query, decode_cursor, encode_cursor, parse_fields,
+)
+
+
+class TestBuildEpisodesQuery(unittest.TestCase):
+
+    def test_no_filters(self):
+        query, params = build_episodes_query()
+        self.assertNotIn("WHERE", query)
+        self.assertNotIn("JOIN", query)
+        self.assertTrue(query.endswith("ORDER BY e.air_date, e.episode_id"))
+        self.assertEqual(params, [])
+
+    def test_any_of_uses_exists_per_junction_table(self):
+        query, params = build_episodes_query(["January"], ["tree", "lake"], ["Van Dyke Brown"])
+        self.assertEqual(query.count("EXISTS"), 2)
+        self.assertEqual(query.count(" OR "), 2)
+        self.assertNotIn("DISTINCT", query)
+        self.assertEqual(params, [["January"], ["tree", "lake"], ["Van Dyke Brown"]])
+
+    def test_match_all_counts_distinct_requested_names(self):
+        query, params = build_episodes_query(subjects=["tree", "lake", "tree"], colors=["Titanium White"], match_all=True)
+        self.assertEqual(query.count("HAVING COUNT(DISTINCT"), 2)
+        self.assertIn(" AND ", query)
+        self.assertEqual(params, [["tree", "lake"], 2, ["Titanium White"], 1])
+
+    def test_placeholders_match_params(self):
+        query, params = build_episodes_query(["May"], ["cabin"], ["Black Gesso", "Bright Red"], match_all=True)
+        self.assertEqual(query.count("%s"), len(params))
+
+    def test_keyset_page(self):
+        after = (datetime.date(1983, 1, 11), 2)
+        query, params = build_episodes_query(subjects=["tree"], after=after, limit=11)
+        self.assertIn("AND (e.air_date, e.episode_id) > (%s, %s)", query)
+        self.assertTrue(query.endswith("LIMIT %s"))
+        self.assertEqual(params, [["tree"], datetime.date(1983, 1, 11), 2, 11])
+
+    def test_count_query(self):
+        query, params = build_count_query(colors=["Bright Red"], match_all=True)
+        self.assertTrue(query.startswith("SELECT COUNT(*)"))
+        self.assertNotIn("ORDER BY", query)
+        self.assertEqual(params, [["Bright Red"], 1])
+
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor(datetime.date(1994, 5, 17), 403)
+        self.assertEqual(decode_cursor(cursor), (datetime.date(1994, 5, 17), 403))
+        for bad in ("nope", "MTk5NC0wNS0xNw", "!!"):
+            with self.assertRaises(ValueError):
+                decode_cursor(bad)
+
+    def test_parse_fields(self):
+        self.assertEqual(parse_fields(None), EPISODE_FIELDS)
+        self.assertEqual(parse_fields("title, air_date,title"), ("title", "air_date"))
+        with self.assertRaises(ValueError):
+            parse_fields("title,password")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import sys
+import tempfile
+import unittest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from etl.dag import Stage, dependencies, run
+
+
+def upper(source, target):
+    with open(source) as file:
+        text = file.read()
+    with open(target, 'w') as file:
+        file.write(text.upper())
+    return len(text)
+
+
+def joined(sources, target):
+    with open(target, 'w') as file:
+        for source in sources:
+            with open(source) as source_file:
+                file.write(source_file.read())
+    return len(sources)
+
+
+def fail():
+    raise ValueError("bad input")
+
+
+class TestDag(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache_dir = self.path('cache')
+        for name, text in [('a.txt', 'walk in the woods\n'), ('b.txt', 'mt mckinley\n')]:
+            self.write(name, text)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write(self, name, text):
+        with open(self.path(name), 'w') as file:
+            file.write(text)
+
+    def read(self, name):
+        with open(self.path(name)) as file:
+            return file.read()
+
+    def stages(self):
+        a, b, upper_a, upper_b, both = map(self.path, ['a.txt', 'b.txt', 'A.txt', 'B.txt', 'both.txt'])
+        return [
+            Stage('both', joined, [upper_a, upper_b], [both], kwargs={'sources': [upper_a, upper_b], 'target': both}),
+            Stage('upper a', upper, [a], [upper_a], kwargs={'source': a, 'target': upper_a}),
+            Stage('upper b', upper, [b], [upper_b], kwargs={'source': b, 'target': upper_b}),
+        ]
+
+    def statuses(self, results):
+        return {name: result.status for name, result in results.items()}
+
+    def test_dependencies_come_from_files_and_after(self):
+        stages = self.stages() + [Stage('report', len, after=['both'], kwargs={'obj': ''}, local=True)]
+        graph = dependencies(stages)
+        self.assertEqual(graph['both'], {'upper a', 'upper b'})
+        self.assertEqual(graph['upper a'], set())
+        self.assertEqual(graph['report'], {'both'})
+
+    def test_bad_graphs_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "depend on each other"):
+            dependencies([Stage('a', len, after=['b']), Stage('b', len, after=['a'])])
+        with self.assertRaisesRegex(ValueError, "unknown stages: c"):
+            dependencies([Stage('a', len, after=['c'])])
+        with self.assertRaisesRegex(ValueError, "written by both"):
+            dependencies([Stage('a', len, outputs=['x']), Stage('b', len, outputs=['x'])])
+
+    def test_runs_in_dependency_order(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                results = run(self.stages(), workers=workers, cache_dir=self.cache_dir, force=True)
+                self.assertEqual(self.read('both.txt'), 'WALK IN THE WOODS\nMT MCKINLEY\n')
+                self.assertEqual(results['both'].value, 2)
+                self.assertEqual(self.statuses(results), {'both': 'ran', 'upper a': 'ran', 'upper b': 'ran'})
+
+    def test_outputs_are_cached_by_input_hash(self):
+        run(self.stages(), workers=1, cache_dir=self.cache_dir)
+        results = run(self.stages(), workers=1, cache_dir=self.cache_dir)
+        self.assertEqual(self.statuses(results), {'both': 'cached', 'upper a': 'cached', 'upper b': 'cached'})
+
+        # A changed input reruns its stage and what depends on it
+        self.write('b.txt', 'ebony sunset\n')
+        results = run(self.stages(), workers=1, cache_dir=self.cache_dir)
+        self.assertEqual(self.statuses(results), {'both': 'ran', 'upper a': 'cached', 'upper b': 'ran'})
+        self.assertEqual(self.read('both.txt'), 'WALK IN THE WOODS\nEBONY SUNSET\n')
+
+        # Going back to an earlier input restores the cached outputs
+        self.write('b.txt', 'mt mckinley\n')
+        results = run(self.stages(), workers=1, cache_dir=self.cache_dir)
+        self.assertEqual(self.statuses(results), {'both': 'restored', 'upper a': 'cached', 'upper b': 'restored'})
+        self.assertEqual(self.read('both.txt'), 'WALK IN THE WOODS\nMT MCKINLEY\n')
+
+    def test_changed_helper_code_reruns_the_stage(self):
+        # A stage in its own package, doing the work in a helper module
+        package = self.path('stagepkg')
+        os.makedirs(package)
+        for name, text in [('__init__.py', ''),
+                           ('helpers.py', 'def shout(text):\n    return text.upper()\n'),
+                           ('stages.py', 'from stagepkg.helpers import shout\n\n\n'
+                                         'def shout_file(source, target):\n'
+                                         '    with open(source) as file, open(target, "w") as out:\n'
+                                         '        out.write(shout(file.read()))\n')]:
+            self.write(os.path.join('stagepkg', name), text)
+        sys.path.insert(0, self.directory.name)
+        self.addCleanup(sys.path.remove, self.directory.name)
+        for name in ('stagepkg', 'stagepkg.helpers', 'stagepkg.stages'):
+            self.addCleanup(sys.modules.pop, name, None)
+        from stagepkg.stages import shout_file
+
+        a, target = self.path('a.txt'), self.path('A.txt')
+        stages = [Stage('shout', shout_file, [a], [target], kwargs={'source': a, 'target': target})]
+        run(stages, workers=1, cache_dir=self.cache_dir)
+        self.assertEqual(self.statuses(run(stages, workers=1, cache_dir=self.cache_dir)), {'shout': 'cached'})
+
+        self.write(os.path.join('stagepkg', 'helpers.py'), 'def shout(text):\n    return text.upper() + "!"\n')
+        self.assertEqual(self.statuses(run(stages, workers=1, cache_dir=self.cache_dir)), {'shout': 'ran'})
+
+    def test_a_failing_stage_stops_the_run(self):
+        stages = self.stages() + [Stage('fail', fail, after=['upper a'])]
+        with self.assertRaisesRegex(RuntimeError, "Stage fail failed: bad input"):
+            run(stages, workers=2, cache_dir=self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
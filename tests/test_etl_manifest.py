@@ -0,0 +1,156 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from etl.manifest import (
+    build_manifest, diff_episodes, episode_hashes, file_hashes, read_manifest, write_manifest,
+)
+from database.load_data import load_all, load_batches, read_cleaned_batches, read_cleaned_data
+
+EPISODES_CSV = (
+    "Season-Episode,title,air_date,youtube_src\n"
+    "S01E01,A Walk in the Woods,1983-01-11,https://www.youtube.com/embed/oh5p5f5_-7A\n"
+    "S01E02,Mt. McKinley,1983-01-18,\n"
+    "S01E03,Ebony Sunset,1983-01-25,\n"
+)
+SUBJECTS_CSV = "Season-Episode,subject\nS01E01,tree\nS01E01,river\nS01E02,mountain\nS01E03,tree\n"
+COLORS_CSV = (
+    "Season-Episode,color,color_hex\n"
+    "S01E01,Sap Green,#0A3410\n"
+    "S01E01,Titanium White,#FFFFFF\n"
+    "S01E02,Titanium White,#FFFFFF\n"
+    "S01E03,Black Gesso,#000000\n"
+)
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.raw = self.write('raw.csv', "anything\n")
+        self.outputs = [
+            self.write('episodes_cleaned.csv', EPISODES_CSV),
+            self.write('subjects_cleaned.csv', SUBJECTS_CSV),
+            self.write('episode_colors_cleaned.csv', COLORS_CSV),
+        ]
+        self.manifest_path = os.path.join(self.directory.name, 'manifest.json')
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    def test_written_manifest_reads_back(self):
+        write_manifest(build_manifest([self.raw], self.outputs), self.manifest_path)
+        manifest = read_manifest(self.manifest_path)
+        self.assertEqual(manifest['inputs'], file_hashes([self.raw]))
+        self.assertEqual(sorted(manifest['episodes']), ['S01E01', 'S01E02', 'S01E03'])
+        self.assertIsNone(read_manifest(os.path.join(self.directory.name, 'missing.json')))
+
+    def test_editing_one_episode_changes_only_its_hash(self):
+        before = build_manifest([self.raw], self.outputs)['episodes']
+        self.assertEqual(sorted(before), ['S01E01', 'S01E02', 'S01E03'])
+
+        # Reordering rows is not a change
+        self.write('subjects_cleaned.csv', "Season-Episode,subject\nS01E03,tree\nS01E02,mountain\nS01E01,river\nS01E01,tree\n")
+        self.assertEqual(build_manifest([self.raw], self.outputs)['episodes'], before)
+
+        # S01E02 gets a new subject, S01E03 disappears from every file
+        def without_s01e03(text):
+            return "".join(line for line in text.splitlines(keepends=True) if not line.startswith("S01E03"))
+        self.write('episodes_cleaned.csv', without_s01e03(EPISODES_CSV))
+        self.write('subjects_cleaned.csv', without_s01e03(SUBJECTS_CSV).replace("S01E02,mountain", "S01E02,mountains"))
+        self.write('episode_colors_cleaned.csv', without_s01e03(COLORS_CSV))
+        after = build_manifest([self.raw], self.outputs)['episodes']
+        self.assertEqual(diff_episodes(before, after), (['S01E02'], ['S01E03']))
+        self.assertEqual(diff_episodes(after, after), ([], []))
+
+
+class TestIncrementalLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def files(self, subjects_csv=SUBJECTS_CSV):
+        paths = []
+        for name, text in (('episodes_cleaned.csv', EPISODES_CSV), ('subjects_cleaned.csv', subjects_csv),
+                           ('episode_colors_cleaned.csv', COLORS_CSV)):
+            paths.append(os.path.join(self.directory.name, name))
+            with open(paths[-1], 'w') as file:
+                file.write(text)
+        return paths
+
+    def load(self, conn, subjects_csv=SUBJECTS_CSV):
+        paths = self.files(subjects_csv)
+        return load_all(conn, *read_cleaned_data(paths), hashes=episode_hashes(paths))
+
+    def connection(self, loaded):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = list(loaded.items())
+        cursor.fetchone.return_value = (1, None)
+        self.copied = []
+        cursor.copy_expert.side_effect = lambda statement, buffer: self.copied.append(buffer.getvalue())
+        self.executed = cursor.execute.call_args_list
+        return conn
+
+    def staged_keys(self):
+        # staging_episodes leads with its ord column, the other two with the key
+        return {line.split(',')[1 if index == 0 else 0]
+                for index, buffer in enumerate(self.copied) for line in buffer.splitlines()}
+
+    def recorded_hashes(self):
+        recorded = {}
+        for call in self.executed:
+            if 'INSERT INTO LoadedEpisodes' in call.args[0]:
+                recorded.update(zip(*call.args[1]))
+        return recorded
+
+    def test_only_the_edited_episode_is_touched(self):
+        conn = self.connection({})
+        self.load(conn)
+        self.assertEqual(self.staged_keys(), {'S01E01', 'S01E02', 'S01E03'})
+        loaded = self.recorded_hashes()
+        self.assertEqual(sorted(loaded), ['S01E01', 'S01E02', 'S01E03'])
+
+        # Same data again: nothing is staged and the version isn't bumped
+        conn = self.connection(loaded)
+        self.assertEqual(self.load(conn)[2], None)
+        self.assertEqual(self.copied, [])
+        conn.commit.assert_not_called()
+
+        conn = self.connection(loaded)
+        rows, _, version = self.load(conn, SUBJECTS_CSV.replace("S01E02,mountain", "S01E02,lake"))
+        self.assertEqual(version, 1)
+        self.assertEqual(self.staged_keys(), {'S01E02'})
+        self.assertEqual(rows, 3)
+        self.assertEqual(sorted(self.recorded_hashes()), ['S01E02'])
+        cleared = [call.args[1] for call in self.executed if 'DELETE FROM episodesubjects' in call.args[0]]
+        self.assertEqual(cleared, [(['S01E02'],)])
+        conn.commit.assert_called_once()
+
+    def test_load_all_then_the_command_line_load_stages_nothing(self):
+        paths = self.files()
+        with patch('database.load_data.cleaned_files', return_value=paths):
+            conn = self.connection({})
+            load_all(conn, *read_cleaned_data())
+            loaded = self.recorded_hashes()
+
+            # What `python database/load_data.py --chunksize 2` does next
+            conn = self.connection(loaded)
+            self.assertEqual(diff_episodes(loaded, episode_hashes(paths)), ([], []))
+            self.assertIsNone(load_batches(conn, *read_cleaned_batches(2), episode_hashes(paths, chunksize=2))[2])
+            self.assertEqual(self.copied, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from etl.etl_pipline import clean_colors, clean_episode_colors, clean_episodes, clean_list_field, season_episode
+
+COLORS_CSV = (
+    ",painting_index,img_src,painting_title,season,episode,num_colors,youtube_src,colors,color_hex,Bright_Red,Phthalo_Green\n"
+    "1,282,x.png,A Walk in the Woods,1,1,2,https://www.youtube.com/embed/oh5p5f5_-7A,"
+    "\"['Bright Red', 'Phthalo Green\\r\\n']\",\"['#DB0000', '#102E3C']\",1,1\n"
+    "2,283,y.png,Mt. McKinley,1,2,1,https://www.youtube.com/embed/RInDWhYceLU,\"['Bright Red', 'Phthalo Green\\r\\n']\",\"['#DB0000']\",0,1\n"
+    "3,284,z.png,Ebony Sunset,12,10,0,,,,0,0\n"
+)
+
+EPISODES_TEXT = (
+    '"A Walk in the Woods" (January 11, 1983)\n'
+    'not an episode\n'
+    '  "Mt. McKinley" (January 18, 1983)  \n'
+)
+
+
+class TestCleaning(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    def test_season_episode(self):
+        codes = season_episode(pd.Series([1, 12, 31.0]), pd.Series([1, 10, 103]))
+        self.assertEqual(codes.tolist(), ["S01E01", "S12E10", "S31E103"])
+
+    def test_list_fields_are_parsed_as_literals_only(self):
+        self.assertEqual(clean_list_field("['Sap Green', 'Van Dyke Brown\\r\\n']"), "Sap Green | Van Dyke Brown")
+        # Anything that isn't a literal is cleaned as plain text, never run
+        self.assertEqual(clean_list_field("[__import__('os').getcwd()]"), "importosgetcwd")
+
+    def test_clean_colors(self):
+        cleaned = clean_colors(self.write('colors_used.csv', COLORS_CSV))
+        self.assertEqual(cleaned.fillna('').values.tolist(), [
+            ['S01E01', 'A Walk in the Woods', 'Bright Red | Phthalo Green', '#DB0000 | #102E3C',
+             'https://www.youtube.com/embed/oh5p5f5_-7A'],
+            ['S01E02', 'Mt McKinley', 'Bright Red | Phthalo Green', '#DB0000',
+             'https://www.youtube.com/embed/RInDWhYceLU'],
+            ['S12E10', 'Ebony Sunset', 'nan', 'nan', ''],
+        ])
+
+    def test_clean_episode_colors_melts_the_one_hot_columns(self):
+        cleaned = clean_episode_colors(self.write('colors_used.csv', COLORS_CSV))
+        self.assertEqual(cleaned.values.tolist(), [
+            ['S01E01', 'Bright Red', '#DB0000'],
+            ['S01E01', 'Phthalo Green', '#102E3C'],
+            # S01E02's lists don't line up, its paint still counts
+            ['S01E02', 'Phthalo Green', '#102E3C'],
+        ])
+
+    def test_clean_episode_colors_needs_a_hex_for_every_paint(self):
+        path = self.write('colors_used.csv', COLORS_CSV.replace(",Phthalo_Green\n", ",Liquid_Clear\n"))
+        with self.assertRaisesRegex(ValueError, "Liquid Clear"):
+            clean_episode_colors(path)
+
+    def test_clean_episodes(self):
+        colors = pd.DataFrame({'Season-Episode': ['S01E02'], 'youtube_src': ['https://www.youtube.com/embed/RInDWhYceLU']})
+        cleaned = clean_episodes(self.write('episode_dates.csv', EPISODES_TEXT), colors)
+        self.assertEqual(cleaned['Season-Episode'].tolist(), ['S01E01', 'S01E02'])
+        self.assertEqual(cleaned['title'].tolist(), ['A Walk in the Woods', 'Mt. McKinley'])
+        self.assertEqual(cleaned['air_date'].dt.strftime('%Y-%m-%d').tolist(), ['1983-01-11', '1983-01-18'])
+        self.assertEqual(cleaned['youtube_src'].fillna('').tolist(), ['', 'https://www.youtube.com/embed/RInDWhYceLU'])
+
+
+if __name__ == '__main__':
+    unittest.main()
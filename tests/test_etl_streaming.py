@@ -0,0 +1,166 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from database.load_data import bulk_load_batches
+from etl import cleaned_data
+from etl.etl_pipline import clean_colors, clean_episode_colors, clean_episodes, clean_subjects
+from etl.manifest import EpisodeHasher, frame_hashes
+from etl.dag import etl_stages, run
+from etl.streaming import stream_episodes, stream_table
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+COLORS_CSV = (
+    ",painting_index,img_src,painting_title,season,episode,num_colors,youtube_src,colors,color_hex,Bright_Red,Phthalo_Green\n"
+    "1,282,x.png,A Walk in the Woods,1,1,2,https://www.youtube.com/embed/oh5p5f5_-7A,"
+    "\"['Bright Red', 'Phthalo Green\\r\\n']\",\"['#DB0000', '#102E3C']\",1,1\n"
+    "2,283,y.png,Mt. McKinley,1,2,1,,\"['Phthalo Green']\",\"['#102E3C']\",0,1\n"
+    "3,284,z.png,Ebony Sunset,1,3,1,https://www.youtube.com/embed/UOziR7PoVco,\"['Bright Red']\",\"['#DB0000']\",1,0\n"
+    # S01E01 again, in a later chunk: dropped as a duplicate
+    "4,282,x.png,A Walk in the Woods,1,1,2,https://www.youtube.com/embed/oh5p5f5_-7A,"
+    "\"['Bright Red', 'Phthalo Green\\r\\n']\",\"['#DB0000', '#102E3C']\",1,1\n"
+    "5,285,w.png,Winter Mist,1,4,0,,,,0,0\n"
+)
+
+SUBJECTS_CSV = (
+    "EPISODE,TITLE,TREE,MOUNTAIN\n"
+    "S01E01,A WALK IN THE WOODS,1,0\n"
+    "S01E02,MT. MCKINLEY,1,1\n"
+    "S01E03,EBONY SUNSET,0,1\n"
+    "S01E01,A WALK IN THE WOODS,1,0\n"
+)
+
+EPISODES_TEXT = (
+    '"A Walk in the Woods" (January 11, 1983)\n'
+    'not an episode\n'
+    '"Mt. McKinley" (January 18, 1983)\n'
+    '"Ebony Sunset" (January 25, 1983)\n'
+    '"Mt. McKinley" (January 18, 1983)\n'
+    '"Winter Mist" (February 1, 1983)\n'
+)
+
+
+class TestStreamedStages(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.inputs = [
+            self.write('colors_used.csv', COLORS_CSV),
+            self.write('subject_matter.csv', SUBJECTS_CSV),
+            self.write('episode_dates.csv', EPISODES_TEXT),
+        ]
+        colors = clean_colors(self.inputs[0])
+        self.expected = {
+            'colors_cleaned': colors,
+            'episode_colors_cleaned': clean_episode_colors(self.inputs[0]),
+            'subjects_cleaned': clean_subjects(self.inputs[1]),
+            'episodes_cleaned': clean_episodes(self.inputs[2], colors),
+        }
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    def stream(self, extension, chunksize):
+        # The cleaning stages etl/dag.py runs with --chunksize, without the manifest
+        outputs = [os.path.join(self.directory.name, name) for name in self.expected]
+        stages = [stage for stage in etl_stages([extension], chunksize, self.inputs, outputs) if stage.name != 'manifest']
+        run(stages, workers=1, cache_dir=os.path.join(self.directory.name, 'cache'), force=True)
+        return {name: cleaned_data.read(output + extension, as_text=True) for name, output in zip(self.expected, outputs)}
+
+    def assertSameRows(self, streamed):
+        for name, expected in self.expected.items():
+            expected = cleaned_data.as_text_frame(expected)
+            if name == 'subjects_cleaned':
+                # Melted chunk by chunk, so only the set of rows matches
+                expected = expected.sort_values(list(expected.columns), ignore_index=True)
+                streamed[name] = streamed[name].sort_values(list(expected.columns), ignore_index=True)
+            pd.testing.assert_frame_equal(streamed[name], expected, obj=name)
+
+    def test_csv_matches_the_in_memory_etl_at_any_chunksize(self):
+        for chunksize in (1, 2, 3, 100):
+            with self.subTest(chunksize=chunksize):
+                self.assertSameRows(self.stream(cleaned_data.CSV, chunksize))
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_feather_matches_the_in_memory_etl(self):
+        streamed = self.stream(cleaned_data.FEATHER, 2)
+        self.assertSameRows(streamed)
+
+        batches = list(cleaned_data.read_batches(os.path.join(self.directory.name, 'episodes_cleaned.feather'), 2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(batches[0]['air_date']))
+
+    def test_stream_table_writes_every_output(self):
+        colors_path = os.path.join(self.directory.name, 'colors.csv')
+        cleaned_data.save(self.expected['colors_cleaned'], colors_path)
+        outputs = [os.path.join(self.directory.name, name) for name in ('episodes_a.csv', 'episodes_b.csv')]
+        rows = stream_table(stream_episodes, self.inputs[2], outputs, 2, colors_path=colors_path)
+
+        self.assertEqual(rows, len(self.expected['episodes_cleaned']))
+        expected = cleaned_data.as_text_frame(self.expected['episodes_cleaned'])
+        for output in outputs:
+            pd.testing.assert_frame_equal(cleaned_data.read(output, as_text=True), expected)
+
+
+class TestEpisodeHasher(unittest.TestCase):
+
+    def test_matches_frame_hashes(self):
+        subjects = pd.DataFrame({'Season-Episode': ['S01E02', 'S01E01', 'S01E02'], 'subject': ['tree', 'river', 'lake']})
+        episodes = pd.DataFrame({'Season-Episode': ['S01E01', 'S01E02'], 'title': ['A Walk in the Woods', None]})
+
+        hasher = EpisodeHasher()
+        try:
+            for start in range(0, 3, 2):
+                hasher.add('subjects', subjects.iloc[start:start + 2])
+            hasher.add('episodes', episodes)
+            digests = hasher.digests()
+        finally:
+            hasher.close()
+        self.assertFalse(os.path.exists(hasher.path))
+        self.assertEqual(digests, frame_hashes({'subjects': subjects, 'episodes': episodes}))
+
+
+class TestBulkLoadBatches(unittest.TestCase):
+
+    def test_episodes_keep_their_order_across_batches(self):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        copied = []
+        cursor.copy_expert.side_effect = lambda statement, buffer: copied.append((statement, buffer.getvalue()))
+
+        def episodes(codes):
+            return pd.DataFrame({
+                'season-episode': codes, 'title': codes, 'air_date': pd.to_datetime(['1983-01-11'] * len(codes)),
+                'youtube_src': [None] * len(codes),
+            })
+
+        subjects = pd.DataFrame({'season-episode': ['S01E01'], 'subject': ['tree']})
+        colors = pd.DataFrame({'season-episode': ['S01E01'], 'color': ['Bright Red'], 'color_hex': ['#DB0000']})
+        rows = bulk_load_batches(conn, iter([episodes(['S01E01', 'S01E02']), episodes(['S01E01'])]),
+                                 iter([subjects]), iter([colors]))
+
+        self.assertEqual(rows, 5)
+        staged_episodes = [data for statement, data in copied if 'staging_episodes' in statement]
+        self.assertEqual([line.split(',')[:2] for line in ''.join(staged_episodes).splitlines()],
+                         [['0', 'S01E01'], ['1', 'S01E02'], ['2', 'S01E01']])
+
+
+if __name__ == '__main__':
+    unittest.main()
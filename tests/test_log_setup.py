@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import unittest
+
+from flask import Flask
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.log_setup import (
+    JsonFormatter, LocalQueueHandler, SamplingFilter, log_requests, parse_levels, parse_rates, setup_logging,
+    stop_logging,
+)
+
+
+def record(name="backend.access", level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    entry = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    entry.__dict__.update(extra)
+    return entry
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestLogSettings(unittest.TestCase):
+
+    def test_parse_levels(self):
+        self.assertEqual(parse_levels("backend.access=info, werkzeug=WARNING"),
+                         {"backend.access": "INFO", "werkzeug": "WARNING"})
+        self.assertEqual(parse_levels(None), {})
+        with self.assertRaises(ValueError):
+            parse_levels("werkzeug=LOUD")
+
+    def test_parse_rates(self):
+        self.assertEqual(parse_rates("backend.access=0.1"), {"backend.access": 0.1})
+        with self.assertRaises(ValueError):
+            parse_rates("backend.access=2")
+
+    def test_sampling_keeps_a_fraction_of_info_lines(self):
+        sampler = SamplingFilter({"backend.access": 0.25})
+        kept = [sampler.filter(record()) for _ in range(100)]
+        self.assertEqual(sum(kept), 25)
+        self.assertTrue(kept[0])
+        # Children are sampled too, warnings and other loggers never are
+        self.assertEqual(sum(sampler.filter(record("backend.access.photo")) for _ in range(8)), 2)
+        self.assertTrue(all(sampler.filter(record(level=logging.WARNING)) for _ in range(10)))
+        self.assertTrue(all(sampler.filter(record("backend.app")) for _ in range(10)))
+
+    def test_json_formatter(self):
+        line = JsonFormatter().format(record(fields={"status": 200, "route": "/places"}))
+        entry = json.loads(line)
+        self.assertEqual(entry["message"], "hello world")
+        self.assertEqual((entry["level"], entry["logger"]), ("INFO", "backend.access"))
+        self.assertEqual((entry["status"], entry["route"]), (200, "/places"))
+        self.assertRegex(entry["time"], r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}\+00:00$")
+
+    def test_records_are_queued_unformatted(self):
+        entry = record()
+        self.assertIs(LocalQueueHandler(None).prepare(entry), entry)
+        self.assertEqual(entry.args, ("world",))
+
+
+class TestSetupLogging(unittest.TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        self.saved = (list(root.handlers), root.level)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "app.log")
+
+    def tearDown(self):
+        stop_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handlers, level = self.saved
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+        logging.getLogger("test.quiet").setLevel(logging.NOTSET)
+
+    def read_lines(self, path):
+        with open(path, encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    def test_writes_rotated_json_lines_from_the_listener(self):
+        setup_logging("DEBUG", levels={"test.quiet": "ERROR"}, path=self.path, max_bytes=2000, backup_count=2,
+                      console=False)
+        logger = logging.getLogger("test.log_setup")
+        for number in range(40):
+            logger.info("line %d", number)
+        logging.getLogger("test.quiet").warning("not written")
+        stop_logging()
+
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        lines = self.read_lines(self.path)
+        self.assertEqual(lines[-1]["message"], "line 39")
+        self.assertEqual(lines[-1]["logger"], "test.log_setup")
+        self.assertNotIn("not written", [line["message"] for line in lines])
+
+    def test_one_access_line_per_request(self):
+        setup_logging("INFO", sample_rates={"backend.access": 0.5}, path=self.path, console=False)
+        app = Flask(__name__)
+
+        @app.route("/episodes/<code>")
+        def episode(code):
+            return {"code": code}
+
+        @app.route("/broken")
+        def broken():
+            return {"error": "boom"}, 500
+
+        log_requests(app)
+        client = app.test_client()
+        for _ in range(4):
+            client.get("/episodes/S01E01")
+        client.get("/broken")
+        stop_logging()
+
+        lines = [line for line in self.read_lines(self.path) if line["logger"] == "backend.access"]
+        # Half the INFO lines are sampled out, the 500 is always kept
+        self.assertEqual([line["status"] for line in lines], [200, 200, 500])
+        self.assertEqual(lines[0]["route"], "/episodes/<code>")
+        self.assertEqual(lines[0]["path"], "/episodes/S01E01")
+        self.assertEqual(lines[0]["message"].split()[:3], ["GET", "/episodes/S01E01", "200"])
+        self.assertEqual(lines[2]["level"], "WARNING")
+        self.assertIn("duration_ms", lines[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import sys
+import unittest
+
+from flask import Flask
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.metrics import Metrics, instrument, request_timings, server_timing
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(namespace="test", buckets=(0.01, 0.1, 1.0))
+
+    def test_counters_by_label(self):
+        self.metrics.inc("upstream_calls_total", service="vision")
+        self.metrics.inc("upstream_calls_total", 2, service="vision")
+        self.metrics.inc("upstream_calls_total", service="places")
+        self.assertEqual(self.metrics.get("upstream_calls_total", service="vision"), 3)
+        self.assertEqual(self.metrics.get("upstream_calls_total", service="places"), 1)
+        self.assertEqual(self.metrics.get("upstream_calls_total", service="photo"), 0)
+
+    def test_render_histogram(self):
+        for seconds in (0.005, 0.01, 0.05, 2.0):
+            self.metrics.observe("stage_duration_seconds", seconds, stage="vision")
+        lines = self.metrics.render().splitlines()
+        self.assertEqual(lines[:2], [
+            "# HELP test_stage_duration_seconds Time spent in each stage of a request",
+            "# TYPE test_stage_duration_seconds histogram",
+        ])
+        self.assertEqual(lines[2:], [
+            'test_stage_duration_seconds_bucket{stage="vision",le="0.01"} 2',
+            'test_stage_duration_seconds_bucket{stage="vision",le="0.1"} 3',
+            'test_stage_duration_seconds_bucket{stage="vision",le="1.0"} 3',
+            'test_stage_duration_seconds_bucket{stage="vision",le="+Inf"} 4',
+            'test_stage_duration_seconds_sum{stage="vision"} 2.065',
+            'test_stage_duration_seconds_count{stage="vision"} 4',
+        ])
+
+    def test_render_escapes_labels(self):
+        self.metrics.inc("http_requests_total", route='/say "hi"\\')
+        self.assertIn('test_http_requests_total{route="/say \\"hi\\"\\\\"} 1', self.metrics.render())
+
+    def test_span_records_stage_upstream_and_errors(self):
+        timings = {}
+        token = request_timings.set(timings)
+        try:
+            with self.metrics.span("vision", upstream="vision"):
+                pass
+            with self.assertRaises(ValueError):
+                with self.metrics.span("vision", upstream="vision"):
+                    raise ValueError("quota")
+        finally:
+            request_timings.reset(token)
+
+        self.assertEqual(self.metrics.get("stage_duration_seconds", stage="vision"), 2)
+        self.assertEqual(self.metrics.get("upstream_calls_total", service="vision"), 2)
+        self.assertEqual(self.metrics.get("upstream_errors_total", service="vision"), 1)
+        self.assertEqual(self.metrics.get("stage_errors_total", stage="vision"), 1)
+        self.assertEqual(list(timings), ["vision"])
+
+    def test_span_outside_a_request(self):
+        with self.metrics.span("subjects"):
+            pass
+        self.assertEqual(self.metrics.get("stage_duration_seconds", stage="subjects"), 1)
+
+    def test_server_timing(self):
+        self.assertEqual(server_timing({"vision": 0.1234, "episodes page": 0.002}),
+                         "vision;dur=123.4, episodes_page;dur=2.0")
+
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        app = Flask(__name__)
+
+        @app.route("/episodes/<code>")
+        def episode(code):
+            with self.metrics.span("episodes_page"):
+                return {"code": code}
+
+        instrument(app, self.metrics)
+        self.client = app.test_client()
+
+    def test_requests_are_timed_by_route(self):
+        response = self.client.get("/episodes/S01E01")
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.headers["Server-Timing"], r"^episodes_page;dur=[\d.]+, total;dur=[\d.]+$")
+        self.client.get("/nowhere")
+        self.assertEqual(self.metrics.get("http_requests_total", route="/episodes/<code>", method="GET", status=200), 1)
+        self.assertEqual(self.metrics.get("http_requests_total", route="unmatched", method="GET", status=404), 1)
+        self.assertIsNone(request_timings.get())
+
+    def test_metrics_endpoint(self):
+        self.client.get("/episodes/S01E01")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        text = response.get_data(as_text=True)
+        self.assertIn('bobross_stage_duration_seconds_count{stage="episodes_page"} 1', text)
+        self.assertIn('bobross_http_requests_total{method="GET",route="/episodes/<code>",status="200"} 1', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import datetime
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from api.palette_index import PaletteIndex, closest_used, delta_e, hex_to_lab, parse_hex, top_k
+
+EPISODES = [
+    (1, "S01E01", "A Walk in the Woods", datetime.date(1983, 1, 11)),
+    (2, "S01E02", "Mt. McKinley", datetime.date(1983, 1, 18)),
+    (3, "S01E03", "Ebony Sunset", datetime.date(1983, 1, 25)),
+    (4, "S01E04", "Winter Mist", datetime.date(1983, 2, 1)),
+    (5, "S01E05", "Quiet Stream", datetime.date(1983, 2, 8)),
+]
+EPISODE_COLORS = [
+    (1, "Alizarin Crimson", "#4E1500"), (1, "Bright Red", "#DB0000"), (1, "Titanium White", "#FFFFFF"),
+    (2, "Alizarin Crimson", "#4E1500"), (2, "Bright Red", "#DB0000"), (2, "Titanium White", "#FFFFFF"),
+    (3, "Phthalo Blue", "#0C0040"), (3, "Prussian Blue", "#021E44"),
+    (4, "Bright Red", "#DB0000"), (4, "Phthalo Blue", "#0C0040"),
+    # Episode 5 used no paints
+]
+
+
+def ids(matches):
+    return [row[0] for row, _ in matches]
+
+
+class TestPaletteHelpers(unittest.TestCase):
+
+    def test_parse_hex(self):
+        self.assertEqual(parse_hex("db0000"), "#DB0000")
+        self.assertEqual(parse_hex(" #ffffff "), "#FFFFFF")
+        for code in ["#FFF", "red", "#GG0000", ""]:
+            with self.assertRaises(ValueError):
+                parse_hex(code)
+
+    def test_lab_and_delta_e(self):
+        lab = hex_to_lab(["#000000", "#FFFFFF", "#FF0000"])
+        np.testing.assert_allclose(lab[0], [0, 0, 0], atol=1e-6)
+        np.testing.assert_allclose(lab[1], [100, 0, 0], atol=1e-3)
+        np.testing.assert_allclose(lab[2], [53.24, 80.09, 67.20], atol=0.01)
+        self.assertAlmostEqual(delta_e(lab[:1], lab[1:2])[0, 0], 100, places=3)
+
+    def test_top_k(self):
+        scores = np.array([0.2, 0.9, 0.5, 0.9, 0.1])
+        self.assertEqual(top_k(scores, 3).tolist(), [1, 3, 2])
+        self.assertEqual(top_k(scores, 10).tolist(), [1, 3, 2, 0, 4])
+        self.assertEqual(top_k(scores, 0).tolist(), [])
+
+    def test_closest_used(self):
+        palettes = np.array([[True, False, True], [False, True, False], [False, False, False]])
+        distances = np.array([3.0, 1.0, 2.0])
+        self.assertEqual(closest_used(palettes, distances).tolist(), [2.0, 1.0, np.inf])
+
+
+class TestPaletteIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PaletteIndex()
+        self.index.load(EPISODES, EPISODE_COLORS)
+
+    def test_like_episode(self):
+        matches = self.index.like_episode("S01E01", k=10)
+        # Same paints first, never the episode itself
+        self.assertEqual(ids(matches)[0], 2)
+        self.assertNotIn(1, ids(matches))
+        self.assertAlmostEqual(matches[0][1], 1.0, places=6)
+        self.assertEqual(ids(matches)[1], 4)
+        # Nothing in common and no colors to compare scores nothing
+        self.assertEqual(matches[-1], (EPISODES[4], 0.0))
+
+    def test_scores_match_a_per_episode_calculation(self):
+        lab = dict(zip(["#4E1500", "#DB0000", "#FFFFFF", "#0C0040", "#021E44"],
+                       hex_to_lab(["#4E1500", "#DB0000", "#FFFFFF", "#0C0040", "#021E44"])))
+        query, candidate = ["#4E1500", "#DB0000", "#FFFFFF"], ["#DB0000", "#0C0040"]
+
+        def chamfer(left, right):
+            return np.mean([min(np.linalg.norm(lab[a] - lab[b]) for b in right) for a in left])
+
+        distance = (chamfer(query, candidate) + chamfer(candidate, query)) / 2
+        closeness = 1 / (1 + distance / 10)
+        for metric, overlap in [("jaccard", 1 / 4), ("cosine", 1 / np.sqrt(6))]:
+            with self.subTest(metric=metric):
+                scores = dict((row[0], score) for row, score in self.index.like_episode("S01E01", 10, metric))
+                self.assertAlmostEqual(scores[4], 0.5 * overlap + 0.5 * closeness, places=5)
+
+    def test_like_colors(self):
+        matches = self.index.like_colors(["#0c0040", "021E44"], k=2)
+        self.assertEqual(ids(matches), [3, 4])
+        # A color that isn't a paint still ranks by how close it looks
+        self.assertEqual(ids(self.index.like_colors(["#0A0A50"], k=1)), [3])
+        with self.assertRaises(ValueError):
+            self.index.like_colors(["blue"])
+        with self.assertRaises(ValueError):
+            self.index.like_colors([])
+
+    def test_unknown_episode_and_metric(self):
+        with self.assertRaises(KeyError):
+            self.index.like_episode("S99E99")
+        with self.assertRaises(ValueError):
+            self.index.like_episode("S01E01", metric="euclidean")
+
+    def test_nearest_paints(self):
+        index = PaletteIndex()
+        index.load(EPISODES, EPISODE_COLORS + [(4, "Liquid Clear", "#FFFFFF")])
+        nearest = index.nearest_paints(["#DA0101", "#F0F0F0"])
+        self.assertEqual([paint[:2] for paint in nearest], [("Bright Red", "#DB0000"), ("Titanium White", "#FFFFFF")])
+        self.assertLess(nearest[0][2], 1)
+
+    def test_palette(self):
+        self.assertEqual(self.index.palette("S01E04"), [("Bright Red", "#DB0000"), ("Phthalo Blue", "#0C0040")])
+        self.assertEqual(self.index.palette("S01E05"), [])
+
+    def test_unloaded_index_raises(self):
+        with self.assertRaises(RuntimeError):
+            PaletteIndex().like_episode("S01E01")
+
+    def test_refresh_reads_both_tables(self):
+        cursor = MagicMock()
+        cursor.fetchall.side_effect = [EPISODES, EPISODE_COLORS]
+        index = PaletteIndex()
+        index.refresh(cursor)
+        self.assertEqual(cursor.execute.call_count, 2)
+        self.assertEqual(ids(index.like_episode("S01E03", k=1)), [4])
+        self.assertEqual(index.loads, 1)
+
+
+class TestSimilarEpisodesEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        from api.theapi import app, palette_index
+        self.client = app.test_client()
+        palette_index.load(EPISODES, EPISODE_COLORS)
+
+    def test_like_an_episode(self):
+        response = self.client.get('/episodes/similar?episode=s01e01&limit=2')
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["query"]["episode"], "S01E01")
+        self.assertEqual(len(body["query"]["palette"]), 3)
+        self.assertEqual(body["metric"], "jaccard")
+        self.assertEqual([episode["season_episode"] for episode in body["episodes"]], ["S01E02", "S01E04"])
+        self.assertEqual(body["episodes"][0]["score"], 1.0)
+
+    def test_like_colors(self):
+        response = self.client.get('/episodes/similar?hex=%230C0040&hex=021E44&metric=cosine&limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([episode["episode_id"] for episode in response.get_json()["episodes"]], [3])
+
+    def test_invalid_parameters(self):
+        for query in ['', '?episode=S01E01&hex=FFFFFF', '?episode=S01E01&metric=euclidean',
+                      '?episode=S01E01&limit=ten', '?hex=blue']:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get('/episodes/similar' + query).status_code, 400)
+        self.assertEqual(self.client.get('/episodes/similar?episode=S99E99').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
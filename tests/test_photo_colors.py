@@ -0,0 +1,86 @@
+import io
+import os
+import sys
+import unittest
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.photo_colors import decode_pixels, dominant_colors, extract_colors, kmeans, quantize
+
+try:
+    from PIL import Image
+    HAS_PILLOW = True
+except ImportError:
+    HAS_PILLOW = False
+
+SKY, TREES, GROUND = (110, 170, 230), (40, 100, 45), (90, 70, 50)
+
+
+def landscape(height=60, width=80):
+    """
+    Sky over trees over ground, 50/30/20 of the picture.
+    """
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:height // 2] = SKY
+    pixels[height // 2:height * 4 // 5] = TREES
+    pixels[height * 4 // 5:] = GROUND
+    return pixels
+
+
+def hex_code(rgb):
+    return "#{:02X}{:02X}{:02X}".format(*rgb)
+
+
+class TestPhotoColors(unittest.TestCase):
+
+    def test_quantize_bins_pixels(self):
+        pixels = np.array([[0, 0, 0], [4, 4, 4], [255, 255, 255]], dtype=np.uint8)
+        colors, counts = quantize(pixels)
+        np.testing.assert_allclose(colors, [[2, 2, 2], [255, 255, 255]])
+        self.assertEqual(counts.tolist(), [2, 1])
+
+    def test_kmeans_splits_clear_groups(self):
+        points = np.array([[0, 0, 0], [1, 0, 0], [50, 50, 50], [51, 50, 50]], dtype=np.float64)
+        labels = kmeans(points, [1, 1, 1, 5], k=2)
+        self.assertEqual(labels[0], labels[1])
+        self.assertEqual(labels[2], labels[3])
+        self.assertNotEqual(labels[0], labels[2])
+        # More clusters than points
+        self.assertEqual(len(set(kmeans(points[:1], [1], k=5))), 1)
+
+    def test_dominant_colors(self):
+        colors = dominant_colors(landscape().reshape(-1, 3))
+        self.assertEqual(colors, [(hex_code(SKY), 0.5), (hex_code(TREES), 0.3), (hex_code(GROUND), 0.2)])
+
+    def test_small_shares_are_dropped(self):
+        pixels = landscape().reshape(-1, 3)
+        pixels[:100] = (255, 0, 0)  # 100 of 4,800 pixels, about 2%
+        self.assertNotIn("#FF0000", [code for code, _ in dominant_colors(pixels)])
+        self.assertIn("#FF0000", [code for code, _ in dominant_colors(pixels, min_share=0.01)])
+
+    def test_no_pixels(self):
+        self.assertEqual(dominant_colors(np.zeros((0, 3), dtype=np.uint8)), [])
+
+    @unittest.skipUnless(HAS_PILLOW, "Pillow is not installed")
+    def test_extract_colors_from_an_encoded_photo(self):
+        buffer = io.BytesIO()
+        Image.fromarray(landscape(600, 800)).save(buffer, "PNG")
+        self.assertEqual(decode_pixels(buffer.getvalue()).shape, (64 * 48, 3))
+        colors = extract_colors(buffer.getvalue())
+        # Resampling blends the band edges into a row or two of their own
+        found = [[int(code[i:i + 2], 16) for i in (1, 3, 5)] for code, _ in colors]
+        np.testing.assert_allclose(found, [SKY, TREES, GROUND], atol=2)
+        np.testing.assert_allclose([share for _, share in colors], [0.5, 0.3, 0.2], atol=0.05)
+
+    @unittest.skipUnless(HAS_PILLOW, "Pillow is not installed")
+    def test_undecodable_photo_raises(self):
+        with self.assertRaises(Exception):
+            extract_colors(b'fake_image_data')
+
+
+if __name__ == '__main__':
+    unittest.main()
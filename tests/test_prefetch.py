@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.prefetch import Prefetcher, RateLimiter
+
+
+class TestPrefetcher(unittest.TestCase):
+    def test_warms_submitted_references_once(self):
+        warm = MagicMock()
+        prefetcher = Prefetcher(warm, workers=2, rate=1000)
+
+        self.assertEqual(prefetcher.submit(["a", "b", "a"]), 2)
+        prefetcher.join()
+
+        self.assertEqual(sorted(call.args[0] for call in warm.call_args_list), ["a", "b"])
+        stats = prefetcher.stats()
+        self.assertEqual(stats["completed"], 2)
+        self.assertEqual(stats["duplicates"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+        prefetcher.shutdown()
+
+    def test_full_queue_drops_and_cancel_empties_it(self):
+        release = threading.Event()
+        warm = MagicMock(side_effect=lambda ref: release.wait(1))
+        prefetcher = Prefetcher(warm, workers=1, max_queue=2, rate=1000)
+
+        prefetcher.submit(["a"])
+        time.sleep(0.05)  # let the worker pick up "a" and block
+        prefetcher.submit(["b", "c", "d"])
+        self.assertEqual(prefetcher.stats()["dropped"], 1)
+
+        prefetcher.cancel()
+        release.set()
+        prefetcher.join()
+        warm.assert_called_once_with("a")
+        self.assertEqual(prefetcher.stats()["cancelled"], 2)
+        prefetcher.shutdown()
+
+    def test_failures_are_counted(self):
+        prefetcher = Prefetcher(MagicMock(side_effect=RuntimeError("quota")), rate=1000)
+        prefetcher.submit(["a"])
+        prefetcher.join()
+        self.assertEqual(prefetcher.stats()["failed"], 1)
+        prefetcher.shutdown()
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_limits_rate_after_burst(self):
+        limiter = RateLimiter(rate=20, burst=1)
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_stop_interrupts_wait(self):
+        limiter = RateLimiter(rate=0.01, burst=1)
+        limiter.acquire()
+        stop = threading.Event()
+        stop.set()
+        self.assertFalse(limiter.acquire(stop))
+
+
+if __name__ == '__main__':
+    unittest.main()
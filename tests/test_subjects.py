@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.subjects import (
+    SubjectMatcher, find_subjects, normalize_label, stem, SUBJECTS_QUERY, SUBJECTS_SIMILARITY_QUERY
+)
+
+
+class TestFindSubjects(unittest.TestCase):
+    def test_normalize_label(self):
+        self.assertEqual(normalize_label("  Palm_Trees "), "palm trees")
+        self.assertEqual(normalize_label("Body  of Water"), "body of water")
+
+    def test_single_round_trip_for_all_labels(self):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [(7, "mountain"), (9, "palm_trees")]
+
+        subjects = find_subjects(cursor, ["Mountain", "palm trees", "mountain", "Sky"])
+
+        cursor.execute.assert_called_once_with(
+            SUBJECTS_QUERY, {"labels": ["mountain", "palm trees", "sky"]}
+        )
+        self.assertEqual(subjects, [
+            {"subject_id": 7, "name": "mountain"},
+            {"subject_id": 9, "name": "palm_trees"},
+        ])
+
+    def test_similarity_threshold_uses_trigram_query(self):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [(7, "mountain")]
+
+        find_subjects(cursor, ["mountains"], similarity_threshold=0.4)
+
+        cursor.execute.assert_called_once_with(
+            SUBJECTS_SIMILARITY_QUERY, {"labels": ["mountains"], "threshold": 0.4}
+        )
+
+    def test_no_labels_skips_query(self):
+        cursor = MagicMock()
+        self.assertEqual(find_subjects(cursor, []), [])
+        cursor.execute.assert_not_called()
+
+
+class TestSubjectMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = SubjectMatcher()
+        self.matcher.load([(1, "mountain"), (2, "mountains"), (3, "tree"), (4, "ocean"), (5, "palm_trees")])
+
+    def test_stem(self):
+        self.assertEqual(stem("palm trees"), "palm tree")
+        self.assertEqual(stem("bushes"), "bush")
+        self.assertEqual(stem("grass"), "grass")
+
+    def test_resolves_names_stems_and_synonyms(self):
+        subjects = self.matcher.resolve(["Mountains", "Conifer", "Sea", "Palm tree", "Sky"])
+        self.assertEqual([subject["subject_id"] for subject in subjects], [2, 1, 3, 4, 5])
+
+    def test_deduplicates_subjects(self):
+        subjects = self.matcher.resolve(["tree", "trees", "pine"])
+        self.assertEqual(subjects, [{"subject_id": 3, "name": "tree"}])
+
+    def test_refresh_reloads_from_cursor(self):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [(9, "lake")]
+        self.matcher.refresh(cursor)
+        self.assertEqual(self.matcher.resolve(["pond", "mountain"]), [{"subject_id": 9, "name": "lake"}])
+
+    def test_unloaded_matcher_raises(self):
+        with self.assertRaises(RuntimeError):
+            SubjectMatcher().resolve(["tree"])
+
+
+if __name__ == '__main__':
+    unittest.main()
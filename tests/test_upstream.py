@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import requests
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.upstream import HttpClient
+
+
+class TestHttpClient(unittest.TestCase):
+
+    @patch('requests.Session.get')
+    def test_streamed_response_holds_its_slot_until_closed(self, mock_get):
+        client = HttpClient(max_concurrency=1)
+        client.get("http://example.test/a")
+        self.assertTrue(client._slots.acquire(blocking=False))
+        client._slots.release()
+
+        response = client.get("http://example.test/photo", stream=True)
+        self.assertFalse(client._slots.acquire(blocking=False))
+        self.assertIs(response.iter_content, mock_get.return_value.iter_content)
+        response.close()
+        response.close()
+        mock_get.return_value.close.assert_called()
+        self.assertTrue(client._slots.acquire(blocking=False))
+        client._slots.release()
+
+    @patch('requests.Session.get')
+    def test_failed_call_gives_back_its_slot(self, mock_get):
+        mock_get.side_effect = requests.ConnectionError()
+        client = HttpClient(max_concurrency=1)
+        with self.assertRaises(requests.ConnectionError):
+            client.get("http://example.test/photo", stream=True)
+        self.assertTrue(client._slots.acquire(blocking=False))
+        client._slots.release()
+
+
+if __name__ == '__main__':
+    unittest.main()